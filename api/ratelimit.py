@@ -0,0 +1,56 @@
+"""
+Per-key token buckets, kept in process memory.
+
+Each key (API key, or client address when keys are not required) gets API_RATE_BURST
+tokens, refilled at API_RATE_PER_SECOND; a request takes one. Buckets live per worker,
+so with N workers a key can reach N times the rate: good enough to stop a runaway
+poller without a round trip to a shared store on every request.
+
+Behind a proxy REMOTE_ADDR is the proxy's, one bucket for every client: with
+TRUSTED_PROXY_COUNT set, client_address() reads the address the outermost trusted proxy
+appended to X-Forwarded-For instead. Entries further left are the client's own say-so.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+MAX_KEYS = 10_000
+
+_buckets = OrderedDict()
+_lock = threading.Lock()
+
+
+def take(key, now=None):
+    """Take a token for the key. Returns 0 if allowed, else seconds until the next token."""
+    rate = settings.API_RATE_PER_SECOND
+    burst = settings.API_RATE_BURST
+    now = time.monotonic() if now is None else now
+    with _lock:
+        tokens, stamp = _buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - stamp) * rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        if not wait:
+            tokens -= 1
+        _buckets[key] = (tokens, now)
+        # Least recently seen keys go first; a forgotten key starts again with a full bucket.
+        while len(_buckets) > MAX_KEYS:
+            _buckets.popitem(last=False)
+    return wait
+
+
+def client_address(request):
+    """The client's address, past TRUSTED_PROXY_COUNT proxies that append X-Forwarded-For."""
+    proxies = settings.TRUSTED_PROXY_COUNT
+    if proxies:
+        forwarded = [a.strip() for a in request.headers.get("X-Forwarded-For", "").split(",")]
+        if len(forwarded) >= proxies and forwarded[-proxies]:
+            return forwarded[-proxies]
+    return request.META.get("REMOTE_ADDR")
+
+
+def reset():
+    with _lock:
+        _buckets.clear()
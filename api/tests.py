@@ -0,0 +1,143 @@
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from bookings.models import Facility, HoursOfOperation, IceSurface, Slot
+from core.testing import shared_cache
+
+from . import ratelimit
+
+
+class PublicApiTests(TestCase):
+    def setUp(self):
+        ratelimit.reset()
+        self.facility = Facility.objects.create(
+            name="Api Rink", city="Guelph", timezone="UTC", parking=True, wifi=True
+        )
+        self.surface = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("80")
+        )
+        self.day = timezone.now().date() + timedelta(days=1)
+        for offset in (0, 1):
+            HoursOfOperation.objects.create(
+                ice_surface=self.surface,
+                weekday=(self.day + timedelta(days=offset)).weekday(),
+                open_time=time(7),
+                close_time=time(10),
+            )
+        self.detail_url = reverse("api:facility_detail", kwargs={"pk": self.facility.pk})
+        self.slots_url = reverse(
+            "api:slot_list",
+            kwargs={"facility_pk": self.facility.pk, "surface_pk": self.surface.pk},
+        )
+
+    def test_facility_list_pages_with_cursor_and_selects_fields(self):
+        Facility.objects.create(name="Second Rink", timezone="UTC")
+        url = reverse("api:facility_list")
+        data = self.client.get(url, {"limit": 1, "fields": "name,amenities"}).json()
+        self.assertEqual(data["results"], [{"name": "Api Rink", "amenities": ["parking", "wifi"]}])
+        data = self.client.get(data["next"]).json()
+        self.assertEqual([f["name"] for f in data["results"]], ["Second Rink"])
+        self.assertIsNone(data["next"])
+        self.assertEqual(self.client.get(url, {"fields": "stripe_account_id"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"cursor": "%%%"}).status_code, 400)
+
+    def test_facility_address_comes_from_the_structured_fields(self):
+        Facility.objects.filter(pk=self.facility.pk).update(
+            address_line1="55 Ice Rd", address_line2="Unit 2", province="ON", postal_code="N1H 1A1"
+        )
+        data = self.client.get(self.detail_url).json()
+        self.assertEqual(data["address"], "55 Ice Rd, Unit 2, Guelph, ON, N1H 1A1")
+        self.assertEqual((data["address_line1"], data["address_line2"]), ("55 Ice Rd", "Unit 2"))
+
+    def test_facility_detail_revalidates_from_cache_until_hours_change(self):
+        response = self.client.get(self.detail_url)
+        data = response.json()
+        self.assertEqual(data["surfaces"][0]["default_rate"], "80.00")
+        self.assertEqual(len(data["surfaces"][0]["hours"]), 2)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with shared_cache():
+            self.client.get(self.detail_url)
+            with self.assertNumQueries(0):
+                response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        stamp = Facility.objects.get(pk=self.facility.pk).updated_at
+        HoursOfOperation.objects.filter(ice_surface=self.surface).first().delete()
+        self.assertGreater(Facility.objects.get(pk=self.facility.pk).updated_at, stamp)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["surfaces"][0]["hours"]), 1)
+
+        missing = reverse("api:facility_detail", kwargs={"pk": self.facility.pk + 999})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_slot_list_pages_across_days_and_etag_follows_slot_changes(self):
+        params = {"start": self.day.isoformat(), "end": (self.day + timedelta(days=1)).isoformat()}
+        first = self.client.get(self.slots_url, {**params, "limit": 4})
+        data = first.json()
+        self.assertEqual([s["state"] for s in data["results"]], ["available"] * 4)
+        rest = self.client.get(data["next"]).json()
+        self.assertEqual(len(rest["results"]), 2)
+        self.assertIsNone(rest["next"])
+        starts = [s["start"] for s in data["results"] + rest["results"]]
+        self.assertEqual(starts, sorted(set(starts)))
+
+        etag = self.client.get(self.slots_url, params)["ETag"]
+        response = self.client.get(self.slots_url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        slot = Slot.objects.filter(ice_surface=self.surface).order_by("start").first()
+        slot.state = "blocked"
+        slot.save()
+        response = self.client.get(self.slots_url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()["results"][0]["state"], "blocked")
+
+        self.assertEqual(self.client.get(self.slots_url, {"end": "2000-01-01"}).status_code, 400)
+
+    def test_slot_etag_is_version_based_only_with_a_shared_cache(self):
+        params = {"start": self.day.isoformat(), "end": self.day.isoformat()}
+        etag = self.client.get(self.slots_url, params)["ETag"]
+        with shared_cache():
+            shared_etag = self.client.get(self.slots_url, params)["ETag"]
+            with self.assertNumQueries(0):
+                response = self.client.get(self.slots_url, params, HTTP_IF_NONE_MATCH=shared_etag)
+            self.assertEqual(response.status_code, 304)
+        # Per-process versions: the same slots give the same tag in every worker.
+        self.assertNotEqual(shared_etag, etag)
+        self.assertEqual(self.client.get(self.slots_url, params)["ETag"], etag)
+
+    @override_settings(API_KEYS=["partner-key"], API_RATE_BURST=2, API_RATE_PER_SECOND=0.5)
+    def test_keys_are_required_when_configured_and_rate_limited_per_key(self):
+        self.assertEqual(self.client.get(self.detail_url).status_code, 401)
+        self.assertEqual(self.client.post(self.detail_url).status_code, 405)
+        for _ in range(2):
+            response = self.client.get(self.detail_url, HTTP_X_API_KEY="partner-key")
+            self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.detail_url, HTTP_X_API_KEY="partner-key")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "2")
+
+    @override_settings(API_RATE_BURST=3, API_RATE_PER_SECOND=1)
+    def test_token_bucket_refills_at_the_configured_rate(self):
+        self.assertEqual([ratelimit.take("k", now=0) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(ratelimit.take("k", now=0.25), 0.75)
+        self.assertEqual(ratelimit.take("k", now=1.0), 0)
+        self.assertEqual(ratelimit.take("other", now=1.0), 0)
+
+    @override_settings(API_RATE_BURST=1, TRUSTED_PROXY_COUNT=1)
+    def test_keyless_clients_are_limited_by_forwarded_address(self):
+        def get(forwarded):
+            return self.client.get(self.detail_url, HTTP_X_FORWARDED_FOR=forwarded).status_code
+
+        self.assertEqual(get("203.0.113.5"), 200)
+        self.assertEqual(get("198.51.100.7"), 200)
+        # Only the address the proxy appended counts; the client's own entries don't.
+        self.assertEqual(get("10.9.9.9, 203.0.113.5"), 429)
@@ -0,0 +1,16 @@
+from django.urls import path
+
+from . import views
+
+app_name = "api"
+
+urlpatterns = [
+    path("facilities/", views.facility_list, name="facility_list"),
+    path("facilities/<int:pk>/", views.facility_detail, name="facility_detail"),
+    path("facilities/<int:facility_pk>/surfaces/", views.surface_list, name="surface_list"),
+    path(
+        "facilities/<int:facility_pk>/surfaces/<int:surface_pk>/slots/",
+        views.slot_list,
+        name="slot_list",
+    ),
+]
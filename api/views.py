@@ -0,0 +1,314 @@
+"""
+Read-only public JSON API, version 1, for partners (league schedulers, municipal portals).
+
+Everything is read through bookings.cache, so steady polling is answered from the cache
+and the replicas rather than the primary. Facilities, surfaces and hours carry an ETag
+and Last-Modified from updated_at (saving a surface or its hours touches the facility's).
+Slots have no timestamps: with a shared cache their ETag comes from the slot cache
+versions, otherwise (per-process versions) from the page of slots served. Lists page
+with an opaque ?cursor=, ?fields= picks top-level fields, and every request takes a token
+from its key's bucket (api.ratelimit).
+"""
+
+import base64
+import hashlib
+import math
+from datetime import datetime, timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, quote_etag
+
+from bookings.availability import availability_scopes
+from bookings.cache import (
+    aget_facility,
+    aget_search_facilities,
+    aget_slot_grid,
+    aversion_tag,
+    versions_shared,
+)
+from bookings.facility_calendar import facility_tz
+from bookings.models import amenity_names
+from core.db_router import replica_reads
+
+from . import ratelimit
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SLOT_DAYS = 7  # default ?start= to ?end= span
+MAX_SLOT_DAYS = 31
+
+FACILITY_FIELDS = (
+    "id",
+    "name",
+    "address",
+    "address_line1",
+    "address_line2",
+    "city",
+    "province",
+    "postal_code",
+    "timezone",
+    "latitude",
+    "longitude",
+    "amenities",
+    "updated_at",
+)
+SURFACE_FIELDS = ("id", "name", "display_order", "default_rate", "hours", "updated_at")
+SLOT_FIELDS = ("id", "start", "end", "state", "rate")
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _error(status, message):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _authorized(key):
+    keys = settings.API_KEYS
+    return not keys or any(constant_time_compare(key, k) for k in keys)
+
+
+def api_view(view):
+    """GET only, X-Api-Key checked when API_KEYS is set, rate limited, reads on replicas."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return _error(405, "read-only API: use GET")
+        key = request.headers.get("X-Api-Key", "")
+        if not _authorized(key):
+            return _error(401, "missing or unknown X-Api-Key")
+        bucket = f"key:{key}" if key else f"addr:{ratelimit.client_address(request)}"
+        wait = ratelimit.take(bucket)
+        if wait:
+            response = _error(429, "rate limit exceeded")
+            response["Retry-After"] = str(math.ceil(wait))
+            return response
+        try:
+            return await view(request, *args, **kwargs)
+        except ApiError as e:
+            return _error(e.status, str(e))
+
+    return replica_reads(wrapper)
+
+
+def _encode_cursor(value):
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError(400, "malformed cursor") from None
+
+
+def _next_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query["cursor"] = cursor
+    return f"{request.path}?{query.urlencode()}"
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get("limit", PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, "limit must be a number") from None
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ApiError(400, f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def _fields(request, allowed):
+    """Fields asked for with ?fields=a,b (in the resource's order), or all of them."""
+    wanted = {f for f in request.GET.get("fields", "").split(",") if f}
+    if not wanted:
+        return allowed
+    if wanted - set(allowed):
+        raise ApiError(400, f"unknown field; choose from {', '.join(allowed)}")
+    return [f for f in allowed if f in wanted]
+
+
+def _date(request, name, default):
+    value = request.GET.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ApiError(400, f"{name} must be YYYY-MM-DD") from None
+
+
+def _hours(surface):
+    return [
+        {"weekday": h.weekday, "open": f"{h.open_time:%H:%M}", "close": f"{h.close_time:%H:%M}"}
+        for h in surface.hours_of_operation.all()
+    ]
+
+
+def _facility_data(facility, fields):
+    values = {
+        # One line from the structured fields; the legacy address column is only a fallback.
+        "address": facility.get_full_address,
+        "amenities": lambda: list(amenity_names(facility.amenity_mask)),
+    }
+    return {f: values[f]() if f in values else getattr(facility, f) for f in fields}
+
+
+def _surface_data(surface, fields):
+    values = {"hours": lambda: _hours(surface)}
+    return {f: values[f]() if f in values else getattr(surface, f) for f in fields}
+
+
+def _conditional(request, tag, last_modified, build):
+    """A 304 if the client's validators still hold, otherwise build()'s JSON with validators."""
+    etag = quote_etag(tag)
+    stamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=stamp)
+    if response is None:
+        response = JsonResponse(build())
+    response["ETag"] = etag
+    if stamp is not None:
+        response["Last-Modified"] = http_date(stamp)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _timestamp_tag(objects, *extra):
+    raw = "|".join([*(f"{o.pk}:{o.updated_at.isoformat()}" for o in objects), *map(str, extra)])
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+def _slot_tag(slots, *extra):
+    raw = "|".join([*(f"{s.pk}:{s.start.isoformat()}:{s.state}:{s.rate}" for s in slots), *extra])
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+async def _facility(pk):
+    facility = await aget_facility(pk)
+    if facility is None:
+        raise ApiError(404, "no such facility")
+    return facility
+
+
+def _surface(facility, pk):
+    surface = next((s for s in facility.ice_surfaces.all() if s.pk == pk), None)
+    if surface is None:
+        raise ApiError(404, "no such surface")
+    return surface
+
+
+@api_view
+async def facility_list(request):
+    """Facilities by id, ?limit= per page (default PAGE_SIZE), from the search cache."""
+    fields, limit = _fields(request, FACILITY_FIELDS), _limit(request)
+    facilities = sorted(await aget_search_facilities(), key=lambda f: f.pk)
+    if cursor := request.GET.get("cursor"):
+        try:
+            after = int(_decode_cursor(cursor))
+        except ValueError:
+            raise ApiError(400, "malformed cursor") from None
+        facilities = [f for f in facilities if f.pk > after]
+    page, more = facilities[:limit], len(facilities) > limit
+    next_cursor = _encode_cursor(str(page[-1].pk)) if more else None
+    return _conditional(
+        request,
+        _timestamp_tag(page, next_cursor),
+        max((f.updated_at for f in page), default=None),
+        lambda: {
+            "results": [_facility_data(f, fields) for f in page],
+            "next": _next_url(request, next_cursor),
+        },
+    )
+
+
+@api_view
+async def facility_detail(request, pk):
+    """One facility with its surfaces and their weekly hours."""
+    facility = await _facility(pk)
+    fields = _fields(request, (*FACILITY_FIELDS, "surfaces"))
+    surfaces = list(facility.ice_surfaces.all())
+
+    def build():
+        data = _facility_data(facility, [f for f in fields if f != "surfaces"])
+        if "surfaces" in fields:
+            data["surfaces"] = [_surface_data(s, SURFACE_FIELDS) for s in surfaces]
+        return data
+
+    return _conditional(request, _timestamp_tag([facility, *surfaces]), facility.updated_at, build)
+
+
+@api_view
+async def surface_list(request, facility_pk):
+    """A facility's surfaces (a short list: not paged) with their weekly hours."""
+    facility = await _facility(facility_pk)
+    fields = _fields(request, SURFACE_FIELDS)
+    surfaces = list(facility.ice_surfaces.all())
+    return _conditional(
+        request,
+        _timestamp_tag([facility, *surfaces]),
+        facility.updated_at,
+        lambda: {"results": [_surface_data(s, fields) for s in surfaces], "next": None},
+    )
+
+
+@api_view
+async def slot_list(request, facility_pk, surface_pk):
+    """
+    A surface's slots from ?start= to ?end= (facility-local dates, default today and
+    SLOT_DAYS on), oldest first, from the per-day slot grid cache.
+    """
+    facility = await _facility(facility_pk)
+    surface = _surface(facility, surface_pk)
+    fields, limit = _fields(request, SLOT_FIELDS), _limit(request)
+    first_day = _date(request, "start", timezone.localdate(timezone=facility_tz(facility)))
+    last_day = _date(request, "end", first_day + timedelta(days=SLOT_DAYS - 1))
+    if not 0 <= (last_day - first_day).days < MAX_SLOT_DAYS:
+        raise ApiError(400, f"end must be on or after start and at most {MAX_SLOT_DAYS} days in")
+    after = None
+    if cursor := request.GET.get("cursor"):
+        try:
+            after = datetime.fromisoformat(_decode_cursor(cursor))
+        except ValueError:
+            raise ApiError(400, "malformed cursor") from None
+        if timezone.is_naive(after):
+            raise ApiError(400, "malformed cursor")
+
+    scopes = availability_scopes(facility, [surface], first_day, last_day)
+    shared = versions_shared()
+    if shared:
+        etag = quote_etag(await aversion_tag(scopes))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified["ETag"] = etag
+            return not_modified
+
+    slots, day = [], first_day
+    if after is not None:
+        day = max(day, timezone.localtime(after, facility_tz(facility)).date())
+    while day <= last_day and len(slots) <= limit:
+        grid = await aget_slot_grid(surface, day)
+        slots.extend(s for s in grid if after is None or s.start > after)
+        day += timedelta(days=1)
+    page, more = slots[:limit], len(slots) > limit
+    next_cursor = _encode_cursor(page[-1].start.isoformat()) if more else None
+    # Building a grid can generate its slots, which bumps their versions: tag what is served.
+    return _conditional(
+        request,
+        await aversion_tag(scopes) if shared else _slot_tag(page, next_cursor or ""),
+        None,
+        lambda: {
+            "results": [{f: getattr(s, f) for f in fields} for s in page],
+            "next": _next_url(request, next_cursor),
+        },
+    )
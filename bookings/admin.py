@@ -1,21 +1,48 @@
-from django.contrib import admin
+from decimal import Decimal, InvalidOperation
+
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
+
+from core.admin_tools import EstimatedCountPaginator, id_filter
 
 from .models import (
+    AMENITY_BITS,
     Booking,
     BookingEvent,
     Facility,
     HoursOfOperation,
     IceSurface,
     ManualReservation,
+    PricingRule,
     Slot,
+    WaitlistEntry,
+    with_amenities,
 )
+from .services import bulk_action_on_slots
+
+
+class AmenityFilter(admin.SimpleListFilter):
+    """Facilities having an amenity, through the indexed amenity_mask."""
+
+    title = "amenity"
+    parameter_name = "amenity"
+
+    def lookups(self, request, model_admin):
+        return Facility.AMENITY_FIELDS
+
+    def queryset(self, request, queryset):
+        if self.value() in AMENITY_BITS:
+            return queryset.filter(with_amenities(AMENITY_BITS[self.value()]))
+        return queryset
 
 
 @admin.register(Facility)
 class FacilityAdmin(admin.ModelAdmin):
     list_display = ["name", "get_full_address", "timezone"]
+    search_fields = ["name", "city"]
     filter_horizontal = ["managers"]
-    list_filter = ["handicap_accessible", "parking", "food_and_beverage"]
+    list_filter = [AmenityFilter]
     fieldsets = (
         (None, {"fields": ("name", "managers", "timezone", "stripe_account_id")}),
         (
@@ -54,6 +81,9 @@ class FacilityAdmin(admin.ModelAdmin):
 @admin.register(IceSurface)
 class IceSurfaceAdmin(admin.ModelAdmin):
     list_display = ["name", "facility", "display_order", "default_rate"]
+    list_select_related = ["facility"]
+    search_fields = ["name", "facility__name"]
+    autocomplete_fields = ["facility"]
 
 
 @admin.register(HoursOfOperation)
@@ -61,22 +91,128 @@ class HoursOfOperationAdmin(admin.ModelAdmin):
     list_display = ["ice_surface", "weekday", "open_time", "close_time"]
 
 
+@admin.register(PricingRule)
+class PricingRuleAdmin(admin.ModelAdmin):
+    list_display = ["name", "ice_surface", "priority", "weekday", "adjustment", "amount"]
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelists for tables with millions of rows: no COUNT(*) of the whole table, related
+    objects joined in (list_select_related), and id boxes rather than lists of every
+    related object as filters.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
 @admin.register(Slot)
-class SlotAdmin(admin.ModelAdmin):
+class SlotAdmin(LargeTableAdmin):
     list_display = ["ice_surface", "start", "end", "rate", "state"]
-    list_filter = ["state", "ice_surface"]
+    list_select_related = ["ice_surface__facility"]
+    list_filter = [
+        "state",
+        id_filter("ice_surface__facility_id", "facility id", "facility"),
+        id_filter("ice_surface_id", "surface id", "surface"),
+    ]
+    date_hierarchy = "start"
+    ordering = ["-start"]
+    autocomplete_fields = ["ice_surface"]
+    actions = ["block_slots", "unblock_slots", "release_slots", "reprice_slots"]
+
+    def _bulk(self, request, queryset, action, rate=None):
+        changed = bulk_action_on_slots(queryset, action, rate=rate)
+        self.message_user(request, f"{changed} slot(s) changed.", messages.SUCCESS)
+
+    @admin.action(description="Block selected available slots")
+    def block_slots(self, request, queryset):
+        self._bulk(request, queryset, "block")
+
+    @admin.action(description="Unblock selected blocked slots")
+    def unblock_slots(self, request, queryset):
+        self._bulk(request, queryset, "unblock")
+
+    @admin.action(description="Release bookings and manual reservations on selected slots")
+    def release_slots(self, request, queryset):
+        self._bulk(request, queryset, "release")
+
+    @admin.action(description="Set the rate of selected available or blocked slots")
+    def reprice_slots(self, request, queryset):
+        if "rate" in request.POST:
+            try:
+                rate = Decimal(request.POST["rate"])
+            except InvalidOperation:
+                rate = None
+            if rate is not None and rate.is_finite() and rate >= 0:
+                self._bulk(request, queryset, "set_rate", rate=rate.quantize(Decimal("0.01")))
+                return None
+            self.message_user(request, "Enter a rate of 0 or more.", messages.ERROR)
+        return TemplateResponse(
+            request,
+            "admin/bookings/slot/reprice.html",
+            {
+                **self.admin_site.each_context(request),
+                "title": "Set rate",
+                "opts": self.model._meta,
+                "count": queryset.count(),
+                "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+                "select_across": request.POST.get("select_across", "0"),
+                "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+            },
+        )
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin):
     list_display = ["slot", "user", "organization_name", "sport", "payment_status"]
+    list_select_related = ["slot__ice_surface__facility", "user"]
+    list_filter = [
+        "payment_status",
+        "sport",
+        id_filter("slot__ice_surface__facility_id", "facility id", "facility"),
+        id_filter("user_id", "user id", "user"),
+    ]
+    search_fields = ["organization_name", "stripe_payment_intent_id", "user__username"]
+    ordering = ["-pk"]
+    raw_id_fields = ["slot"]
+    autocomplete_fields = ["user"]
 
 
 @admin.register(ManualReservation)
-class ManualReservationAdmin(admin.ModelAdmin):
+class ManualReservationAdmin(LargeTableAdmin):
     list_display = ["slot", "organization_name", "created_at"]
+    list_select_related = ["slot__ice_surface__facility"]
+    ordering = ["-pk"]
+    raw_id_fields = ["slot"]
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(LargeTableAdmin):
+    list_display = ["user", "ice_surface", "date", "time_from", "time_to", "notified_at"]
+    list_select_related = ["user", "ice_surface__facility"]
+    list_filter = [id_filter("ice_surface_id", "surface id", "surface")]
+    ordering = ["-pk"]
+    raw_id_fields = ["user", "ice_surface"]
 
 
 @admin.register(BookingEvent)
-class BookingEventAdmin(admin.ModelAdmin):
-    list_display = ["booking", "event_type", "user", "created_at"]
+class BookingEventAdmin(LargeTableAdmin):
+    list_display = ["booking", "event_type", "booking_count", "facility", "user", "created_at"]
+    list_select_related = [
+        "booking__slot__ice_surface__facility",
+        "booking__user",
+        "facility",
+        "user",
+    ]
+    list_filter = [
+        "event_type",
+        "is_summary",
+        id_filter("facility_id", "facility id", "facility"),
+        id_filter("user_id", "user id", "user"),
+        id_filter("booking_id", "booking id", "booking"),
+    ]
+    ordering = ["-pk"]
+    raw_id_fields = ["booking", "bookings"]
+    autocomplete_fields = ["facility", "user"]
@@ -0,0 +1,110 @@
+"""
+Compact availability for many surfaces over a date range, for the mobile app and
+partner sites.
+
+Each surface's facility-local day is encoded as the local time of its first slot, one
+character per hour from there and a run-length rate table:
+
+    {"first": "07:00", "states": "AABB-A", "rates": [["80.00", 3], ["95.00", 2]]}
+
+States: A available, B booked, R manually reserved, X blocked, "-" an hour without a
+slot. Hours are real hours (a DST day has one more or less); rates cover the slots in
+order, skipping gaps. Everything comes from one Slot query. With a shared cache,
+availability_scopes() names the cache versions that change with it, so an ETag costs no
+query at all; per-process versions can't vouch for other workers, so there rows_tag()
+hashes the rows themselves.
+"""
+
+import hashlib
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+
+from django.utils import timezone
+
+from .facility_calendar import SLOT_LENGTH, day_finder, day_range, facility_tz, week_table
+from .models import Slot
+
+STATE_CODES = {"available": "A", "booked": "B", "manually_reserved": "R", "blocked": "X"}
+GAP = "-"
+BATCH_DAYS = 30  # default range
+MAX_DAYS = 62
+
+
+def availability_scopes(facility, surfaces, first_day, last_day):
+    """Cache version scopes covering the slots, rates and facility behind an encoding."""
+    start, end = day_range(facility_tz(facility), first_day, last_day)
+    utc_days = []
+    day, last = start.astimezone(dt_timezone.utc).date(), end.astimezone(dt_timezone.utc).date()
+    while day <= last:
+        utc_days.append(day)
+        day += timedelta(days=1)
+    return [
+        f"facility:{facility.pk}",
+        *(f"surface:{s.pk}" for s in surfaces),
+        *(f"slots:{s.pk}:{d}" for s in surfaces for d in utc_days),
+    ]
+
+
+def _rows(facility, surfaces, first_day, last_day):
+    start, end = day_range(facility_tz(facility), first_day, last_day)
+    return (
+        Slot.objects.filter(ice_surface__in=surfaces, start__gte=start, start__lt=end)
+        .order_by("ice_surface_id", "start")
+        .values_list("ice_surface_id", "start", "state", "rate")
+    )
+
+
+def rows_tag(facility, surfaces, rows):
+    """Short token over everything an encoding is built from (e.g. for an ETag)."""
+    raw = "|".join([facility.timezone, *(str(s.pk) for s in surfaces), *map(repr, rows)])
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+def _encode_day(slots, tz):
+    states, rates = [], []
+    expected = slots[0][0]
+    for start, state, rate in slots:
+        states.append(GAP * int((start - expected) / SLOT_LENGTH))
+        states.append(STATE_CODES.get(state, GAP))
+        expected = start + SLOT_LENGTH
+        rate = str(rate)
+        if rates and rates[-1][0] == rate:
+            rates[-1][1] += 1
+        else:
+            rates.append([rate, 1])
+    return {
+        "first": f"{timezone.localtime(slots[0][0], tz):%H:%M}",
+        "states": "".join(states),
+        "rates": rates,
+    }
+
+
+def encode_availability(facility, surfaces, first_day, last_day, rows):
+    """{surface id: {date: encoded day or None}} from _rows() output."""
+    tz = facility_tz(facility)
+    table = week_table(tz, first_day, (last_day - first_day).days + 1)
+    day_of = day_finder(table)
+    by_day = {s.pk: {day: [] for day, _, _ in table} for s in surfaces}
+    for surface_id, start, state, rate in rows:
+        by_day[surface_id][day_of(start)].append((start, state, rate))
+    return {
+        str(surface_id): {
+            day.isoformat(): _encode_day(slots, tz) if slots else None
+            for day, slots in days.items()
+        }
+        for surface_id, days in by_day.items()
+    }
+
+
+def availability(facility, surfaces, first_day, last_day):
+    rows = list(_rows(facility, surfaces, first_day, last_day))
+    return encode_availability(facility, surfaces, first_day, last_day, rows)
+
+
+async def aavailability_rows(facility, surfaces, first_day, last_day):
+    return [row async for row in _rows(facility, surfaces, first_day, last_day)]
+
+
+async def aavailability(facility, surfaces, first_day, last_day):
+    rows = await aavailability_rows(facility, surfaces, first_day, last_day)
+    return encode_availability(facility, surfaces, first_day, last_day, rows)
@@ -0,0 +1,248 @@
+"""
+Cached reads for customer-facing pages: facility metadata, surface lists and
+per-surface-per-day slot grids. Each getter has an async twin (aget_*) for async views.
+
+Entries are stored under versioned keys. Instead of deleting entries, writers bump a
+version number (see signals.py and the bulk paths in services.py), which changes the
+key readers look up, so stale entries are never served and simply expire.
+
+Only a shared cache (core.caching.is_shared) holds entries: bumps land in the cache of
+the process that wrote, so with per-process locmem another worker would keep serving its
+old entries. There every getter reads the database instead.
+
+Entries are built from the primary database even inside replica_reads views: misses
+follow right after writes, when a replica may not have the new rows yet, and a lagging
+read cached under the new version would be served until it expires.
+
+Versions:
+  facilities           any facility/surface/hours change (search list)
+  facility:<id>        the facility row, its surfaces and their hours
+  surface:<id>         surface settings and rates (e.g. after repricing)
+  slots:<id>:<date>    slots of a surface starting on that UTC date
+"""
+
+import hashlib
+import uuid
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from core.caching import is_shared
+from core.db_router import primary
+
+from .facility_calendar import day_bounds, facility_tz
+from .live import publish
+from .models import Facility
+
+KEY_PREFIX = "rinkrent"
+SURFACE_PREFETCH = ("ice_surfaces", "ice_surfaces__hours_of_operation")
+
+
+def _cache():
+    return caches[getattr(settings, "BOOKINGS_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "BOOKINGS_CACHE_TIMEOUT", 300)
+
+
+def _version_key(scope):
+    return f"{KEY_PREFIX}:v:{scope}"
+
+
+def _versions(scopes):
+    """Current version token of each scope, creating missing ones (one round trip if all exist)."""
+    cache = _cache()
+    keys = [_version_key(s) for s in scopes]
+    found = cache.get_many(keys)
+    missing = {k: uuid.uuid4().hex[:12] for k in keys if k not in found}
+    if missing:
+        for key, token in missing.items():
+            cache.add(key, token, timeout=None)
+        found.update(cache.get_many(list(missing)))
+    return [found.get(k, "0") for k in keys]
+
+
+async def _aversions(scopes):
+    cache = _cache()
+    keys = [_version_key(s) for s in scopes]
+    found = await cache.aget_many(keys)
+    missing = {k: uuid.uuid4().hex[:12] for k in keys if k not in found}
+    if missing:
+        for key, token in missing.items():
+            await cache.aadd(key, token, timeout=None)
+        found.update(await cache.aget_many(list(missing)))
+    return [found.get(k, "0") for k in keys]
+
+
+def versions_shared():
+    """
+    True when the versions live in a cache every worker reads. Otherwise each process
+    counts its own, and a tag from one worker says nothing about another's data.
+    """
+    return is_shared(getattr(settings, "BOOKINGS_CACHE_ALIAS", "default"))
+
+
+def version_tag(scopes):
+    """Short token that changes whenever any of these scopes is bumped (e.g. for an ETag)."""
+    return hashlib.blake2b("|".join(_versions(scopes)).encode(), digest_size=12).hexdigest()
+
+
+async def aversion_tag(scopes):
+    versions = await _aversions(scopes)
+    return hashlib.blake2b("|".join(versions).encode(), digest_size=12).hexdigest()
+
+
+def _set_new_versions(scopes):
+    _cache().set_many({_version_key(s): uuid.uuid4().hex[:12] for s in scopes}, timeout=None)
+
+
+def bump(*scopes):
+    """
+    Invalidate everything cached under these scopes. Inside a transaction the bump is
+    repeated on commit, so a reader that cached pre-commit rows in between is discarded.
+    Slot-grid scopes also wake the live streams of their surfaces (see live.py).
+    """
+    if not scopes:
+        return
+    _set_new_versions(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _set_new_versions(scopes))
+    surface_ids = {int(s.split(":")[1]) for s in scopes if s.startswith("slots:")}
+    if surface_ids:
+        # Live slot streams re-read once the change is visible to them.
+        transaction.on_commit(lambda: publish(surface_ids))
+
+
+def _cached(name, scopes, build):
+    if not versions_shared():
+        with primary():
+            return build()
+    key = ":".join([KEY_PREFIX, name, *_versions(scopes)])
+    cache = _cache()
+    value = cache.get(key)
+    if value is None:
+        with primary():
+            value = build()
+        cache.set(key, value, _timeout())
+    return value
+
+
+async def _acached(name, scopes, abuild):
+    if not versions_shared():
+        with primary():
+            return await abuild()
+    key = ":".join([KEY_PREFIX, name, *await _aversions(scopes)])
+    cache = _cache()
+    value = await cache.aget(key)
+    if value is None:
+        with primary():
+            value = await abuild()
+        await cache.aset(key, value, _timeout())
+    return value
+
+
+def invalidate_facility(facility_id):
+    bump("facilities", f"facility:{facility_id}")
+
+
+def invalidate_surface(surface_id):
+    bump(f"surface:{surface_id}")
+
+
+def invalidate_slot_days(points):
+    """Invalidate grids holding slots at these (surface_id, start) points."""
+    bump(
+        *{
+            f"slots:{surface_id}:{start.astimezone(dt_timezone.utc).date()}"
+            for surface_id, start in points
+        }
+    )
+
+
+def invalidate_slot_range(surface_ids, start, end):
+    """Invalidate grids for every UTC day touched by [start, end) on these surfaces."""
+    scopes = []
+    day = timezone.localtime(start, dt_timezone.utc).date()
+    last = timezone.localtime(end, dt_timezone.utc).date()
+    while day <= last:
+        scopes.extend(f"slots:{pk}:{day}" for pk in surface_ids)
+        day += timedelta(days=1)
+    bump(*scopes)
+
+
+def _facilities():
+    return Facility.objects.prefetch_related(*SURFACE_PREFETCH)
+
+
+def get_search_facilities():
+    """All facilities with surfaces and hours loaded, for the search page."""
+    return _cached("search", ["facilities"], lambda: list(_facilities()))
+
+
+async def aget_search_facilities():
+    async def build():
+        return [f async for f in _facilities().aiterator(chunk_size=500)]
+
+    return await _acached("search", ["facilities"], build)
+
+
+def get_facility(pk):
+    """Facility with its surfaces and their hours loaded, or None if it doesn't exist."""
+
+    def build():
+        # Cache misses as False so unknown ids don't hit the database every time.
+        return _facilities().filter(pk=pk).first() or False
+
+    return _cached(f"facility:{pk}", [f"facility:{pk}"], build) or None
+
+
+async def aget_facility(pk):
+    async def build():
+        return await _facilities().filter(pk=pk).afirst() or False
+
+    return await _acached(f"facility:{pk}", [f"facility:{pk}"], build) or None
+
+
+def get_surfaces(facility):
+    """Surfaces of a facility loaded through get_facility (no extra query)."""
+    return list(facility.ice_surfaces.all())
+
+
+def _grid_scopes(surface, day):
+    utc_days = {
+        timezone.localtime(edge, dt_timezone.utc).date()
+        for edge in day_bounds(facility_tz(surface.facility), day)
+    }
+    return [
+        f"facility:{surface.facility_id}",
+        f"surface:{surface.pk}",
+        *(f"slots:{surface.pk}:{d}" for d in sorted(utc_days)),
+    ]
+
+
+def get_slot_grid(surface, day):
+    """All slots of the surface on a facility-local day, with booking/reservation loaded."""
+    from .services import get_all_slots_for_date
+
+    return _cached(
+        f"grid:{surface.pk}:{day}",
+        _grid_scopes(surface, day),
+        lambda: list(get_all_slots_for_date(surface, day)),
+    )
+
+
+async def aget_slot_grid(surface, day):
+    from .services import ensure_slots_for_date, get_all_slots_for_date
+
+    async def build():
+        # Generating missing slots writes in a transaction, which needs a sync context.
+        await sync_to_async(ensure_slots_for_date)(surface, day)
+        return [s async for s in get_all_slots_for_date(surface, day, ensure=False).aiterator()]
+
+    return await _acached(f"grid:{surface.pk}:{day}", _grid_scopes(surface, day), build)
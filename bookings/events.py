@@ -0,0 +1,152 @@
+"""
+BookingEvent writes and activity feeds.
+
+Events are logged per group: bookings made or released together for one customer at one
+facility become a single event (two INSERTs however many bookings: the event rows and
+their booking links). Feeds page newest first with an opaque cursor over
+(created_at, id), so each page is one indexed range scan whatever its depth.
+"""
+
+import base64
+from collections import defaultdict
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import BookingEvent
+
+FEED_PAGE_SIZE = 25
+
+
+def _facility_id(booking):
+    return booking.slot.ice_surface.facility_id
+
+
+def log_event(booking, event_type, message):
+    """Log one event about one booking."""
+    return BookingEvent.objects.create(
+        booking=booking,
+        user=booking.user,
+        facility_id=_facility_id(booking),
+        event_type=event_type,
+        message=message,
+    )
+
+
+def log_group_events(bookings, event_type, message):
+    """
+    Log one event per customer and facility for bookings created or changed together.
+    Returns the events.
+    """
+    groups = defaultdict(list)
+    for b in bookings:
+        groups[(b.user_id, _facility_id(b))].append(b)
+    if not groups:
+        return []
+    events = [
+        BookingEvent(
+            booking=group[0],
+            user_id=user_id,
+            facility_id=facility_id,
+            booking_count=len(group),
+            event_type=event_type,
+            message=message,
+        )
+        for (user_id, facility_id), group in groups.items()
+    ]
+    with transaction.atomic(savepoint=False):
+        BookingEvent.objects.bulk_create(events)
+        Link = BookingEvent.bookings.through
+        Link.objects.bulk_create(
+            [
+                Link(bookingevent_id=event.pk, booking_id=b.pk)
+                for event, group in zip(events, groups.values(), strict=True)
+                for b in group
+            ]
+        )
+    return events
+
+
+def customer_events(user):
+    return BookingEvent.objects.filter(user=user)
+
+
+def facility_events(facility):
+    return BookingEvent.objects.filter(facility=facility).select_related("user")
+
+
+def booking_events(booking):
+    """Events about this booking, including group events it was part of."""
+    return BookingEvent.objects.filter(Q(booking=booking) | Q(bookings=booking)).distinct()
+
+
+def encode_cursor(event):
+    raw = f"{event.created_at.isoformat()}|{event.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from encode_cursor, or None if the cursor is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        stamp, pk = raw.split("|")
+        created_at, pk = datetime.fromisoformat(stamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if timezone.is_naive(created_at):
+        return None
+    return created_at, pk
+
+
+def feed_page(events, cursor=None, limit=FEED_PAGE_SIZE):
+    """
+    One page of events, newest first, after the given cursor.
+    Returns (events, cursor of the next page or None).
+    """
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        created_at, pk = position
+        events = events.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    page = list(events.order_by("-created_at", "-pk")[: limit + 1])
+    if len(page) > limit:
+        return page[:limit], encode_cursor(page[limit - 1])
+    return page, None
+
+
+def compact_events(before=None):
+    """
+    Roll events created before `before` (default: BOOKING_EVENT_RETENTION_DAYS ago) into one
+    summary row per facility, customer, event type and UTC day. Returns
+    (events removed, summary rows created).
+    """
+    if before is None:
+        days = getattr(settings, "BOOKING_EVENT_RETENTION_DAYS", 365)
+        before = timezone.now() - timedelta(days=days)
+    old = BookingEvent.objects.filter(created_at__lt=before, is_summary=False)
+    with transaction.atomic():
+        groups = (
+            old.annotate(day=TruncDate("created_at", tzinfo=dt_timezone.utc))
+            .values("facility_id", "user_id", "event_type", "day")
+            .annotate(events=Count("pk"), bookings=Sum("booking_count"), last=Max("created_at"))
+            .order_by()
+        )
+        summaries = [
+            BookingEvent(
+                facility_id=g["facility_id"],
+                user_id=g["user_id"],
+                event_type=g["event_type"],
+                booking_count=g["bookings"],
+                message=f"{g['events']} {g['event_type']} events on {g['day']} (summarized).",
+                is_summary=True,
+                created_at=g["last"],
+            )
+            for g in groups
+        ]
+        _, deleted = old.delete()
+        BookingEvent.objects.bulk_create(summaries, batch_size=1000)
+    return deleted.get(BookingEvent._meta.label, 0), len(summaries)
@@ -0,0 +1,88 @@
+"""
+Facility calendar: timezone objects and facility-local day boundaries, shared by slot
+generation, availability, rollups, exports and the manager views.
+
+Timezones are resolved once per name and day boundaries once per (timezone, day), so a
+week of slots across many surfaces costs one lookup per day instead of a make_aware per
+surface and day. All returned datetimes are UTC.
+
+Local times are resolved the PEP 495 way with fold=0: a time skipped by a DST jump (e.g.
+02:30 on the spring-forward day) lands just after the jump, and a repeated time (01:30 in
+the autumn) means its first occurrence. Slots are stepped in UTC, so each is exactly one
+hour long and the autumn day gets its extra hour.
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from functools import cache, lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.utils import timezone
+
+SLOT_LENGTH = timedelta(hours=1)
+
+
+@cache
+def get_tz(name):
+    """ZoneInfo for a timezone name; the project timezone if the name is blank or unknown."""
+    try:
+        return ZoneInfo(name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.get_current_timezone()
+
+
+def facility_tz(facility):
+    return get_tz(facility.timezone)
+
+
+def local_instant(day, time, tz):
+    """The UTC instant of a facility-local date and wall-clock time."""
+    return datetime.combine(day, time, tzinfo=tz).astimezone(dt_timezone.utc)
+
+
+@lru_cache(maxsize=8192)
+def day_bounds(tz, day):
+    """(start, end) of a facility-local day: local midnight to the next local midnight."""
+    return (
+        local_instant(day, datetime.min.time(), tz),
+        local_instant(day + timedelta(days=1), datetime.min.time(), tz),
+    )
+
+
+def day_range(tz, first_day, last_day):
+    """(start, end) covering facility-local days first_day..last_day inclusive."""
+    return day_bounds(tz, first_day)[0], day_bounds(tz, last_day)[1]
+
+
+@lru_cache(maxsize=1024)
+def week_table(tz, first_day, days=7):
+    """((day, start, end), ...) for `days` consecutive facility-local days from first_day."""
+    return tuple(
+        (day, *day_bounds(tz, day)) for day in (first_day + timedelta(days=n) for n in range(days))
+    )
+
+
+def day_finder(table):
+    """Map a UTC instant inside a week_table to its facility-local date, by bisection."""
+    starts = [start for _, start, _ in table]
+
+    def find(value):
+        return table[bisect_right(starts, value) - 1][0]
+
+    return find
+
+
+def local_date(value, tz):
+    return timezone.localtime(value, tz).date()
+
+
+def slot_starts(day, open_time, close_time, tz):
+    """Starts of the whole hour-long slots between opening and closing on a local day."""
+    start = local_instant(day, open_time, tz)
+    close = local_instant(day, close_time, tz)
+    starts = []
+    while start + SLOT_LENGTH <= close:
+        starts.append(start)
+        start += SLOT_LENGTH
+    return starts
@@ -0,0 +1,138 @@
+"""
+Live slot updates as Server-Sent Events.
+
+A stream watches a set of slots (a surface's day for customers, a facility's week for
+managers) and pushes one event per slot whose state or rate changed, named
+"slot-<id>" with the re-rendered cell as data; the htmx sse extension swaps just that
+cell. Streams are async responses and need the ASGI application (config/asgi.py).
+
+Two things wake a stream up:
+  - an in-process publish: cache.bump() publishes the surfaces of every slot-grid scope
+    it invalidates, after the transaction commits, so changes made by this worker arrive
+    at once;
+  - a poll every LIVE_SLOTS_POLL_SECONDS, for changes made by other workers. Set it to 0
+    when a single process serves the site.
+Either way the stream re-reads (id, state, rate) of its slots and diffs them against what
+it last saw, so a wake-up without changes sends nothing.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+from core.metrics import LIVE_SLOT_EVENTS
+
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+
+_lock = threading.Lock()
+_subscribers = defaultdict(set)
+
+
+class Subscription:
+    """Wakes one stream when any of its surfaces is published, from any thread."""
+
+    def __init__(self, surface_ids):
+        self.surface_ids = set(surface_ids)
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def notify(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:  # the stream's loop has closed
+            pass
+
+    async def wait(self, timeout):
+        """True if woken by a publish, False on timeout."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+
+def subscribe(surface_ids):
+    sub = Subscription(surface_ids)
+    with _lock:
+        for pk in sub.surface_ids:
+            _subscribers[pk].add(sub)
+    return sub
+
+
+def unsubscribe(sub):
+    with _lock:
+        for pk in sub.surface_ids:
+            _subscribers[pk].discard(sub)
+            if not _subscribers[pk]:
+                del _subscribers[pk]
+
+
+def publish(surface_ids):
+    """Wake the streams watching these surfaces."""
+    with _lock:
+        subs = {sub for pk in surface_ids for sub in _subscribers.get(pk, ())}
+    for sub in subs:
+        sub.notify()
+
+
+def sse_event(name, data):
+    lines = "".join(f"data: {line}\n" for line in data.splitlines() or [""])
+    return f"event: {name}\n{lines}\n"
+
+
+async def _states(slots):
+    return {pk: (state, rate) async for pk, state, rate in slots.values_list("pk", "state", "rate")}
+
+
+async def slot_events(slots, surface_ids, render):
+    """
+    SSE text for changes to `slots` (a queryset), rendering each changed slot with
+    render(slot). `slots` is also used to load the changed slots, so select_related what
+    render needs. Ends after LIVE_SLOTS_STREAM_SECONDS; the browser then reconnects.
+    """
+    poll = getattr(settings, "LIVE_SLOTS_POLL_SECONDS", 5)
+    timeout = min(poll, HEARTBEAT_SECONDS) if poll else HEARTBEAT_SECONDS
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, "LIVE_SLOTS_STREAM_SECONDS", 300)
+    sub = subscribe(surface_ids)
+    try:
+        seen = await _states(slots)
+        yield f"retry: {RETRY_MS}\n\n"
+        last_sent = loop.time()
+        while loop.time() < deadline:
+            woken = await sub.wait(timeout)
+            if woken or poll:
+                current = await _states(slots)
+                changed = [pk for pk, value in current.items() if seen.get(pk, value) != value]
+                seen = current
+                if changed:
+                    LIVE_SLOT_EVENTS.inc(len(changed), trigger="publish" if woken else "poll")
+                    async for slot in slots.filter(pk__in=changed):
+                        yield sse_event(f"slot-{slot.pk}", render(slot))
+                    last_sent = loop.time()
+                    continue
+            if loop.time() - last_sent >= HEARTBEAT_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = loop.time()
+    finally:
+        unsubscribe(sub)
+
+
+def event_stream(request, events):
+    """
+    StreamingHttpResponse for an SSE generator. Under WSGI it answers 204 instead, which
+    tells EventSource not to reconnect: the page keeps working, just without live updates.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Keep proxies such as nginx from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bookings.models import Facility
+from bookings.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild daily surface rollups (utilization/revenue) from slots and bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days-back",
+            type=int,
+            default=365,
+            help="Number of past days to rebuild (default 365).",
+        )
+        parser.add_argument(
+            "--days-ahead",
+            type=int,
+            default=90,
+            help="Number of future days to rebuild (default 90).",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        start = today - timedelta(days=options["days_back"])
+        end = today + timedelta(days=options["days_ahead"])
+        for facility in Facility.objects.prefetch_related("ice_surfaces"):
+            surfaces = list(facility.ice_surfaces.all())
+            if not surfaces:
+                continue
+            for surface in surfaces:
+                surface.facility = facility
+            rebuild_rollups(surfaces, start, end)
+            self.stdout.write(self.style.SUCCESS(f"{facility}: rebuilt {start} to {end}"))
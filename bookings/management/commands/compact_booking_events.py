@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bookings.events import compact_events
+
+
+class Command(BaseCommand):
+    help = "Roll old booking events into one summary row per facility, customer, type and day."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.BOOKING_EVENT_RETENTION_DAYS,
+            help="Keep events from the last this many days as they are "
+            "(default BOOKING_EVENT_RETENTION_DAYS).",
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"])
+        removed, summaries = compact_events(before)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compacted {removed} events before {before:%Y-%m-%d} into {summaries} summaries."
+            )
+        )
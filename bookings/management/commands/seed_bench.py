@@ -0,0 +1,281 @@
+import random
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from bookings.cache import bump, invalidate_facility
+from bookings.facility_calendar import SLOT_LENGTH, slot_starts
+from bookings.models import (
+    Booking,
+    BookingEvent,
+    Facility,
+    HoursOfOperation,
+    IceSurface,
+    ManualReservation,
+    Slot,
+    amenity_mask,
+)
+from bookings.pricing import compile_price_tables
+from bookings.rollups import rebuild_rollups
+from bookings.services import get_facility_tz
+
+BENCH_PREFIX = "Bench rink"
+BENCH_MANAGER = "bench-manager"
+BENCH_CUSTOMER_PREFIX = "bench-customer-"
+BATCH_SIZE = 1000
+
+# (timezone, latitude, longitude) of the cities bench rinks are scattered around.
+CITIES = [
+    ("America/Toronto", 43.6532, -79.3832),
+    ("America/Toronto", 45.4215, -75.6972),
+    ("America/Winnipeg", 49.8951, -97.1384),
+    ("America/Edmonton", 53.5461, -113.4938),
+    ("America/Vancouver", 49.2827, -123.1207),
+    ("America/Halifax", 44.6488, -63.5752),
+]
+RATES = [Decimal(r) for r in ("180", "220", "250", "275", "300", "350")]
+ORGANIZATIONS = ["", "", "Northside Minor Hockey", "Rec League", "Ringette Club", "Oldtimers"]
+SPORTS = ["hockey", "ringette", "other"]
+SPORT_WEIGHTS = [75, 15, 10]
+
+
+def booked_probability(local_start):
+    """How likely a slot is to be taken: evenings and weekend days fill up, mornings don't."""
+    hour, weekend = local_start.hour, local_start.weekday() >= 5
+    if weekend:
+        return 0.8 if 8 <= hour < 20 else 0.35
+    if 17 <= hour < 22:
+        return 0.85
+    if hour < 8:
+        return 0.3
+    return 0.15
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-create synthetic facilities, surfaces, hours, slots, bookings and events for "
+        "benchmarking (see the bench command). Bench data is named so it can be cleared."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--facilities", type=int, default=10, help="Facilities (default 10).")
+        parser.add_argument(
+            "--surfaces", type=int, default=2, help="Surfaces per facility (default 2)."
+        )
+        parser.add_argument("--days", type=int, default=60, help="Days of slots (default 60).")
+        parser.add_argument(
+            "--days-back",
+            type=int,
+            default=14,
+            help="How many of those days lie in the past (default 14).",
+        )
+        parser.add_argument("--customers", type=int, default=200, help="Customers (default 200).")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed (default 1).")
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete existing bench facilities and users first.",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        User = get_user_model()
+        if options["clear"]:
+            deleted, _ = Facility.objects.filter(name__startswith=BENCH_PREFIX).delete()
+            User.objects.filter(username__startswith="bench-").delete()
+            self.stdout.write(f"Cleared {deleted} bench rows.")
+
+        today = timezone.now().date()
+        start_date = today - timedelta(days=options["days_back"])
+        end_date = start_date + timedelta(days=options["days"] - 1)
+
+        with transaction.atomic():
+            manager, _ = User.objects.get_or_create(
+                username=BENCH_MANAGER,
+                defaults={"email": "bench-manager@example.com", "password": make_password(None)},
+            )
+            customers = self._customers(User, options["customers"])
+            facilities = self._facilities(rng, options["facilities"])
+            manager.managed_facilities.add(*facilities)
+            surfaces = self._surfaces(rng, facilities, options["surfaces"])
+            hours = self._hours(rng, surfaces)
+            slots = self._slots(rng, surfaces, hours, start_date, end_date)
+            bookings = self._bookings(rng, slots, customers, today)
+            events = self._events(rng, bookings)
+            rebuild_rollups(surfaces, start_date, end_date)
+
+        # Bulk inserts skip the signals that normally invalidate cached reads.
+        bump("facilities")
+        for facility in facilities:
+            invalidate_facility(facility.pk)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(facilities)} facilities, {len(surfaces)} surfaces, "
+                f"{len(slots)} slots, {len(bookings)} bookings, {events} events "
+                f"for {start_date} to {end_date}."
+            )
+        )
+
+    def _customers(self, User, count):
+        existing = set(
+            User.objects.filter(username__startswith=BENCH_CUSTOMER_PREFIX).values_list(
+                "username", flat=True
+            )
+        )
+        password = make_password(None)
+        User.objects.bulk_create(
+            [
+                User(username=name, email=f"{name}@example.com", password=password)
+                for name in (f"{BENCH_CUSTOMER_PREFIX}{i}" for i in range(count))
+                if name not in existing
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        return list(User.objects.filter(username__startswith=BENCH_CUSTOMER_PREFIX).order_by("pk"))
+
+    def _facilities(self, rng, count):
+        offset = Facility.objects.filter(name__startswith=BENCH_PREFIX).count()
+        amenities = [name for name, _ in Facility.AMENITY_FIELDS]
+        facilities = []
+        for i in range(count):
+            tz, lat, lng = rng.choice(CITIES)
+            facility = Facility(
+                name=f"{BENCH_PREFIX} {offset + i + 1}",
+                city=tz.split("/")[-1].replace("_", " "),
+                timezone=tz,
+                latitude=Decimal(f"{lat + rng.gauss(0, 0.08):.6f}"),
+                longitude=Decimal(f"{lng + rng.gauss(0, 0.08):.6f}"),
+            )
+            for name in amenities:
+                setattr(facility, name, rng.random() < 0.5)
+            facility.amenity_mask = amenity_mask(n for n in amenities if getattr(facility, n))
+            facilities.append(facility)
+        return Facility.objects.bulk_create(facilities, batch_size=BATCH_SIZE)
+
+    def _surfaces(self, rng, facilities, per_facility):
+        surfaces = [
+            IceSurface(
+                facility=facility,
+                name=f"Pad {chr(ord('A') + n)}",
+                display_order=n,
+                default_rate=rng.choice(RATES),
+            )
+            for facility in facilities
+            for n in range(per_facility)
+        ]
+        return IceSurface.objects.bulk_create(surfaces, batch_size=BATCH_SIZE)
+
+    def _hours(self, rng, surfaces):
+        """{surface_id: {weekday: (open, close)}}, also saved as HoursOfOperation rows."""
+        hours = {}
+        rows = []
+        for surface in surfaces:
+            opens = rng.choice([5, 6, 7])
+            closes = rng.choice([22, 23])
+            week = {}
+            for weekday in range(7):
+                if weekday >= 5:
+                    week[weekday] = (time(7), time(22))
+                else:
+                    week[weekday] = (time(opens), time(closes))
+                rows.append(
+                    HoursOfOperation(
+                        ice_surface=surface,
+                        weekday=weekday,
+                        open_time=week[weekday][0],
+                        close_time=week[weekday][1],
+                    )
+                )
+            hours[surface.pk] = week
+        HoursOfOperation.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        return hours
+
+    def _slots(self, rng, surfaces, hours, start_date, end_date):
+        """Hourly slots over the range, as generate_slots_for_surface would create them."""
+        prices = compile_price_tables(surfaces)
+        slots = []
+        for surface in surfaces:
+            tz = get_facility_tz(surface.facility)
+            table = prices[surface.pk]
+            day = start_date
+            while day <= end_date:
+                open_t, close_t = hours[surface.pk][day.weekday()]
+                for start in slot_starts(day, open_t, close_t, tz):
+                    local = timezone.localtime(start, tz)
+                    roll = rng.random()
+                    if roll < 0.01:
+                        state = "blocked"
+                    elif roll < 0.06:
+                        state = "manually_reserved"
+                    elif rng.random() < booked_probability(local):
+                        state = "booked"
+                    else:
+                        state = "available"
+                    slots.append(
+                        Slot(
+                            ice_surface=surface,
+                            start=start,
+                            end=start + SLOT_LENGTH,
+                            rate=table.rate_for(local),
+                            state=state,
+                        )
+                    )
+                day += timedelta(days=1)
+        return Slot.objects.bulk_create(slots, batch_size=BATCH_SIZE)
+
+    def _bookings(self, rng, slots, customers, today):
+        # A few regulars book most of the ice.
+        weights = [1 / (rank + 1) for rank in range(len(customers))]
+        bookings = []
+        reservations = []
+        for slot in slots:
+            if slot.state == "booked":
+                past = slot.start.date() < today
+                bookings.append(
+                    Booking(
+                        slot=slot,
+                        user=rng.choices(customers, weights)[0],
+                        organization_name=rng.choice(ORGANIZATIONS),
+                        sport=rng.choices(SPORTS, SPORT_WEIGHTS)[0],
+                        amount_paid=slot.rate,
+                        payment_status="paid"
+                        if rng.random() < (0.9 if past else 0.6)
+                        else "pending",
+                    )
+                )
+            elif slot.state == "manually_reserved":
+                reservations.append(
+                    ManualReservation(slot=slot, organization_name=rng.choice(ORGANIZATIONS[2:]))
+                )
+        ManualReservation.objects.bulk_create(reservations, batch_size=BATCH_SIZE)
+        return Booking.objects.bulk_create(bookings, batch_size=BATCH_SIZE)
+
+    def _events(self, rng, bookings):
+        events = []
+        for booking in bookings:
+            events.append(
+                BookingEvent(
+                    booking=booking,
+                    user=booking.user,
+                    facility_id=booking.slot.ice_surface.facility_id,
+                    event_type="created",
+                    message="Booking created.",
+                )
+            )
+            if rng.random() < 0.1:
+                events.append(
+                    BookingEvent(
+                        booking=booking,
+                        user=booking.user,
+                        facility_id=booking.slot.ice_surface.facility_id,
+                        event_type="facility_modified",
+                        message="Booking moved by the facility.",
+                    )
+                )
+        BookingEvent.objects.bulk_create(events, batch_size=BATCH_SIZE)
+        return len(events)
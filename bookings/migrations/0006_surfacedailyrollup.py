@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:50
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_add_facility_amenities'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurfaceDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('slots_available', models.PositiveIntegerField(default=0)),
+                ('slots_booked', models.PositiveIntegerField(default=0)),
+                ('slots_manually_reserved', models.PositiveIntegerField(default=0)),
+                ('slots_blocked', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12)),
+                ('revenue_paid', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12)),
+                ('revenue_pending', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12)),
+                ('refreshed_at', models.DateTimeField()),
+                ('ice_surface', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='bookings.icesurface')),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('ice_surface', 'date')},
+            },
+        ),
+    ]
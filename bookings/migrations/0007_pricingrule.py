@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_surfacedailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('priority', models.SmallIntegerField(default=0, help_text='Higher priority wins when several rules match')),
+                ('weekday', models.PositiveSmallIntegerField(blank=True, choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')], help_text='Blank for every day', null=True)),
+                ('start_time', models.TimeField(blank=True, help_text='Slots starting at or after', null=True)),
+                ('end_time', models.TimeField(blank=True, help_text='Slots starting before', null=True)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('season_start_month', models.PositiveSmallIntegerField(blank=True, choices=[(1, 'January'), (2, 'February'), (3, 'March'), (4, 'April'), (5, 'May'), (6, 'June'), (7, 'July'), (8, 'August'), (9, 'September'), (10, 'October'), (11, 'November'), (12, 'December')], null=True)),
+                ('season_end_month', models.PositiveSmallIntegerField(blank=True, choices=[(1, 'January'), (2, 'February'), (3, 'March'), (4, 'April'), (5, 'May'), (6, 'June'), (7, 'July'), (8, 'August'), (9, 'September'), (10, 'October'), (11, 'November'), (12, 'December')], null=True)),
+                ('lead_time_hours', models.PositiveIntegerField(blank=True, help_text='Last-minute rule: applies only when booked within this many hours of the start', null=True)),
+                ('adjustment', models.CharField(choices=[('fixed', 'Fixed rate'), ('percent', 'Percent of base rate')], default='fixed', max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Rate in dollars, or percent of the base rate (e.g. 80 for 20% off)', max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('ice_surface', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pricing_rules', to='bookings.icesurface')),
+            ],
+            options={
+                'ordering': ['-priority', 'pk'],
+            },
+        ),
+    ]
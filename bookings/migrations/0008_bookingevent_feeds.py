@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_facility(apps, schema_editor):
+    BookingEvent = apps.get_model("bookings", "BookingEvent")
+    Booking = apps.get_model("bookings", "Booking")
+    facility = Booking.objects.filter(pk=models.OuterRef("booking_id")).values(
+        "slot__ice_surface__facility_id"
+    )[:1]
+    BookingEvent.objects.filter(booking__isnull=False).update(facility=models.Subquery(facility))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_pricingrule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookingevent',
+            name='booking_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='bookingevent',
+            name='bookings',
+            field=models.ManyToManyField(blank=True, related_name='group_events', to='bookings.booking'),
+        ),
+        migrations.AddField(
+            model_name='bookingevent',
+            name='facility',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='booking_events', to='bookings.facility'),
+        ),
+        migrations.AddField(
+            model_name='bookingevent',
+            name='is_summary',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='bookingevent',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='bookingevent',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='bookingevent_user_feed'),
+        ),
+        migrations.AddIndex(
+            model_name='bookingevent',
+            index=models.Index(fields=['facility', '-created_at', '-id'], name='bookingevent_facility_feed'),
+        ),
+        migrations.AddIndex(
+            model_name='bookingevent',
+            index=models.Index(fields=['booking', '-created_at', '-id'], name='bookingevent_booking_feed'),
+        ),
+        migrations.AddIndex(
+            model_name='bookingevent',
+            index=models.Index(fields=['event_type', 'created_at'], name='bookingevent_type_created'),
+        ),
+        migrations.AddIndex(
+            model_name='bookingevent',
+            index=models.Index(fields=['created_at'], name='bookingevent_created'),
+        ),
+        migrations.RunPython(backfill_facility, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:05
+
+from django.db import migrations, models
+
+# Facility.AMENITY_FIELDS as of this migration: bit i is field i.
+AMENITIES = [
+    "handicap_accessible",
+    "food_and_beverage",
+    "licensed",
+    "gym_weight_room",
+    "change_rooms",
+    "parking",
+    "pro_shop",
+    "wifi",
+]
+
+
+def backfill_amenity_mask(apps, schema_editor):
+    Facility = apps.get_model("bookings", "Facility")
+    bits = [
+        models.Case(models.When(**{name: True}, then=models.Value(1 << i)), default=models.Value(0))
+        for i, name in enumerate(AMENITIES)
+    ]
+    Facility.objects.update(amenity_mask=sum(bits[1:], bits[0]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_waitlistentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facility',
+            name='amenity_mask',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_amenity_mask, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0011_facility_amenity_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slot',
+            name='rate_locked',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,7 +1,10 @@
+from calendar import month_name
 from decimal import Decimal
+from functools import cache
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class Facility(models.Model):
@@ -29,6 +32,8 @@ class Facility(models.Model):
     parking = models.BooleanField(default=False, verbose_name="Parking")
     pro_shop = models.BooleanField(default=False, verbose_name="Pro shop")
     wifi = models.BooleanField(default=False, verbose_name="Wi‑Fi")
+    # The amenity booleans as bits (bit i = AMENITY_FIELDS[i]), kept in step by save().
+    amenity_mask = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
     managers = models.ManyToManyField(
         settings.AUTH_USER_MODEL,
         related_name="managed_facilities",
@@ -52,7 +57,7 @@ class Facility(models.Model):
 
     get_full_address.short_description = "Address"
 
-    # Amenity field names and display labels for templates
+    # Amenity field names and display labels for templates; the order fixes amenity_mask bits.
     AMENITY_FIELDS = [
         ("handicap_accessible", "Handicap accessible"),
         ("food_and_beverage", "Food & beverage"),
@@ -64,11 +69,51 @@ class Facility(models.Model):
         ("wifi", "Wi‑Fi"),
     ]
 
+    def save(self, *args, **kwargs):
+        self.amenity_mask = amenity_mask(n for n, _ in self.AMENITY_FIELDS if getattr(self, n))
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and set(update_fields) & AMENITY_BITS.keys():
+            kwargs["update_fields"] = {*update_fields, "amenity_mask"}
+        super().save(*args, **kwargs)
+
     def get_amenities_list(self):
         """Return list of amenity labels that are True for this facility."""
-        return [
-            label for field_name, label in self.AMENITY_FIELDS if getattr(self, field_name, False)
-        ]
+        return list(amenity_labels(self.amenity_mask))
+
+    def has_amenities(self, mask):
+        return self.amenity_mask & mask == mask
+
+
+AMENITY_BITS = {name: 1 << i for i, (name, _) in enumerate(Facility.AMENITY_FIELDS)}
+
+
+def amenity_mask(names):
+    """Bitmask of these amenity field names (unknown names are ignored)."""
+    return sum({AMENITY_BITS[n] for n in names if n in AMENITY_BITS})
+
+
+@cache
+def amenity_labels(mask):
+    return tuple(label for name, label in Facility.AMENITY_FIELDS if mask & AMENITY_BITS[name])
+
+
+@cache
+def amenity_names(mask):
+    return tuple(name for name, _ in Facility.AMENITY_FIELDS if mask & AMENITY_BITS[name])
+
+
+@cache
+def _supersets(mask):
+    return tuple(m for m in range(1 << len(AMENITY_BITS)) if m & mask == mask)
+
+
+def with_amenities(mask):
+    """
+    Q for facilities having every amenity in mask. Spelled as amenity_mask IN (every mask
+    containing it), at most 256 values, so the database can use the index rather than
+    computing amenity_mask & mask on every row.
+    """
+    return models.Q(amenity_mask__in=_supersets(mask)) if mask else models.Q()
 
 
 class IceSurface(models.Model):
@@ -122,6 +167,71 @@ class HoursOfOperation(models.Model):
         )
 
 
+class PricingRule(models.Model):
+    """
+    Peak/off-peak price for an ice surface. Calendar rules (weekday, time window,
+    date range, season) set the stored Slot.rate; lead-time rules only adjust the
+    price at booking time. When several rules match, the highest priority wins.
+    """
+
+    MONTHS = [(i, name) for i, name in enumerate(month_name) if i]
+    ADJUSTMENT_CHOICES = [
+        ("fixed", "Fixed rate"),
+        ("percent", "Percent of base rate"),
+    ]
+    ice_surface = models.ForeignKey(
+        IceSurface, on_delete=models.CASCADE, related_name="pricing_rules"
+    )
+    name = models.CharField(max_length=100)
+    priority = models.SmallIntegerField(
+        default=0, help_text="Higher priority wins when several rules match"
+    )
+    weekday = models.PositiveSmallIntegerField(
+        choices=HoursOfOperation.WEEKDAYS, null=True, blank=True, help_text="Blank for every day"
+    )
+    start_time = models.TimeField(null=True, blank=True, help_text="Slots starting at or after")
+    end_time = models.TimeField(null=True, blank=True, help_text="Slots starting before")
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    season_start_month = models.PositiveSmallIntegerField(choices=MONTHS, null=True, blank=True)
+    season_end_month = models.PositiveSmallIntegerField(choices=MONTHS, null=True, blank=True)
+    lead_time_hours = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Last-minute rule: applies only when booked within this many hours of the start",
+    )
+    adjustment = models.CharField(max_length=10, choices=ADJUSTMENT_CHOICES, default="fixed")
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text="Rate in dollars, or percent of the base rate (e.g. 80 for 20% off)",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-priority", "pk"]
+
+    def __str__(self):
+        return f"{self.ice_surface} – {self.name}"
+
+    @property
+    def season_months(self):
+        """Months (1-12) covered by the season, wrapping over New Year; None for all year."""
+        if not self.season_start_month or not self.season_end_month:
+            return None
+        start, end = self.season_start_month, self.season_end_month
+        if start <= end:
+            return list(range(start, end + 1))
+        return list(range(start, 13)) + list(range(1, end + 1))
+
+    def apply(self, base_rate):
+        """Price for a slot whose base rate is base_rate."""
+        if self.adjustment == "percent":
+            return (base_rate * self.amount / 100).quantize(Decimal("0.01"))
+        return self.amount
+
+
 class Slot(models.Model):
     """A 1-hour bookable time slot for an ice surface."""
 
@@ -136,10 +246,14 @@ class Slot(models.Model):
     end = models.DateTimeField()
     rate = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0"))
     state = models.CharField(max_length=20, choices=STATE_CHOICES, default="available")
+    # Set by the bulk "Set rate" action; pricing rule changes leave these rates alone.
+    rate_locked = models.BooleanField(default=False)
 
     class Meta:
         ordering = ["start"]
         unique_together = [["ice_surface", "start"]]
+        # Slot lists across all surfaces (admin date drill-down, newest first).
+        indexes = [models.Index(fields=["start", "id"], name="slot_start")]
 
     def __str__(self):
         return f"{self.ice_surface} {self.start} ({self.state})"
@@ -183,12 +297,59 @@ class ManualReservation(models.Model):
         return f"{self.organization_name} – {self.slot}"
 
 
+class WaitlistEntry(models.Model):
+    """
+    A customer waiting for a slot on a surface on a facility-local date, between
+    time_from and time_to. window_start/window_end hold the same window as UTC instants,
+    so a released slot finds its waiters with one indexed range lookup.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="waitlist_entries"
+    )
+    ice_surface = models.ForeignKey(
+        IceSurface, on_delete=models.CASCADE, related_name="waitlist_entries"
+    )
+    date = models.DateField()
+    time_from = models.TimeField()
+    time_to = models.TimeField()
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    created_at = models.DateTimeField(default=timezone.now)
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(
+                fields=["ice_surface", "window_start", "window_end"],
+                condition=models.Q(notified_at__isnull=True),
+                name="waitlist_open_window",
+            ),
+            models.Index(fields=["user", "date"], name="waitlist_user_date"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} waiting for {self.ice_surface} {self.date} {self.time_from}–{self.time_to}"
+
+
 class BookingEvent(models.Model):
-    """Log of booking-related events for notifications and audit."""
+    """
+    Log of booking-related events for notifications and audit. Bookings made or released
+    together are logged as one event: ``booking`` is the first of them, ``bookings`` all of
+    them and ``booking_count`` how many. Summary rows (``is_summary``) stand in for old
+    events rolled up per facility, user, type and day by compact_booking_events.
+    """
 
     booking = models.ForeignKey(
         Booking, on_delete=models.SET_NULL, related_name="events", null=True, blank=True
     )
+    bookings = models.ManyToManyField(Booking, related_name="group_events", blank=True)
+    booking_count = models.PositiveIntegerField(default=1)
+    # Kept on the event so the facility feed survives released (deleted) bookings.
+    facility = models.ForeignKey(
+        Facility, on_delete=models.CASCADE, related_name="booking_events", null=True, blank=True
+    )
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True
     )
@@ -196,7 +357,46 @@ class BookingEvent(models.Model):
         max_length=50
     )  # e.g. created, updated, cancelled, facility_modified
     message = models.TextField(blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    is_summary = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Feeds page newest first by (created_at, id).
+            models.Index(fields=["user", "-created_at", "-id"], name="bookingevent_user_feed"),
+            models.Index(
+                fields=["facility", "-created_at", "-id"], name="bookingevent_facility_feed"
+            ),
+            models.Index(
+                fields=["booking", "-created_at", "-id"], name="bookingevent_booking_feed"
+            ),
+            models.Index(fields=["event_type", "created_at"], name="bookingevent_type_created"),
+            models.Index(fields=["created_at"], name="bookingevent_created"),
+        ]
 
     def __str__(self):
         return f"{self.event_type} @ {self.created_at}"
+
+
+class SurfaceDailyRollup(models.Model):
+    """Per-surface, per-day (facility-local) slot and revenue counts for dashboards."""
+
+    ice_surface = models.ForeignKey(
+        IceSurface, on_delete=models.CASCADE, related_name="daily_rollups"
+    )
+    date = models.DateField()
+    slots_available = models.PositiveIntegerField(default=0)
+    slots_booked = models.PositiveIntegerField(default=0)
+    slots_manually_reserved = models.PositiveIntegerField(default=0)
+    slots_blocked = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0"))
+    revenue_paid = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0"))
+    revenue_pending = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0"))
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["date"]
+        unique_together = [["ice_surface", "date"]]
+
+    def __str__(self):
+        return f"{self.ice_surface} {self.date}"
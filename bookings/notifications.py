@@ -1,31 +1,56 @@
-"""Send booking-related emails and record BookingEvent."""
+"""
+Send booking-related emails and record BookingEvent.
+
+Events are written in the caller's transaction; emails are handed to the mail backend
+only once it commits (at once outside a transaction), so a slow mail server never holds
+row locks and a rolled-back booking sends nothing.
+"""
+
+from collections import defaultdict
 
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import send_mail, send_mass_mail
+from django.db import transaction
+from django.utils import timezone
+
+from core.metrics import EMAILS_SENT
 
-from .models import BookingEvent
+from .events import log_event, log_group_events
+from .facility_calendar import facility_tz
+from .models import WaitlistEntry
 
 
 def _send_email(subject, message, to_emails, fail_silently=True):
     if not to_emails:
         return
-    send_mail(
-        subject,
-        message,
-        getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@rinkrent.example.com"),
-        to_emails,
-        fail_silently=fail_silently,
-    )
+
+    def send():
+        sent = send_mail(
+            subject,
+            message,
+            getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@rinkrent.example.com"),
+            to_emails,
+            fail_silently=fail_silently,
+        )
+        EMAILS_SENT.inc(1, outcome="sent" if sent else "failed")
+
+    transaction.on_commit(send)
+
+
+def _send_mass_email(emails):
+    """send_mass_mail over one connection once the transaction commits."""
+
+    def send():
+        sent = send_mass_mail(emails, fail_silently=True)
+        EMAILS_SENT.inc(sent, outcome="sent")
+        EMAILS_SENT.inc(len(emails) - sent, outcome="failed")
+
+    transaction.on_commit(send)
 
 
 def notify_booking_modified_by_facility(booking, message):
     """Facility edited or cancelled a booking: email customer and log event."""
-    BookingEvent.objects.create(
-        booking=booking,
-        user=booking.user,
-        event_type="facility_modified",
-        message=message,
-    )
+    log_event(booking, "facility_modified", message)
     email = getattr(booking.user, "email", None)
     if email:
         _send_email(
@@ -37,12 +62,7 @@ def notify_booking_modified_by_facility(booking, message):
 
 def notify_booking_released(booking, message):
     """Facility released/cancelled the booking: email customer and log event."""
-    BookingEvent.objects.create(
-        booking=booking,
-        user=booking.user,
-        event_type="cancelled_by_facility",
-        message=message,
-    )
+    log_event(booking, "cancelled_by_facility", message)
     email = getattr(booking.user, "email", None)
     if email:
         _send_email(
@@ -52,32 +72,34 @@ def notify_booking_released(booking, message):
         )
 
 
-def notify_booking_created(booking):
-    """Customer created a booking: optional email to facility."""
-    BookingEvent.objects.create(
-        booking=booking,
-        user=booking.user,
-        event_type="created",
-        message="Booking created.",
-    )
-    facility = booking.slot.ice_surface.facility
+def notify_bookings_created(bookings):
+    """
+    Customer booked several slots at one facility in one go: log one event for them and
+    email the facility about each, fetching the managers once.
+    """
+    if not bookings:
+        return
+    log_group_events(bookings, "created", "Booking created.")
+    facility = bookings[0].slot.ice_surface.facility
     manager_emails = [m.email for m in facility.managers.all() if getattr(m, "email", None)]
-    if manager_emails:
-        _send_email(
+    if not manager_emails:
+        return
+    sender = getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@rinkrent.example.com")
+    emails = [
+        (
             "New RinkRent booking",
-            f"A new booking was made for {booking.slot.ice_surface.name} on {booking.slot.start}.",
+            f"A new booking was made for {b.slot.ice_surface.name} on {b.slot.start}.",
+            sender,
             manager_emails,
         )
+        for b in bookings
+    ]
+    _send_mass_email(emails)
 
 
 def notify_booking_cancelled_by_customer(booking):
     """Customer cancelled: optional email to facility."""
-    BookingEvent.objects.create(
-        booking=booking,
-        user=booking.user,
-        event_type="cancelled_by_customer",
-        message="Customer cancelled.",
-    )
+    log_event(booking, "cancelled_by_customer", "Customer cancelled.")
     facility = booking.slot.ice_surface.facility
     manager_emails = [m.email for m in facility.managers.all() if getattr(m, "email", None)]
     if manager_emails:
@@ -86,3 +108,83 @@ def notify_booking_cancelled_by_customer(booking):
             f"A booking for {booking.slot.ice_surface.name} on {booking.slot.start} was cancelled by the customer.",
             manager_emails,
         )
+
+
+def notify_bookings_released(bookings, message):
+    """
+    Facility released many bookings at once (bulk action): log one event per customer
+    and send each customer a single email listing all of their cancelled slots.
+    """
+    if not bookings:
+        return
+    log_group_events(bookings, "cancelled_by_facility", message)
+    by_email = defaultdict(list)
+    for b in bookings:
+        email = getattr(b.user, "email", None)
+        if email:
+            by_email[email].append(f"- {b.slot.ice_surface.name} on {b.slot.start}")
+    sender = getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@rinkrent.example.com")
+    emails = [
+        (
+            "Your RinkRent bookings were cancelled",
+            message + "\n\n" + "\n".join(lines),
+            sender,
+            [email],
+        )
+        for email, lines in by_email.items()
+    ]
+    _send_mass_email(emails)
+
+
+def notify_recurring_booking_created(bookings):
+    """Customer booked a recurring series: one event, one summary email to the facility."""
+    if not bookings:
+        return
+    first = bookings[0]
+    log_group_events(bookings, "created", "Recurring booking created.")
+    surface = first.slot.ice_surface
+    manager_emails = [m.email for m in surface.facility.managers.all() if getattr(m, "email", None)]
+    if manager_emails:
+        lines = "\n".join(f"- {b.slot.start}" for b in bookings)
+        _send_email(
+            "New RinkRent recurring booking",
+            f"{first.user} booked {len(bookings)} slots on {surface.name}"
+            f" for {first.organization_name or 'their team'}:\n{lines}",
+            manager_emails,
+        )
+
+
+def notify_waitlist_entries(offers):
+    """
+    Tell waiting customers that slots opened up: `offers` maps waitlist entry id to the
+    released slot starts in its window. Entries are loaded in one query and each customer
+    gets one email, sent in the order they joined the waitlist.
+    """
+    entries = WaitlistEntry.objects.filter(pk__in=offers).select_related(
+        "user", "ice_surface__facility"
+    )
+    by_email = {}
+    for entry in entries.order_by("created_at", "id"):
+        email = getattr(entry.user, "email", None)
+        if not email:
+            continue
+        tz = facility_tz(entry.ice_surface.facility)
+        by_email.setdefault(email, []).extend(
+            f"- {entry.ice_surface.facility.name}, {entry.ice_surface.name}:"
+            f" {timezone.localtime(start, tz):%Y-%m-%d %H:%M}"
+            for start in offers[entry.pk]
+        )
+    if not by_email:
+        return
+    sender = getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@rinkrent.example.com")
+    emails = [
+        (
+            "Ice time you were waiting for is available",
+            "These slots were just released and can be booked now, first come first served:"
+            "\n\n" + "\n".join(lines),
+            sender,
+            [email],
+        )
+        for email, lines in by_email.items()
+    ]
+    _send_mass_email(emails)
@@ -0,0 +1,118 @@
+"""
+Pricing rules: compiled once per surface into lookup tables, applied in memory while
+slots are generated and booked, and pushed to stored slot rates with one UPDATE per rule.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models.functions import ExtractMonth
+from django.utils import timezone
+
+from .facility_calendar import facility_tz
+from .models import PricingRule, Slot
+
+
+class PriceTable:
+    """Pricing rules for one surface, bucketed by weekday, highest priority first."""
+
+    def __init__(self, surface, rules):
+        self.default_rate = surface.default_rate or Decimal("0")
+        self.by_weekday = {day: [] for day in range(7)}
+        self.lead_time_rules = []
+        for rule in sorted(rules, key=lambda r: (-r.priority, r.pk)):
+            rule.months = rule.season_months
+            if rule.lead_time_hours is not None:
+                self.lead_time_rules.append(rule)
+                continue
+            for day in range(7) if rule.weekday is None else [rule.weekday]:
+                self.by_weekday[day].append(rule)
+        # Lead-time rules can be limited like calendar ones, in facility-local time.
+        self.tz = facility_tz(surface.facility) if self.lead_time_rules else None
+
+    @staticmethod
+    def _matches(rule, local_start):
+        t, d = local_start.time(), local_start.date()
+        return (
+            (rule.start_time is None or t >= rule.start_time)
+            and (rule.end_time is None or t < rule.end_time)
+            and (rule.start_date is None or d >= rule.start_date)
+            and (rule.end_date is None or d <= rule.end_date)
+            and (rule.months is None or d.month in rule.months)
+        )
+
+    def rate_for(self, local_start):
+        """Stored rate for a slot starting at local_start (facility-local datetime)."""
+        for rule in self.by_weekday[local_start.weekday()]:
+            if self._matches(rule, local_start):
+                return rule.apply(self.default_rate)
+        return self.default_rate
+
+    def quote(self, slot_rate, start, now):
+        """Price to charge for a slot now: its stored rate, less any lead-time discount."""
+        if not self.lead_time_rules:
+            return slot_rate
+        hours_ahead = (start - now).total_seconds() / 3600
+        local_start = timezone.localtime(start, self.tz)
+        for rule in self.lead_time_rules:
+            if rule.weekday is not None and local_start.weekday() != rule.weekday:
+                continue
+            if 0 <= hours_ahead <= rule.lead_time_hours and self._matches(rule, local_start):
+                return rule.apply(slot_rate)
+        return slot_rate
+
+
+def compile_price_tables(surfaces):
+    """{surface_id: PriceTable} for these surfaces, from a single rules query."""
+    surfaces = list(surfaces)
+    rules = defaultdict(list)
+    for rule in PricingRule.objects.filter(ice_surface__in=surfaces):
+        rules[rule.ice_surface_id].append(rule)
+    return {s.pk: PriceTable(s, rules[s.pk]) for s in surfaces}
+
+
+def quote_slots(slots, now=None):
+    """{slot_pk: price} for slots (with ice_surface loaded); one query for all rules."""
+    now = now or timezone.now()
+    tables = compile_price_tables({s.ice_surface_id: s.ice_surface for s in slots}.values())
+    return {s.pk: tables[s.ice_surface_id].quote(s.rate, s.start, now) for s in slots}
+
+
+def reprice_future_slots(surface):
+    """
+    Re-apply calendar rules to the surface's future available/blocked slots: reset to
+    the default rate, then one set-based UPDATE per rule, lowest priority first, so the
+    highest-priority matching rule ends up on each slot. Rates set by hand (rate_locked)
+    are kept until the "Reset rate" bulk action hands them back to the rules.
+    """
+    from .cache import invalidate_surface
+    from .services import get_facility_tz, select_slots
+
+    tz = get_facility_tz(surface.facility)
+    now = timezone.now()
+    today = timezone.localtime(now, tz).date()
+    sellable = ["available", "blocked"]
+    default_rate = surface.default_rate or Decimal("0")
+    open_slots = Slot.objects.filter(
+        ice_surface=surface, start__gte=now, state__in=sellable, rate_locked=False
+    )
+    open_slots.update(rate=default_rate)
+    rules = surface.pricing_rules.filter(lead_time_hours__isnull=True).order_by("priority", "-pk")
+    for rule in rules:
+        if rule.end_date and rule.end_date < today:
+            continue
+        qs = select_slots(
+            [surface],
+            tz,
+            max(rule.start_date or today, today),
+            rule.end_date,
+            weekdays=None if rule.weekday is None else [rule.weekday],
+            time_from=rule.start_time,
+            time_to=rule.end_time,
+        ).filter(start__gte=now, state__in=sellable, rate_locked=False)
+        if rule.season_months:
+            qs = qs.annotate(local_month=ExtractMonth("start", tzinfo=tz)).filter(
+                local_month__in=rule.season_months
+            )
+        qs.update(rate=rule.apply(default_rate))
+    invalidate_surface(surface.pk)
@@ -0,0 +1,213 @@
+"""
+Daily utilization/revenue rollups per ice surface.
+
+Rows are recomputed per (surface, facility-local day) whenever a slot or booking on
+that day changes, so dashboards read a handful of rollup rows instead of scanning
+Slot/Booking history.
+"""
+
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .facility_calendar import day_range, facility_tz
+from .models import IceSurface, Slot, SurfaceDailyRollup
+
+ROLLUP_COUNT_FIELDS = [
+    "slots_available",
+    "slots_booked",
+    "slots_manually_reserved",
+    "slots_blocked",
+]
+ROLLUP_MONEY_FIELDS = ["revenue", "revenue_paid", "revenue_pending"]
+
+_local = threading.local()
+
+
+def rebuild_rollups(surfaces, start_date, end_date):
+    """
+    Recompute rollup rows for the given surfaces for every facility-local day from
+    start_date to end_date (inclusive). Days without slots lose their rollup row.
+    """
+    by_tz = defaultdict(list)
+    for surface in surfaces:
+        by_tz[facility_tz(surface.facility)].append(surface.pk)
+    stamp = timezone.now()
+    for tz, surface_ids in by_tz.items():
+        range_start, range_end = day_range(tz, start_date, end_date)
+        paid = Q(state="booked", booking__payment_status="paid")
+        pending = Q(state="booked", booking__payment_status="pending")
+        rows = (
+            Slot.objects.filter(
+                ice_surface_id__in=surface_ids, start__gte=range_start, start__lt=range_end
+            )
+            .annotate(day=TruncDate("start", tzinfo=tz))
+            .values("ice_surface_id", "day")
+            .annotate(
+                slots_available=Count("pk", filter=Q(state="available")),
+                slots_booked=Count("pk", filter=Q(state="booked")),
+                slots_manually_reserved=Count("pk", filter=Q(state="manually_reserved")),
+                slots_blocked=Count("pk", filter=Q(state="blocked")),
+                revenue_paid=Sum("booking__amount_paid", filter=paid),
+                revenue_pending=Sum("booking__amount_paid", filter=pending),
+            )
+            .order_by()
+        )
+        rollups = []
+        for row in rows:
+            revenue_paid = row["revenue_paid"] or Decimal("0")
+            revenue_pending = row["revenue_pending"] or Decimal("0")
+            rollups.append(
+                SurfaceDailyRollup(
+                    ice_surface_id=row["ice_surface_id"],
+                    date=row["day"],
+                    slots_available=row["slots_available"],
+                    slots_booked=row["slots_booked"],
+                    slots_manually_reserved=row["slots_manually_reserved"],
+                    slots_blocked=row["slots_blocked"],
+                    revenue=revenue_paid + revenue_pending,
+                    revenue_paid=revenue_paid,
+                    revenue_pending=revenue_pending,
+                    refreshed_at=stamp,
+                )
+            )
+        if rollups:
+            SurfaceDailyRollup.objects.bulk_create(
+                rollups,
+                update_conflicts=True,
+                unique_fields=["ice_surface", "date"],
+                update_fields=ROLLUP_COUNT_FIELDS + ROLLUP_MONEY_FIELDS + ["refreshed_at"],
+            )
+        # Anything in range not touched above no longer has slots.
+        SurfaceDailyRollup.objects.filter(
+            ice_surface_id__in=surface_ids,
+            date__gte=start_date,
+            date__lte=end_date,
+            refreshed_at__lt=stamp,
+        ).delete()
+
+
+def _rebuild_for(slot_ids, points):
+    """
+    Rebuild rollups covering the given slot ids and (surface_id, start) points,
+    one date range per surface; slot ids are resolved with a single query.
+    """
+    points = set(points)
+    if slot_ids:
+        points.update(Slot.objects.filter(pk__in=slot_ids).values_list("ice_surface_id", "start"))
+    if not points:
+        return
+    starts_by_surface = defaultdict(list)
+    for surface_id, start in points:
+        starts_by_surface[surface_id].append(start)
+    surfaces = IceSurface.objects.select_related("facility").filter(pk__in=starts_by_surface)
+    by_range = defaultdict(list)
+    for surface in surfaces:
+        tz = facility_tz(surface.facility)
+        dates = [timezone.localtime(start, tz).date() for start in starts_by_surface[surface.pk]]
+        by_range[(min(dates), max(dates))].append(surface)
+    for (start_date, end_date), group in by_range.items():
+        rebuild_rollups(group, start_date, end_date)
+
+
+@contextmanager
+def defer_rollups():
+    """
+    Collect rollup refreshes inside the block and run them once at the end.
+    Use around loops that save many slots/bookings (slot generation, multi-slot booking).
+    """
+    depth = getattr(_local, "depth", 0)
+    if depth == 0:
+        _local.slot_ids, _local.points = set(), set()
+    _local.depth = depth + 1
+    try:
+        yield
+    finally:
+        _local.depth = depth
+        if depth == 0:
+            slot_ids, points = _local.slot_ids, _local.points
+            _local.slot_ids, _local.points = set(), set()
+            _rebuild_for(slot_ids, points)
+
+
+def _schedule(slot_ids=(), points=()):
+    if getattr(_local, "depth", 0):
+        _local.slot_ids.update(slot_ids)
+        _local.points.update(points)
+    else:
+        _rebuild_for(slot_ids, points)
+
+
+def refresh_rollups_for_slots(slots):
+    """Refresh rollups for the days touched by these slots (instances or a queryset)."""
+    if hasattr(slots, "values_list"):
+        points = slots.values_list("ice_surface_id", "start")
+    else:
+        points = [(slot.ice_surface_id, slot.start) for slot in slots]
+    _schedule(points=points)
+
+
+def refresh_rollups_for_slot_ids(slot_ids):
+    """Like refresh_rollups_for_slots when only slot ids are at hand (e.g. from a booking)."""
+    _schedule(slot_ids=slot_ids)
+
+
+def summarize_rollups(facility, start_date, end_date):
+    """
+    Per-surface and total utilization/revenue for a facility between two dates
+    (inclusive), read from rollup rows only.
+    """
+    rows = list(
+        SurfaceDailyRollup.objects.filter(
+            ice_surface__facility=facility, date__gte=start_date, date__lte=end_date
+        )
+        .values("ice_surface_id", "ice_surface__name")
+        .annotate(
+            **{f: Sum(f) for f in ROLLUP_COUNT_FIELDS + ROLLUP_MONEY_FIELDS},
+        )
+        .order_by("ice_surface__display_order", "ice_surface__name")
+    )
+    totals = {f: 0 for f in ROLLUP_COUNT_FIELDS}
+    totals.update({f: Decimal("0") for f in ROLLUP_MONEY_FIELDS})
+    for row in rows:
+        row["name"] = row.pop("ice_surface__name")
+        for f in ROLLUP_COUNT_FIELDS + ROLLUP_MONEY_FIELDS:
+            totals[f] += row[f] or 0
+        row["utilization"] = _utilization(row)
+    totals["utilization"] = _utilization(totals)
+    return {"surfaces": rows, "totals": totals}
+
+
+def _utilization(row):
+    """Share of sellable slots (not blocked) that are booked or manually reserved, in %."""
+    taken = row["slots_booked"] + row["slots_manually_reserved"]
+    sellable = taken + row["slots_available"]
+    if not sellable:
+        return 0
+    return round(taken * 100 / sellable, 1)
+
+
+def summarize_rollups_by_facility(facility_ids, start_date, end_date):
+    """
+    {facility_id: totals} for several facilities between two dates (inclusive),
+    from one query over rollup rows grouped by facility.
+    """
+    rows = (
+        SurfaceDailyRollup.objects.filter(
+            ice_surface__facility_id__in=facility_ids, date__gte=start_date, date__lte=end_date
+        )
+        .values("ice_surface__facility_id")
+        .annotate(**{f: Sum(f) for f in ROLLUP_COUNT_FIELDS + ROLLUP_MONEY_FIELDS})
+        .order_by()
+    )
+    summary = {}
+    for row in rows:
+        facility_id = row.pop("ice_surface__facility_id")
+        row["utilization"] = _utilization(row)
+        summary[facility_id] = row
+    return summary
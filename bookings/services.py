@@ -2,26 +2,110 @@
 Booking business logic: slot generation, availability, cancel checks.
 """
 
-from datetime import datetime, timedelta
-from decimal import Decimal
+from collections import defaultdict
+from datetime import timedelta
 
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Min
+from django.db.models.functions import ExtractIsoWeekDay, TruncTime
 from django.utils import timezone
 
-from .models import Slot
+from core.db_router import primary
+from core.metrics import BOOKINGS_CREATED, BULK_SLOT_CHANGES, SLOTS_GENERATED
+
+from .cache import invalidate_slot_days, invalidate_slot_range
+from .facility_calendar import (
+    SLOT_LENGTH,
+    day_bounds,
+    day_range,
+    facility_tz,
+    local_instant,
+    slot_starts,
+)
+from .models import Booking, HoursOfOperation, IceSurface, ManualReservation, Slot
+from .pricing import compile_price_tables, reprice_future_slots
+from .rollups import defer_rollups, rebuild_rollups, refresh_rollups_for_slots
+from .waitlist import notify_waitlist
 
 
 def get_facility_tz(facility):
     """Return the facility's timezone for date/slot logic. Use for filtering slots by date."""
-    try:
-        from zoneinfo import ZoneInfo
+    return facility_tz(facility)
+
+
+_facility_tz = facility_tz
 
-        return ZoneInfo(facility.timezone or "UTC")
-    except Exception:
-        return timezone.get_current_timezone()
+
+def _generate_slots(plan):
+    """
+    Create the missing hourly slots for {surface: [facility-local dates]} from hours of
+    operation. Hours, price rules and existing slots are each read in one query and new
+    slots are inserted in bulk, however many surfaces and days are asked for.
+    Returns the created slots.
+    """
+    surfaces = list(plan)
+    hours = defaultdict(dict)
+    for h in HoursOfOperation.objects.filter(ice_surface__in=surfaces):
+        hours[h.ice_surface_id][h.weekday] = (h.open_time, h.close_time)
+    prices = compile_price_tables(surfaces)
+
+    candidates = []
+    for surface, days in plan.items():
+        tz = _facility_tz(surface.facility)
+        for day in days:
+            if day.weekday() not in hours[surface.pk]:
+                continue
+            open_t, close_t = hours[surface.pk][day.weekday()]
+            candidates.extend(
+                (surface, start, prices[surface.pk].rate_for(timezone.localtime(start, tz)))
+                for start in slot_starts(day, open_t, close_t, tz)
+            )
+    if not candidates:
+        return []
+
+    first = min(start for _, start, _ in candidates)
+    last = max(start for _, start, _ in candidates)
+    for attempt in range(2):
+        existing = set(
+            Slot.objects.filter(
+                ice_surface__in=surfaces, start__gte=first, start__lte=last
+            ).values_list("ice_surface_id", "start")
+        )
+        created = [
+            Slot(
+                ice_surface=surface,
+                start=start,
+                end=start + SLOT_LENGTH,
+                rate=rate,
+                state="available",
+            )
+            for surface, start, rate in candidates
+            if (surface.pk, start) not in existing
+        ]
+        try:
+            with transaction.atomic():
+                # No ignore_conflicts, so every slot returned and counted was inserted here.
+                Slot.objects.bulk_create(created, batch_size=1000)
+                # bulk_create skips the model signals.
+                refresh_rollups_for_slots(created)
+                invalidate_slot_days((s.ice_surface_id, s.start) for s in created)
+            break
+        except IntegrityError:
+            # A concurrent request created some of them meanwhile: look again, once.
+            if attempt:
+                raise
+    SLOTS_GENERATED.inc(len(created))
+    return created
 
 
-def _facility_tz(facility):
-    return get_facility_tz(facility)
+def _local_dates(start_date, end_date):
+    day = start_date.date() if hasattr(start_date, "date") else start_date
+    end = end_date.date() if hasattr(end_date, "date") else end_date
+    days = []
+    while day <= end:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
 
 
 def generate_slots_for_surface(ice_surface, start_date, end_date):
@@ -29,35 +113,39 @@ def generate_slots_for_surface(ice_surface, start_date, end_date):
     Generate 1-hour slots for an ice surface between start_date and end_date
     based on its hours of operation. Creates only slots that don't already exist.
     """
-    created = []
-    day = start_date.date() if hasattr(start_date, "date") else start_date
-    end = end_date.date() if hasattr(end_date, "date") else end_date
-    hours = {h.weekday: (h.open_time, h.close_time) for h in ice_surface.hours_of_operation.all()}
-    tz = _facility_tz(ice_surface.facility)
-    rate = ice_surface.default_rate or Decimal("0")
+    created = _generate_slots({ice_surface: _local_dates(start_date, end_date)})
+    return [(s.start, s.end) for s in created]
 
-    while day <= end:
-        if day.weekday() not in hours:
-            day += timedelta(days=1)
-            continue
-        open_t, close_t = hours[day.weekday()]
-        slot_start = timezone.make_aware(datetime.combine(day, open_t), tz)
-        day_end_dt = timezone.make_aware(datetime.combine(day, close_t), tz)
-
-        while slot_start + timedelta(hours=1) <= day_end_dt:
-            slot_end = slot_start + timedelta(hours=1)
-            _, was_created = Slot.objects.get_or_create(
-                ice_surface=ice_surface,
-                start=slot_start,
-                defaults={"end": slot_end, "rate": rate, "state": "available"},
-            )
-            if was_created:
-                created.append((slot_start, slot_end))
-            slot_start = slot_end
 
-        day += timedelta(days=1)
+def generate_slots_for_surfaces(surfaces, start_date, end_date):
+    """generate_slots_for_surface for many surfaces in one pass. Returns the number created."""
+    days = _local_dates(start_date, end_date)
+    return len(_generate_slots({surface: days for surface in surfaces}))
 
-    return created
+
+def ensure_slots_for_range(surfaces, start_date, end_date):
+    """
+    ensure_slots_for_date for several surfaces and facility-local days at once: one
+    query finds the days that already have slots, the rest are generated together.
+    Returns True if any slots were generated.
+    """
+    surfaces = list(surfaces)
+    if not surfaces:
+        return False
+    days = _local_dates(start_date, end_date)
+    tzs = {s.pk: _facility_tz(s.facility) for s in surfaces}
+    bounds = [edge for tz in set(tzs.values()) for edge in day_range(tz, days[0], days[-1])]
+    # Read on the primary: on a lagging replica we would generate existing days again.
+    with primary():
+        existing = Slot.objects.filter(
+            ice_surface__in=surfaces, start__gte=min(bounds), start__lt=max(bounds)
+        ).values_list("ice_surface_id", "start")
+        have = {(pk, timezone.localtime(start, tzs[pk]).date()) for pk, start in existing}
+        plan = {s: [d for d in days if (s.pk, d) not in have] for s in surfaces}
+        if not any(plan.values()):
+            return False
+        _generate_slots({s: d for s, d in plan.items() if d})
+    return True
 
 
 def ensure_slots_for_date(ice_surface, date):
@@ -66,24 +154,21 @@ def ensure_slots_for_date(ice_surface, date):
     and no slots exist yet. Call before get_available_slots so availability "just works"
     without requiring the user to run generate_slots.
     """
-    tz = _facility_tz(ice_surface.facility)
-    start = timezone.make_aware(datetime.combine(date, datetime.min.time()), tz)
-    end = start + timedelta(days=1)  # end of requested day
-    existing = Slot.objects.filter(
-        ice_surface=ice_surface,
-        start__gte=start,
-        start__lt=end,
-    ).exists()
-    if not existing:
-        generate_slots_for_surface(ice_surface, start, end - timedelta(seconds=1))
+    start, end = day_bounds(_facility_tz(ice_surface.facility), date)
+    with primary():
+        existing = Slot.objects.filter(
+            ice_surface=ice_surface,
+            start__gte=start,
+            start__lt=end,
+        ).exists()
+        if not existing:
+            _generate_slots({ice_surface: [date]})
 
 
 def get_available_slots(ice_surface, date):
     """Return slots that are available (state=available) for the given surface and date."""
     ensure_slots_for_date(ice_surface, date)
-    tz = _facility_tz(ice_surface.facility)
-    start = timezone.make_aware(datetime.combine(date, datetime.min.time()), tz)
-    end = start + timedelta(days=1)
+    start, end = day_bounds(_facility_tz(ice_surface.facility), date)
     return Slot.objects.filter(
         ice_surface=ice_surface,
         start__gte=start,
@@ -92,12 +177,14 @@ def get_available_slots(ice_surface, date):
     ).order_by("start")
 
 
-def get_all_slots_for_date(ice_surface, date):
-    """Return all slots (available and taken) for the given surface and date, for display."""
-    ensure_slots_for_date(ice_surface, date)
-    tz = _facility_tz(ice_surface.facility)
-    start = timezone.make_aware(datetime.combine(date, datetime.min.time()), tz)
-    end = start + timedelta(days=1)
+def get_all_slots_for_date(ice_surface, date, ensure=True):
+    """
+    Return all slots (available and taken) for the given surface and date, for display.
+    Pass ensure=False to skip slot generation (async callers run it separately).
+    """
+    if ensure:
+        ensure_slots_for_date(ice_surface, date)
+    start, end = day_bounds(_facility_tz(ice_surface.facility), date)
     return (
         Slot.objects.filter(
             ice_surface=ice_surface,
@@ -121,10 +208,252 @@ def can_cancel_booking(booking):
 
 
 def release_slot(slot):
-    """Release a slot (remove booking or manual reservation, set state to available)."""
-    if hasattr(slot, "booking") and slot.booking:
-        slot.booking.delete()
-    if hasattr(slot, "manual_reservation") and slot.manual_reservation:
-        slot.manual_reservation.delete()
-    slot.state = "available"
-    slot.save(update_fields=["state"])
+    """
+    Release a slot (remove booking or manual reservation, set state to available) and
+    offer it to the customers waitlisted for it.
+    """
+    with transaction.atomic(), defer_rollups():
+        if hasattr(slot, "booking") and slot.booking:
+            slot.booking.delete()
+        if hasattr(slot, "manual_reservation") and slot.manual_reservation:
+            slot.manual_reservation.delete()
+        was_taken = slot.state != "available"
+        slot.state = "available"
+        slot.save(update_fields=["state"])
+        if was_taken:
+            notify_waitlist([(slot.ice_surface_id, slot.start, slot.end)])
+
+
+BULK_ACTIONS = [
+    ("block", "Block"),
+    ("unblock", "Unblock"),
+    ("set_rate", "Set rate"),
+    ("reset_rate", "Reset rate to pricing rules"),
+    ("release", "Release bookings and manual reservations"),
+]
+
+
+def select_slots(surfaces, tz, start_date, end_date, weekdays=None, time_from=None, time_to=None):
+    """
+    Slots on these surfaces whose facility-local start falls between start_date and
+    end_date (inclusive; None for open-ended), on one of `weekdays` (0=Monday) and within [time_from, time_to).
+    Weekday and time-of-day are evaluated in SQL so the result can drive a single UPDATE.
+    """
+    qs = Slot.objects.filter(ice_surface__in=surfaces, start__gte=day_bounds(tz, start_date)[0])
+    if end_date:
+        qs = qs.filter(start__lt=day_bounds(tz, end_date)[1])
+    if weekdays:
+        qs = qs.annotate(local_weekday=ExtractIsoWeekDay("start", tzinfo=tz)).filter(
+            local_weekday__in=[int(w) + 1 for w in weekdays]
+        )
+    if time_from or time_to:
+        qs = qs.annotate(local_time=TruncTime("start", tzinfo=tz))
+        if time_from:
+            qs = qs.filter(local_time__gte=time_from)
+        if time_to:
+            qs = qs.filter(local_time__lt=time_to)
+    return qs
+
+
+def _update_slots(facility, slots, action, rate=None):
+    """The set-based UPDATE behind a bulk action on slots of one facility; returns the count."""
+    from .notifications import notify_bookings_released
+
+    if action == "block":
+        changed = slots.filter(state="available").update(state="blocked")
+    elif action == "unblock":
+        changed = slots.filter(state="blocked").update(state="available")
+    elif action == "set_rate":
+        changed = slots.filter(state__in=["available", "blocked"]).update(
+            rate=rate, rate_locked=True
+        )
+    elif action == "reset_rate":
+        locked = slots.filter(rate_locked=True)
+        surfaces = list(IceSurface.objects.filter(pk__in=locked.values("ice_surface_id")))
+        changed = locked.update(rate_locked=False)
+        for surface in surfaces:
+            reprice_future_slots(surface)
+    elif action == "release":
+        taken = slots.filter(state__in=["booked", "manually_reserved"])
+        bookings = list(
+            Booking.objects.filter(slot__in=taken).select_related("user", "slot__ice_surface")
+        )
+        notify_bookings_released(
+            bookings,
+            f"Your booking at {facility.name} was cancelled by the facility.",
+        )
+        released = list(taken.values_list("ice_surface_id", "start", "end"))
+        Booking.objects.filter(slot__in=taken).delete()
+        ManualReservation.objects.filter(slot__in=taken).delete()
+        changed = taken.update(state="available")
+        notify_waitlist(released)
+    else:
+        raise ValueError(f"Unknown bulk action: {action}")
+    BULK_SLOT_CHANGES.inc(changed, action=action)
+    return changed
+
+
+def bulk_slot_action(facility, surfaces, start_date, end_date, action, **mask):
+    """
+    Apply a bulk action to the matching slots of a facility with one set-based UPDATE.
+    `mask` takes weekdays/time_from/time_to (see select_slots) and `rate` for set_rate.
+    Released customers are notified in one batch. Returns the number of slots changed.
+    """
+    rate = mask.pop("rate", None)
+    slots = select_slots(surfaces, get_facility_tz(facility), start_date, end_date, **mask)
+    with transaction.atomic(), defer_rollups():
+        changed = _update_slots(facility, slots, action, rate)
+        # Set-based updates skip model signals; rebuild the affected rollup range once.
+        rebuild_rollups(surfaces, start_date, end_date)
+        start, end = day_range(get_facility_tz(facility), start_date, end_date)
+        invalidate_slot_range([s.pk for s in surfaces], start, end - timedelta(microseconds=1))
+    return changed
+
+
+def bulk_action_on_slots(slots, action, rate=None):
+    """
+    bulk_slot_action for an arbitrary set of slots (e.g. an admin selection), which may
+    span facilities: one UPDATE per facility, with rollups and caches refreshed over the
+    days the selection covers. Returns the number of slots changed.
+    """
+    spans = (
+        slots.values("ice_surface_id")
+        .annotate(first=Min("start"), last=Max("start"))
+        .order_by("ice_surface_id")
+    )
+    spans = {row["ice_surface_id"]: (row["first"], row["last"]) for row in spans}
+    surfaces = IceSurface.objects.filter(pk__in=spans).select_related("facility")
+    by_facility = defaultdict(list)
+    for surface in surfaces:
+        by_facility[surface.facility].append(surface)
+    changed = 0
+    with transaction.atomic(), defer_rollups():
+        for facility, group in by_facility.items():
+            tz = get_facility_tz(facility)
+            first = min(spans[s.pk][0] for s in group)
+            last = max(spans[s.pk][1] for s in group)
+            changed += _update_slots(facility, slots.filter(ice_surface__in=group), action, rate)
+            rebuild_rollups(
+                group, timezone.localtime(first, tz).date(), timezone.localtime(last, tz).date()
+            )
+            invalidate_slot_range([s.pk for s in group], first, last)
+    return changed
+
+
+def book_slots(user, slots, prices, organization_name="", sport="hockey"):
+    """
+    Book loaded, available slots (all at one facility) for one customer, all or nothing.
+
+    One conditional UPDATE claims every slot and one INSERT creates the bookings, so the
+    number of queries does not grow with the number of slots. `prices` maps slot id to
+    the amount due. Returns the bookings, or [] when any slot was taken in the meantime.
+    """
+    from .notifications import notify_bookings_created
+
+    with transaction.atomic(), defer_rollups():
+        claimed = Slot.objects.filter(pk__in=[s.pk for s in slots], state="available").update(
+            state="booked"
+        )
+        if claimed != len(slots):
+            transaction.set_rollback(True)
+            return []
+        bookings = Booking.objects.bulk_create(
+            [
+                Booking(
+                    slot=slot,
+                    user=user,
+                    organization_name=organization_name,
+                    sport=sport,
+                    amount_paid=prices[slot.pk],
+                    payment_status="pending",
+                )
+                for slot in slots
+            ]
+        )
+        for slot in slots:
+            slot.state = "booked"
+        # bulk_create and update() skip the model signals.
+        refresh_rollups_for_slots(slots)
+        invalidate_slot_days((s.ice_surface_id, s.start) for s in slots)
+        notify_bookings_created(bookings)
+    return bookings
+
+
+def recurring_starts(ice_surface, weekday, start_time, hours, start_date, end_date):
+    """Slot start datetimes for `hours` consecutive slots every `weekday` in the date range."""
+    tz = _facility_tz(ice_surface.facility)
+    day = start_date + timedelta(days=(weekday - start_date.weekday()) % 7)
+    starts = []
+    while day <= end_date:
+        first = local_instant(day, start_time, tz)
+        starts.extend(first + SLOT_LENGTH * h for h in range(hours))
+        day += timedelta(weeks=1)
+    return starts
+
+
+def book_recurring_slots(user, ice_surface, starts, organization_name="", sport="hockey"):
+    """
+    Book every slot in `starts` for one customer, all or nothing.
+
+    Missing slots are created in one bulk insert, then the whole set is locked and
+    claimed, all in a single transaction. Returns (bookings, conflicts): when any start is
+    already taken, nothing is booked and `conflicts` lists the taken starts.
+    """
+    from .notifications import notify_recurring_booking_created
+
+    prices = compile_price_tables([ice_surface])[ice_surface.pk]
+    tz = _facility_tz(ice_surface.facility)
+    with transaction.atomic(), defer_rollups():
+        Slot.objects.bulk_create(
+            [
+                Slot(
+                    ice_surface=ice_surface,
+                    start=start,
+                    end=start + SLOT_LENGTH,
+                    rate=prices.rate_for(timezone.localtime(start, tz)),
+                    state="available",
+                )
+                for start in starts
+            ],
+            ignore_conflicts=True,
+        )
+        invalidate_slot_days((ice_surface.pk, start) for start in starts)
+        slots = list(
+            Slot.objects.select_for_update()
+            .filter(ice_surface=ice_surface, start__in=starts)
+            .order_by("start")
+        )
+        found = {s.start for s in slots}
+        conflicts = [s.start for s in slots if s.state != "available"]
+        conflicts += [start for start in starts if start not in found]
+        if conflicts:
+            # Nothing is booked, so the slots inserted above go too.
+            transaction.set_rollback(True)
+            return [], conflicts
+        claimed = Slot.objects.filter(pk__in=[s.pk for s in slots], state="available").update(
+            state="booked"
+        )
+        if claimed != len(slots):
+            transaction.set_rollback(True)
+            return [], [s.start for s in slots]
+        now = timezone.now()
+        bookings = Booking.objects.bulk_create(
+            [
+                Booking(
+                    slot=slot,
+                    user=user,
+                    organization_name=organization_name,
+                    sport=sport,
+                    amount_paid=prices.quote(slot.rate, slot.start, now),
+                    payment_status="pending",
+                )
+                for slot in slots
+            ]
+        )
+        for slot in slots:
+            slot.state = "booked"
+        refresh_rollups_for_slots(slots)
+        invalidate_slot_days((ice_surface.pk, start) for start in starts)
+        notify_recurring_booking_created(bookings)
+        BOOKINGS_CREATED.inc(len(bookings), kind="recurring")
+    return bookings, []
@@ -0,0 +1,134 @@
+"""Model signal handlers: keep rollups, slot rates and cache versions in step with the models."""
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate_facility, invalidate_slot_days, invalidate_surface
+from .models import (
+    Booking,
+    Facility,
+    HoursOfOperation,
+    IceSurface,
+    ManualReservation,
+    PricingRule,
+    Slot,
+)
+from .pricing import reprice_future_slots
+from .rollups import refresh_rollups_for_slot_ids, refresh_rollups_for_slots
+
+
+def _cascading_from_parent(origin):
+    """True when a delete cascades from a facility/surface (its rollups go with it)."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (Facility, IceSurface)
+
+
+def _invalidate_slot_of(instance):
+    """Invalidate the slot grid showing a booking/manual reservation's slot."""
+    if type(instance).slot.is_cached(instance):
+        slot = (instance.slot.ice_surface_id, instance.slot.start)
+    else:
+        slot = (
+            Slot.objects.filter(pk=instance.slot_id).values_list("ice_surface_id", "start").first()
+        )
+    if slot:
+        invalidate_slot_days([slot])
+
+
+@receiver(post_save, sender=Slot)
+def slot_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_rollups_for_slots([instance])
+    invalidate_slot_days([(instance.ice_surface_id, instance.start)])
+
+
+@receiver(post_delete, sender=Slot)
+def slot_deleted(sender, instance, origin=None, **kwargs):
+    if _cascading_from_parent(origin):
+        return
+    refresh_rollups_for_slots([instance])
+    invalidate_slot_days([(instance.ice_surface_id, instance.start)])
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_rollups_for_slot_ids([instance.slot_id])
+    _invalidate_slot_of(instance)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, origin=None, **kwargs):
+    if _cascading_from_parent(origin):
+        return
+    refresh_rollups_for_slot_ids([instance.slot_id])
+    _invalidate_slot_of(instance)
+
+
+@receiver(post_save, sender=PricingRule)
+def pricing_rule_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    reprice_future_slots(instance.ice_surface)
+
+
+@receiver(post_delete, sender=PricingRule)
+def pricing_rule_deleted(sender, instance, origin=None, **kwargs):
+    if _cascading_from_parent(origin):
+        return
+    reprice_future_slots(instance.ice_surface)
+
+
+@receiver(post_save, sender=ManualReservation)
+def manual_reservation_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _invalidate_slot_of(instance)
+
+
+@receiver(post_delete, sender=ManualReservation)
+def manual_reservation_deleted(sender, instance, origin=None, **kwargs):
+    if _cascading_from_parent(origin):
+        return
+    _invalidate_slot_of(instance)
+
+
+@receiver([post_save, post_delete], sender=Facility)
+def facility_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_facility(instance.pk)
+
+
+def _touch(model, pk):
+    """Bump updated_at (the API's Last-Modified) of a parent whose children changed."""
+    model.objects.filter(pk=pk).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=IceSurface)
+def surface_changed(sender, instance, raw=False, origin=None, **kwargs):
+    if raw:
+        return
+    if not _cascading_from_parent(origin):
+        _touch(Facility, instance.facility_id)
+    invalidate_facility(instance.facility_id)
+    invalidate_surface(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=HoursOfOperation)
+def hours_changed(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _cascading_from_parent(origin):
+        return
+    facility_id = (
+        IceSurface.objects.filter(pk=instance.ice_surface_id)
+        .values_list("facility_id", flat=True)
+        .first()
+    )
+    if facility_id:
+        _touch(IceSurface, instance.ice_surface_id)
+        _touch(Facility, facility_id)
+        invalidate_facility(facility_id)
@@ -1,17 +1,57 @@
-from datetime import datetime, timedelta
+import tempfile
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+from unittest import mock
 
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
 
-from bookings.models import Booking, Facility, HoursOfOperation, IceSurface, Slot
+from bookings.cache import get_facility, get_slot_grid, get_surfaces
+from bookings.events import (
+    booking_events,
+    compact_events,
+    customer_events,
+    facility_events,
+    feed_page,
+    log_event,
+)
+from bookings.facility_calendar import day_bounds, day_finder, local_instant, week_table
+from bookings.models import (
+    Booking,
+    BookingEvent,
+    Facility,
+    HoursOfOperation,
+    IceSurface,
+    PricingRule,
+    Slot,
+    SurfaceDailyRollup,
+    WaitlistEntry,
+    amenity_mask,
+    with_amenities,
+)
+from bookings.pricing import compile_price_tables, quote_slots
+from bookings.rollups import rebuild_rollups, summarize_rollups
 from bookings.services import (
+    book_recurring_slots,
+    bulk_slot_action,
     can_cancel_booking,
     generate_slots_for_surface,
+    get_all_slots_for_date,
     get_available_slots,
+    get_facility_tz,
+    recurring_starts,
     release_slot,
 )
+from bookings.waitlist import join_waitlist, waiting_for
+from core.testing import QueryBudgetMixin, shared_cache
 
 User = get_user_model()
 
@@ -40,6 +80,25 @@ class SlotGenerationTests(TestCase):
         self.assertGreater(len(created), 0)
         self.assertEqual(Slot.objects.filter(ice_surface=self.surface).count(), len(created))
 
+    def test_slot_created_concurrently_is_not_counted(self):
+        day = date(2030, 1, 7)  # a Monday: 09:00-17:00 is 8 slots
+        start = local_instant(day, time(9), get_facility_tz(self.facility))
+        real_atomic = transaction.atomic
+
+        def atomic_after_a_racing_insert(*args, **kwargs):
+            # Another request inserts a slot between the existence check and the insert.
+            if not Slot.objects.exists():
+                Slot.objects.create(
+                    ice_surface=self.surface, start=start, end=start + timedelta(hours=1), rate=1
+                )
+            return real_atomic(*args, **kwargs)
+
+        with mock.patch.object(transaction, "atomic", atomic_after_a_racing_insert):
+            created = generate_slots_for_surface(self.surface, day, day)
+        self.assertEqual(len(created), 7)
+        self.assertNotIn(start, [s for s, _ in created])
+        self.assertEqual(Slot.objects.filter(ice_surface=self.surface).count(), 8)
+
     def test_get_available_slots_returns_only_available(self):
         start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
         while start.weekday() != 0:
@@ -50,6 +109,38 @@ class SlotGenerationTests(TestCase):
         slots = get_available_slots(self.surface, day)
         self.assertTrue(all(s.state == "available" for s in slots))
 
+    def _overnight_slots(self, day):
+        HoursOfOperation.objects.create(
+            ice_surface=self.surface, weekday=6, open_time=time(0), close_time=time(6)
+        )
+        generate_slots_for_surface(self.surface, day, day)
+        return list(get_all_slots_for_date(self.surface, day, ensure=False))
+
+    def test_spring_forward_day_has_one_slot_less(self):
+        slots = self._overnight_slots(date(2026, 3, 8))
+        self.assertEqual(len(slots), 5)
+        self.assertTrue(all(s.end - s.start == timedelta(hours=1) for s in slots))
+        self.assertEqual(len({s.start for s in slots}), 5)
+
+    def test_fall_back_day_has_one_slot_more(self):
+        slots = self._overnight_slots(date(2026, 11, 1))
+        self.assertEqual(len(slots), 7)
+        self.assertTrue(all(b.start == a.end for a, b in zip(slots, slots[1:], strict=False)))
+
+    def test_day_bounds_follow_dst(self):
+        tz = get_facility_tz(self.facility)
+        for day, hours in [(date(2026, 3, 8), 23), (date(2026, 11, 1), 25), (date(2026, 6, 1), 24)]:
+            start, end = day_bounds(tz, day)
+            self.assertEqual(end - start, timedelta(hours=hours))
+        table = week_table(tz, date(2026, 3, 8))
+        find = day_finder(table)
+        self.assertEqual(find(table[1][1]), date(2026, 3, 9))
+        self.assertEqual(find(table[1][1] - timedelta(microseconds=1)), date(2026, 3, 8))
+
+    def test_recurring_starts_cross_the_repeated_hour(self):
+        starts = recurring_starts(self.surface, 6, time(1), 2, date(2026, 11, 1), date(2026, 11, 1))
+        self.assertEqual(starts[1] - starts[0], timedelta(hours=1))
+
 
 class ReleaseSlotTests(TestCase):
     def setUp(self):
@@ -80,3 +171,625 @@ class ReleaseSlotTests(TestCase):
 
     def test_can_cancel_booking_returns_true(self):
         self.assertTrue(can_cancel_booking(self.booking))
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="u", password="p", email="u@example.com")
+        self.facility = Facility.objects.create(name="F", timezone="America/Toronto")
+        self.surface = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("100")
+        )
+        HoursOfOperation.objects.create(
+            ice_surface=self.surface,
+            weekday=0,
+            open_time=datetime.strptime("09:00", "%H:%M").time(),
+            close_time=datetime.strptime("13:00", "%H:%M").time(),
+        )
+        self.day = timezone.now().date() + timedelta(days=1)
+        while self.day.weekday() != 0:
+            self.day += timedelta(days=1)
+        generate_slots_for_surface(self.surface, self.day, self.day)
+
+    def rollup(self):
+        return SurfaceDailyRollup.objects.get(ice_surface=self.surface, date=self.day)
+
+    def test_generation_creates_rollup(self):
+        rollup = self.rollup()
+        self.assertEqual(rollup.slots_available, 4)
+        self.assertEqual(rollup.slots_booked, 0)
+
+    def test_booking_and_release_update_rollup(self):
+        slot = Slot.objects.filter(ice_surface=self.surface).first()
+        Booking.objects.create(
+            slot=slot, user=self.user, amount_paid=slot.rate, payment_status="pending"
+        )
+        slot.state = "booked"
+        slot.save(update_fields=["state"])
+        rollup = self.rollup()
+        self.assertEqual(rollup.slots_available, 3)
+        self.assertEqual(rollup.slots_booked, 1)
+        self.assertEqual(rollup.revenue_pending, Decimal("100"))
+        self.assertEqual(rollup.revenue_paid, Decimal("0"))
+
+        release_slot(slot)
+        rollup = self.rollup()
+        self.assertEqual(rollup.slots_available, 4)
+        self.assertEqual(rollup.revenue, Decimal("0"))
+
+    def test_rebuild_drops_days_without_slots(self):
+        Slot.objects.filter(ice_surface=self.surface).delete()
+        SurfaceDailyRollup.objects.update(slots_available=99)
+        rebuild_rollups([self.surface], self.day, self.day)
+        self.assertFalse(SurfaceDailyRollup.objects.exists())
+
+    def test_summary_reports_utilization(self):
+        Slot.objects.filter(pk=Slot.objects.first().pk).update(state="manually_reserved")
+        rebuild_rollups([self.surface], self.day, self.day)
+        stats = summarize_rollups(self.facility, self.day, self.day)
+        self.assertEqual(stats["totals"]["utilization"], 25.0)
+        self.assertEqual(stats["surfaces"][0]["name"], "A")
+
+
+class BulkSlotActionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="u", password="p", email="u@example.com")
+        self.facility = Facility.objects.create(name="F", timezone="America/Toronto")
+        self.surface = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("100")
+        )
+        for weekday in range(7):
+            HoursOfOperation.objects.create(
+                ice_surface=self.surface,
+                weekday=weekday,
+                open_time=datetime.strptime("08:00", "%H:%M").time(),
+                close_time=datetime.strptime("12:00", "%H:%M").time(),
+            )
+        self.start = timezone.now().date() + timedelta(days=1)
+        self.end = self.start + timedelta(days=6)
+        generate_slots_for_surface(self.surface, self.start, self.end)
+
+    def test_block_applies_weekday_and_local_time_mask(self):
+        changed = bulk_slot_action(
+            self.facility,
+            [self.surface],
+            self.start,
+            self.end,
+            "block",
+            weekdays=[5, 6],
+            time_from=datetime.strptime("10:00", "%H:%M").time(),
+        )
+        self.assertEqual(changed, 4)
+        tz = get_facility_tz(self.facility)
+        for slot in Slot.objects.filter(state="blocked"):
+            local = timezone.localtime(slot.start, tz)
+            self.assertIn(local.weekday(), (5, 6))
+            self.assertGreaterEqual(local.hour, 10)
+        rollups = SurfaceDailyRollup.objects.filter(ice_surface=self.surface)
+        self.assertEqual(sum(r.slots_blocked for r in rollups), 4)
+
+    def test_set_rate_skips_booked_slots(self):
+        booked = Slot.objects.first()
+        booked.state = "booked"
+        booked.save(update_fields=["state"])
+        bulk_slot_action(
+            self.facility, [self.surface], self.start, self.end, "set_rate", rate=Decimal("150")
+        )
+        booked.refresh_from_db()
+        self.assertEqual(booked.rate, Decimal("100"))
+        self.assertEqual(Slot.objects.filter(rate=Decimal("150")).count(), 27)
+
+    def test_release_sends_one_email_per_customer(self):
+        for slot in Slot.objects.all()[:3]:
+            Booking.objects.create(slot=slot, user=self.user, amount_paid=slot.rate)
+            slot.state = "booked"
+            slot.save(update_fields=["state"])
+        with self.captureOnCommitCallbacks() as callbacks:
+            changed = bulk_slot_action(
+                self.facility, [self.surface], self.start, self.end, "release"
+            )
+        self.assertEqual(mail.outbox, [])  # nothing is sent before the commit
+        for callback in callbacks:
+            callback()
+        self.assertEqual(changed, 3)
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(Slot.objects.filter(state="available").count(), 28)
+        self.assertEqual(len(mail.outbox), 1)
+        event = BookingEvent.objects.get(event_type="cancelled_by_facility")
+        self.assertEqual((event.booking_count, event.facility), (3, self.facility))
+        self.assertEqual(list(facility_events(self.facility)), [event])
+
+
+class PricingRuleTests(TestCase):
+    def setUp(self):
+        self.facility = Facility.objects.create(name="F", timezone="America/Toronto")
+        self.surface = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("100")
+        )
+        for weekday in range(7):
+            HoursOfOperation.objects.create(
+                ice_surface=self.surface,
+                weekday=weekday,
+                open_time=datetime.strptime("16:00", "%H:%M").time(),
+                close_time=datetime.strptime("20:00", "%H:%M").time(),
+            )
+        self.start = timezone.now().date() + timedelta(days=1)
+        self.end = self.start + timedelta(days=6)
+        self.tz = get_facility_tz(self.facility)
+
+    def local_hour(self, slot):
+        return timezone.localtime(slot.start, self.tz).hour
+
+    def test_generation_applies_peak_rule(self):
+        PricingRule.objects.create(
+            ice_surface=self.surface,
+            name="Evening peak",
+            start_time=datetime.strptime("18:00", "%H:%M").time(),
+            amount=Decimal("180"),
+        )
+        generate_slots_for_surface(self.surface, self.start, self.end)
+        for slot in Slot.objects.filter(ice_surface=self.surface):
+            expected = Decimal("180") if self.local_hour(slot) >= 18 else Decimal("100")
+            self.assertEqual(slot.rate, expected)
+
+    def test_rule_edit_reprices_open_slots_only(self):
+        generate_slots_for_surface(self.surface, self.start, self.end)
+        booked = Slot.objects.first()
+        booked.state = "booked"
+        booked.save(update_fields=["state"])
+        rule = PricingRule.objects.create(
+            ice_surface=self.surface, name="Off-peak", adjustment="percent", amount=Decimal("50")
+        )
+        booked.refresh_from_db()
+        self.assertEqual(booked.rate, Decimal("100"))
+        self.assertEqual(Slot.objects.filter(rate=Decimal("50")).count(), 27)
+
+        rule.delete()
+        self.assertEqual(Slot.objects.filter(rate=Decimal("100")).count(), 28)
+
+    def test_rule_edit_keeps_rates_set_by_hand_until_reset(self):
+        generate_slots_for_surface(self.surface, self.start, self.end)
+        bulk_slot_action(self.facility, [self.surface], self.start, self.start, "set_rate", rate=70)
+        manual = Slot.objects.filter(rate=Decimal("70")).count()
+        self.assertGreater(manual, 0)
+        PricingRule.objects.create(
+            ice_surface=self.surface, name="Off-peak", adjustment="percent", amount=Decimal("50")
+        )
+        self.assertEqual(Slot.objects.filter(rate=Decimal("70")).count(), manual)
+        self.assertEqual(Slot.objects.filter(rate=Decimal("50")).count(), 28 - manual)
+
+        bulk_slot_action(self.facility, [self.surface], self.start, self.start, "reset_rate")
+        self.assertEqual(Slot.objects.filter(rate=Decimal("50")).count(), 28)
+
+    def test_higher_priority_rule_wins(self):
+        PricingRule.objects.create(ice_surface=self.surface, name="Low", amount=Decimal("90"))
+        PricingRule.objects.create(
+            ice_surface=self.surface,
+            name="Weekend",
+            priority=10,
+            weekday=self.start.weekday(),
+            amount=Decimal("150"),
+        )
+        generate_slots_for_surface(self.surface, self.start, self.end)
+        tables = compile_price_tables([self.surface])
+        for slot in Slot.objects.filter(ice_surface=self.surface):
+            local = timezone.localtime(slot.start, self.tz)
+            self.assertEqual(slot.rate, tables[self.surface.pk].rate_for(local))
+            expected = Decimal("150") if local.weekday() == self.start.weekday() else Decimal("90")
+            self.assertEqual(slot.rate, expected)
+
+    def test_lead_time_rule_discounts_quote_only(self):
+        PricingRule.objects.create(
+            ice_surface=self.surface,
+            name="Last minute",
+            lead_time_hours=48,
+            adjustment="percent",
+            amount=Decimal("75"),
+        )
+        now = timezone.now()
+        soon = Slot.objects.create(
+            ice_surface=self.surface,
+            start=now + timedelta(hours=5),
+            end=now + timedelta(hours=6),
+            rate=Decimal("100"),
+        )
+        later = Slot.objects.create(
+            ice_surface=self.surface,
+            start=now + timedelta(days=5),
+            end=now + timedelta(days=5, hours=1),
+            rate=Decimal("100"),
+        )
+        quotes = quote_slots([soon, later], now=now)
+        self.assertEqual(quotes[soon.pk], Decimal("75.00"))
+        self.assertEqual(quotes[later.pk], Decimal("100"))
+        soon.refresh_from_db()
+        self.assertEqual(soon.rate, Decimal("100"))
+
+    def test_lead_time_rule_respects_weekday_and_time_window(self):
+        now = datetime(2030, 1, 7, 6, 0, tzinfo=self.tz)  # a Monday, 06:00 local
+        PricingRule.objects.create(
+            ice_surface=self.surface,
+            name="Weekday mornings, last minute",
+            lead_time_hours=72,
+            weekday=0,
+            end_time=datetime.strptime("12:00", "%H:%M").time(),
+            adjustment="percent",
+            amount=Decimal("50"),
+        )
+        slots = [
+            Slot.objects.create(
+                ice_surface=self.surface,
+                start=start,
+                end=start + timedelta(hours=1),
+                rate=Decimal("100"),
+            )
+            for start in (
+                now + timedelta(hours=3),
+                now + timedelta(hours=9),
+                now + timedelta(days=1),
+            )
+        ]
+        quotes = quote_slots(slots, now=now)
+        self.assertEqual(
+            [quotes[s.pk] for s in slots], [Decimal("50.00"), Decimal("100"), Decimal("100")]
+        )
+
+
+class RecurringBookingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="u", password="p", email="u@example.com")
+        self.facility = Facility.objects.create(name="F", timezone="America/Toronto")
+        self.surface = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("100")
+        )
+        self.start = timezone.now().date() + timedelta(days=1)
+        self.end = self.start + timedelta(weeks=9)
+        self.starts = recurring_starts(
+            self.surface,
+            self.start.weekday(),
+            datetime.strptime("19:00", "%H:%M").time(),
+            2,
+            self.start,
+            self.end,
+        )
+
+    def test_books_every_week_and_creates_missing_slots(self):
+        self.assertEqual(len(self.starts), 20)
+        bookings, conflicts = book_recurring_slots(self.user, self.surface, self.starts, "League")
+        self.assertEqual(conflicts, [])
+        self.assertEqual(len(bookings), 20)
+        self.assertEqual(Slot.objects.filter(state="booked").count(), 20)
+        self.assertEqual(Booking.objects.filter(organization_name="League").count(), 20)
+        self.assertEqual(sum(r.slots_booked for r in SurfaceDailyRollup.objects.all()), 20)
+
+    def test_conflict_books_nothing(self):
+        taken = Slot.objects.create(
+            ice_surface=self.surface,
+            start=self.starts[5],
+            end=self.starts[5] + timedelta(hours=1),
+            rate=Decimal("100"),
+            state="manually_reserved",
+        )
+        bookings, conflicts = book_recurring_slots(self.user, self.surface, self.starts)
+        self.assertEqual(bookings, [])
+        self.assertEqual(conflicts, [taken.start])
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(Slot.objects.filter(state="booked").exists())
+        self.assertEqual(list(Slot.objects.all()), [taken])
+
+
+class BookingEventTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="u", password="p", email="u@example.com")
+        self.facility = Facility.objects.create(name="F", timezone="UTC")
+        self.surface = IceSurface.objects.create(facility=self.facility, name="A")
+        start = timezone.now() + timedelta(days=1)
+        self.bookings = []
+        for n in range(3):
+            slot = Slot.objects.create(
+                ice_surface=self.surface,
+                start=start + timedelta(hours=n),
+                end=start + timedelta(hours=n + 1),
+                state="booked",
+            )
+            self.bookings.append(Booking.objects.create(slot=slot, user=self.user))
+
+    def test_feed_pages_cover_every_event_once(self):
+        now = timezone.now()
+        for n in range(7):
+            event = log_event(self.bookings[n % 3], "facility_modified", f"change {n}")
+            # Pairs share a timestamp, so the cursor has to break ties by id.
+            BookingEvent.objects.filter(pk=event.pk).update(created_at=now - timedelta(n // 2))
+        seen, cursor = [], None
+        for _ in range(4):
+            page, cursor = feed_page(customer_events(self.user), cursor, limit=3)
+            seen.extend(page)
+            if cursor is None:
+                break
+        self.assertIsNone(cursor)
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len({e.pk for e in seen}), 7)
+        keys = [(e.created_at, e.pk) for e in seen]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        # A malformed cursor starts from the newest event.
+        first_page = feed_page(customer_events(self.user), limit=3)
+        self.assertEqual(feed_page(customer_events(self.user), "not-a-cursor", limit=3), first_page)
+
+    def test_booking_feed_only_lists_that_booking(self):
+        log_event(self.bookings[0], "facility_modified", "moved")
+        self.assertEqual(len(feed_page(booking_events(self.bookings[0]))[0]), 1)
+        self.assertEqual(len(feed_page(booking_events(self.bookings[1]))[0]), 0)
+
+    def test_compaction_summarizes_old_events(self):
+        old = timezone.now() - timedelta(days=400)
+        for booking in self.bookings:
+            log_event(booking, "facility_modified", "moved")
+        recent = log_event(self.bookings[0], "cancelled_by_customer", "Customer cancelled.")
+        BookingEvent.objects.exclude(pk=recent.pk).update(created_at=old)
+        removed, summaries = compact_events()
+        self.assertEqual((removed, summaries), (3, 1))
+        summary = BookingEvent.objects.get(is_summary=True)
+        self.assertEqual(summary.booking_count, 3)
+        self.assertEqual(summary.facility, self.facility)
+        self.assertEqual(summary.created_at, old)
+        self.assertEqual(compact_events(), (0, 0))
+        self.assertEqual(
+            list(customer_events(self.user).order_by("-created_at")), [recent, summary]
+        )
+
+
+class AdminTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="root", password="p")
+        self.client.force_login(self.admin)
+        self.facility = Facility.objects.create(name="F", timezone="UTC")
+        self.surface = IceSurface.objects.create(facility=self.facility, name="A")
+        tomorrow = timezone.now() + timedelta(days=1)
+        self.start = tomorrow.replace(hour=8, minute=0, second=0, microsecond=0)
+
+    def _slots(self, count, surface=None):
+        return Slot.objects.bulk_create(
+            [
+                Slot(
+                    ice_surface=surface or self.surface,
+                    start=self.start + timedelta(hours=n),
+                    end=self.start + timedelta(hours=n + 1),
+                    rate=Decimal("100"),
+                )
+                for n in range(count)
+            ]
+        )
+
+    def test_changelists_do_not_query_per_row(self):
+        def seed(size):
+            for slot in self._slots(size * 3):
+                Booking.objects.create(slot=slot, user=self.user_for(slot))
+                log_event(slot.booking, "created", "Booking created.")
+
+        for name in ["slot", "booking", "bookingevent", "manualreservation"]:
+            url = reverse(f"admin:bookings_{name}_changelist")
+            self.assertConstantQueries(seed, lambda _, url=url: self.client.get(url))
+
+    def user_for(self, slot):
+        return User.objects.create_user(username=f"u{slot.pk}")
+
+    def test_id_filter_keeps_other_filters(self):
+        other = IceSurface.objects.create(facility=self.facility, name="B")
+        self._slots(2)
+        self._slots(3, other)
+        url = reverse("admin:bookings_slot_changelist")
+        response = self.client.get(url, {"surface": other.pk, "state": "available"})
+        self.assertEqual(response.context["cl"].result_count, 3)
+        self.assertContains(response, 'name="state" value="available"')
+        self.assertEqual(self.client.get(url, {"surface": "x"}).context["cl"].result_count, 5)
+
+    def test_block_and_reprice_actions(self):
+        slots = self._slots(4)
+        url = reverse("admin:bookings_slot_changelist")
+        picked = [s.pk for s in slots[:3]]
+        self.client.post(url, {"action": "block_slots", ACTION_CHECKBOX_NAME: picked})
+        self.assertEqual(Slot.objects.filter(state="blocked").count(), 3)
+        response = self.client.post(url, {"action": "reprice_slots", ACTION_CHECKBOX_NAME: picked})
+        self.assertContains(response, "3 selected slots")
+        self.client.post(
+            url, {"action": "reprice_slots", ACTION_CHECKBOX_NAME: picked, "rate": "80"}
+        )
+        self.assertEqual(Slot.objects.filter(rate=Decimal("80")).count(), 3)
+        rollup = SurfaceDailyRollup.objects.get(ice_surface=self.surface)
+        self.assertEqual(rollup.slots_blocked, 3)
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.facility = Facility.objects.create(name="Wait Rink", timezone="America/Toronto")
+        self.surface = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("100")
+        )
+        self.day = timezone.now().date() + timedelta(days=3)
+        HoursOfOperation.objects.create(
+            ice_surface=self.surface,
+            weekday=self.day.weekday(),
+            open_time=time(9),
+            close_time=time(13),
+        )
+        generate_slots_for_surface(self.surface, self.day, self.day)
+        self.slots = list(Slot.objects.filter(ice_surface=self.surface).order_by("start"))
+        holder = User.objects.create_user(username="holder", email="h@example.com")
+        for slot in self.slots[:2]:
+            Booking.objects.create(slot=slot, user=holder)
+            slot.state = "booked"
+            slot.save(update_fields=["state"])
+        self.first, self.second, self.late = (
+            User.objects.create_user(username=name, email=f"{name}@example.com")
+            for name in ("first", "second", "late")
+        )
+        join_waitlist(self.first, self.surface, self.day, time(9), time(11))
+        join_waitlist(self.second, self.surface, self.day, time(8), time(12))
+        self.late_entry = join_waitlist(self.late, self.surface, self.day, time(11), time(13))
+
+    def test_release_emails_waiters_in_the_order_they_joined(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            release_slot(self.slots[0])
+        self.assertEqual(
+            [m.to for m in mail.outbox], [["first@example.com"], ["second@example.com"]]
+        )
+        self.assertIn("Wait Rink, A:", mail.outbox[0].body)
+        self.assertIn(" 09:00", mail.outbox[0].body)
+        self.late_entry.refresh_from_db()
+        self.assertIsNone(self.late_entry.notified_at)
+
+        # Each entry is notified once.
+        mail.outbox.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            release_slot(self.slots[1])
+        self.assertEqual(mail.outbox, [])
+
+    def test_bulk_release_looks_waiters_up_once(self):
+        with (
+            CaptureQueriesContext(connection) as queries,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            bulk_slot_action(self.facility, [self.surface], self.day, self.day, "release")
+        lookups = [
+            q["sql"]
+            for q in queries
+            if q["sql"].startswith("SELECT") and "bookings_waitlistentry" in q["sql"]
+        ]
+        # One lookup in the release, one load in the sender.
+        self.assertEqual(len(lookups), 2)
+        body = [m for m in mail.outbox if m.to == ["second@example.com"]][0].body
+        self.assertIn(" 09:00", body)
+        self.assertIn(" 10:00", body)
+
+    def test_many_released_slots_are_matched_with_one_term_per_surface(self):
+        other = IceSurface.objects.create(facility=self.facility, name="B")
+        start = self.slots[0].start - timedelta(days=1000)
+        released = [
+            (surface.pk, start + timedelta(hours=n), start + timedelta(hours=n + 1))
+            for surface in (self.surface, other)
+            for n in range(1500)
+        ]
+        released.append((self.surface.pk, self.slots[0].start, self.slots[0].end))
+        with CaptureQueriesContext(connection) as queries:
+            entries = waiting_for(released)
+        self.assertEqual([e.user for e in entries], [self.first, self.second])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(queries[0]["sql"].count('"ice_surface_id" = '), 2)
+
+    def test_waiters_without_email_stay_waiting(self):
+        self.first.email = ""
+        self.first.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            release_slot(self.slots[0])
+        self.assertEqual([m.to for m in mail.outbox], [["second@example.com"]])
+        entry = self.first.waitlist_entries.get()
+        self.assertIsNone(entry.notified_at)
+
+    def test_released_slot_outside_every_window_notifies_nobody(self):
+        slot = self.slots[3]
+        slot.state = "blocked"
+        slot.save(update_fields=["state"])
+        self.late_entry.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            release_slot(slot)
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(WaitlistEntry.objects.filter(notified_at__isnull=False).exists())
+
+
+class AmenityMaskTests(TestCase):
+    def test_mask_follows_the_booleans_and_filters_with_one_predicate(self):
+        both = Facility.objects.create(name="Both", parking=True, change_rooms=True, wifi=True)
+        parking = Facility.objects.create(name="Parking", parking=True)
+        Facility.objects.create(name="None")
+        self.assertEqual(both.amenity_mask, amenity_mask(["parking", "change_rooms", "wifi"]))
+        self.assertEqual(both.get_amenities_list(), ["Change rooms", "Parking", "Wi‑Fi"])
+
+        wanted = amenity_mask(["parking", "change_rooms"])
+        with CaptureQueriesContext(connection) as captured:
+            found = list(Facility.objects.filter(with_amenities(wanted)))
+        self.assertEqual(found, [both])
+        self.assertIn('"amenity_mask" IN (', captured[0]["sql"])
+
+        parking.change_rooms = True
+        parking.save(update_fields=["change_rooms"])
+        self.assertEqual(Facility.objects.filter(with_amenities(wanted)).count(), 2)
+        self.assertEqual(Facility.objects.filter(with_amenities(0)).count(), 3)
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        # Per-process caches are bypassed (see bookings.cache): measure a shared one.
+        self.enterContext(shared_cache())
+        self.user = User.objects.create_user(username="u", password="p", email="u@example.com")
+        self.facility = Facility.objects.create(name="F", timezone="America/Toronto")
+        self.surface = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("100")
+        )
+        self.day = timezone.now().date() + timedelta(days=1)
+        HoursOfOperation.objects.create(
+            ice_surface=self.surface,
+            weekday=self.day.weekday(),
+            open_time=datetime.strptime("08:00", "%H:%M").time(),
+            close_time=datetime.strptime("10:00", "%H:%M").time(),
+        )
+
+    def grid_states(self):
+        return [s.state for s in get_slot_grid(self.surface, self.day)]
+
+    def test_grid_is_served_from_cache_until_a_slot_changes(self):
+        self.grid_states()
+        self.assertEqual(self.grid_states(), ["available", "available"])
+        with self.assertNumQueries(0):
+            self.grid_states()
+        slot = Slot.objects.filter(ice_surface=self.surface).order_by("start").first()
+        Booking.objects.create(slot=slot, user=self.user)
+        Slot.objects.filter(pk=slot.pk).update(state="booked")
+        # .update() alone is invisible to the cache; the booking's signal bumped the day.
+        self.assertEqual(self.grid_states(), ["booked", "available"])
+
+    def test_a_write_in_one_worker_is_seen_by_another(self):
+        # Two cache instances stand in for the caches of two worker processes.
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        for backend, first, second in (
+            (LocMemCache, LocMemCache("worker-1", {}), LocMemCache("worker-2", {})),
+            (FileBasedCache, FileBasedCache(directory, {}), FileBasedCache(directory, {})),
+        ):
+            path = f"{backend.__module__}.{backend.__name__}"
+            caches = {"default": {"BACKEND": path, "LOCATION": directory}}
+            with self.subTest(backend=backend.__name__), self.settings(CACHES=caches):
+                with mock.patch("bookings.cache._cache", return_value=first):
+                    self.grid_states()  # generates the day's slots
+                    before = self.grid_states()[0]
+                slot = Slot.objects.filter(ice_surface=self.surface).order_by("start").first()
+                slot.state = "blocked" if before == "available" else "available"
+                with mock.patch("bookings.cache._cache", return_value=second):
+                    slot.save()
+                with mock.patch("bookings.cache._cache", return_value=first):
+                    self.assertEqual(self.grid_states()[0], slot.state)
+
+    def test_deleting_a_slot_invalidates_grid(self):
+        self.grid_states()
+        slot = get_slot_grid(self.surface, self.day)[0]
+        deleted = slot.pk
+        slot.delete()
+        self.assertNotIn(deleted, [s.pk for s in get_slot_grid(self.surface, self.day)])
+
+    def test_bulk_action_invalidates_grid(self):
+        self.grid_states()
+        bulk_slot_action(self.facility, [self.surface], self.day, self.day, "block")
+        self.assertEqual(self.grid_states(), ["blocked", "blocked"])
+
+    def test_hours_change_invalidates_facility(self):
+        facility = get_facility(self.facility.pk)
+        self.assertEqual(len(get_surfaces(facility)[0].hours_of_operation.all()), 1)
+        with self.assertNumQueries(0):
+            get_facility(self.facility.pk)
+        HoursOfOperation.objects.create(
+            ice_surface=self.surface,
+            weekday=(self.day.weekday() + 1) % 7,
+            open_time=datetime.strptime("08:00", "%H:%M").time(),
+            close_time=datetime.strptime("10:00", "%H:%M").time(),
+        )
+        facility = get_facility(self.facility.pk)
+        self.assertEqual(len(get_surfaces(facility)[0].hours_of_operation.all()), 2)
+        self.assertIsNone(get_facility(self.facility.pk + 1000))
@@ -0,0 +1,103 @@
+"""
+Waitlist: customers waiting for a surface's slots on a day, within a time window.
+
+Every release (release_slot and bulk release) looks its slots' waiters up with one query
+on the waitlist_open_window index (one range per surface, however many slots were
+released), marks them notified in the same transaction and hands them to
+notify_waitlist_entries once the release commits. That sends one email per customer,
+earliest waiter first, so nobody has to keep refreshing the page.
+
+An entry is one-shot: every waiter of a slot gets the offer at once and the first to
+book wins; the others are not put back on the list and join again to keep waiting.
+Waiters without an email address can't be told, so their entries are left waiting.
+"""
+
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .facility_calendar import facility_tz, local_instant
+from .models import WaitlistEntry
+
+
+def join_waitlist(user, ice_surface, date, time_from, time_to):
+    """Wait for a slot on the surface starting at or after time_from and ending by time_to."""
+    tz = facility_tz(ice_surface.facility)
+    return WaitlistEntry.objects.create(
+        user=user,
+        ice_surface=ice_surface,
+        date=date,
+        time_from=time_from,
+        time_to=time_to,
+        window_start=local_instant(date, time_from, tz),
+        window_end=local_instant(date, time_to, tz),
+    )
+
+
+def upcoming_entries(user):
+    """The user's waitlist entries from yesterday (UTC) on, so every timezone's today is in."""
+    return WaitlistEntry.objects.filter(
+        user=user, date__gte=timezone.now().date() - timedelta(days=1)
+    ).select_related("ice_surface__facility")
+
+
+def _offered(entry, released):
+    """Starts of the released (surface_id, start, end) slots that fit the entry's window."""
+    return sorted(
+        start
+        for surface_id, start, end in released
+        if surface_id == entry.ice_surface_id
+        and entry.window_start <= start
+        and end <= entry.window_end
+    )
+
+
+def waiting_for(released):
+    """
+    Open entries of customers with an email address whose window holds any of the
+    (surface_id, start, end) slots, first come first. The query asks for the windows that
+    could hold one of each surface's slots (one term per surface, however many slots were
+    released) and exact fits are picked here.
+    """
+    bounds = {}  # surface_id: (latest start, earliest end)
+    for surface_id, start, end in released:
+        latest, earliest = bounds.get(surface_id, (start, end))
+        bounds[surface_id] = (max(latest, start), min(earliest, end))
+    match = reduce(
+        or_,
+        (
+            Q(ice_surface_id=surface_id, window_start__lte=latest, window_end__gte=earliest)
+            for surface_id, (latest, earliest) in bounds.items()
+        ),
+    )
+    candidates = (
+        WaitlistEntry.objects.filter(match, notified_at__isnull=True)
+        .exclude(user__email="")
+        .order_by("created_at", "id")
+    )
+    return [entry for entry in candidates if _offered(entry, released)]
+
+
+def notify_waitlist(released):
+    """
+    Offer freshly released (surface_id, start, end) slots to their waiters. Each entry
+    is notified once (see above); the emails go out after the surrounding transaction
+    commits.
+    Returns the entries notified.
+    """
+    from .notifications import notify_waitlist_entries
+
+    released = list(released)
+    if not released:
+        return []
+    entries = waiting_for(released)
+    if not entries:
+        return []
+    WaitlistEntry.objects.filter(pk__in=[e.pk for e in entries]).update(notified_at=timezone.now())
+    offers = {entry.pk: _offered(entry, released) for entry in entries}
+    transaction.on_commit(lambda: notify_waitlist_entries(offers))
+    return entries
@@ -3,3 +3,5 @@ set -o errexit
 pip install -r requirements.txt
 python manage.py collectstatic --no-input
 python manage.py migrate --no-input
+# Fail the deploy on a broken URLconf or template; fills the caches only if CACHE_URL is shared.
+python manage.py warmup
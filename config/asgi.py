@@ -1,5 +1,10 @@
 """
 ASGI config for RinkRent project.
+
+gunicorn runs this application when GUNICORN_ASGI is set (gunicorn.conf.py); otherwise
+it runs config.wsgi with sync workers. Besides the async views it
+serves the live slot streams (bookings/live.py), which hold a connection open per viewer
+on the event loop; under WSGI they answer 204 and the pages fall back to static grids.
 """
 
 import os
@@ -42,15 +42,19 @@ INSTALLED_APPS = [
     "bookings",
     "facilities",
     "customers",
+    "api",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "core.middleware.InstrumentationMiddleware",
+    "core.middleware.AsyncWhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "core.middleware.ReplicaStickinessMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.FacilityMembershipMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -69,6 +73,7 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "core.context_processors.user_has_facility",
+                "core.context_processors.facility_switcher",
             ],
         },
     },
@@ -78,14 +83,102 @@ WSGI_APPLICATION = "config.wsgi.application"
 
 if env("DATABASE_URL", default="").startswith("postgres"):
     DATABASES = {"default": env.db()}
+    _db_options = DATABASES["default"].setdefault("OPTIONS", {})
+    _statement_timeout = env.int("DB_STATEMENT_TIMEOUT_MS", default=30000)
+    if _statement_timeout:
+        _db_options["options"] = f"-c statement_timeout={_statement_timeout}"
+    if env.bool("DB_POOL", default=False):
+        # psycopg 3 pool, shared by the threads of one worker process. Django requires
+        # CONN_MAX_AGE=0 with a pool: connections go back to the pool after each request.
+        _db_options["pool"] = {
+            "min_size": env.int("DB_POOL_MIN_SIZE", default=2),
+            "max_size": env.int("DB_POOL_MAX_SIZE", default=10),
+            "timeout": env.int("DB_POOL_TIMEOUT", default=10),
+        }
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+    else:
+        # Keep connections open between requests instead of reconnecting every time.
+        DATABASES["default"]["CONN_MAX_AGE"] = env.int("DB_CONN_MAX_AGE", default=60)
+        DATABASES["default"]["CONN_HEALTH_CHECKS"] = env.bool("DB_CONN_HEALTH_CHECKS", default=True)
 else:
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            "CONN_MAX_AGE": env.int("DB_CONN_MAX_AGE", default=60),
+            "CONN_HEALTH_CHECKS": env.bool("DB_CONN_HEALTH_CHECKS", default=True),
+            "OPTIONS": {
+                # WAL lets readers run while a booking is being written; NORMAL sync is
+                # safe with WAL. Writers wait up to busy_timeout instead of failing, and
+                # IMMEDIATE transactions take the write lock up front to avoid deadlocks.
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    f"PRAGMA busy_timeout={env.int('SQLITE_BUSY_TIMEOUT_MS', default=5000)};"
+                    f"PRAGMA mmap_size={env.int('SQLITE_MMAP_SIZE', default=134217728)};"
+                ),
+                "transaction_mode": "IMMEDIATE",
+            },
         }
     }
 
+# Read replicas: comma-separated URLs of the same engine as the primary, e.g.
+# postgres://ro@replica1/rinkrent,postgres://ro@replica2/rinkrent. Views decorated with
+# core.db_router.replica_reads read from them; a session that wrote stays on the primary
+# for REPLICA_STICKY_SECONDS (longer than the usual replication lag). Tests mirror them
+# to the test database.
+DATABASE_REPLICAS = []
+for _i, _url in enumerate(env.list("DATABASE_REPLICA_URLS", default=[]), start=1):
+    _replica = env.db_url_config(_url)
+    for _key in ("CONN_MAX_AGE", "CONN_HEALTH_CHECKS", "OPTIONS"):
+        if _key in DATABASES["default"]:
+            _replica.setdefault(_key, DATABASES["default"][_key])
+    _replica["TEST"] = {"MIRROR": "default"}
+    DATABASES[f"replica{_i}"] = _replica
+    DATABASE_REPLICAS.append(f"replica{_i}")
+DATABASE_ROUTERS = ["core.db_router.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = env.int("REPLICA_STICKY_SECONDS", default=15)
+
+# Cache: per-process locmem by default. Set CACHE_URL to share it between workers, e.g.
+# filecache:///var/tmp/rinkrent or redis://localhost:6379/1 (any Redis-compatible server).
+# Facility membership is only kept in sessions when the cache is shared (core.caching),
+# and bookings.cache reads straight from the database otherwise: a bump in one worker's
+# locmem cache would leave the others serving stale slots.
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+BOOKINGS_CACHE_TIMEOUT = env.int("BOOKINGS_CACHE_TIMEOUT", default=300)
+
+# Live slot streams (bookings.live, ASGI only: GUNICORN_ASGI=True) poll the database this
+# often for changes made by other workers; 0 relies on in-process publishes alone (one
+# worker). Streams close after LIVE_SLOTS_STREAM_SECONDS and the browser reconnects.
+LIVE_SLOTS_POLL_SECONDS = env.float("LIVE_SLOTS_POLL_SECONDS", default=5)
+LIVE_SLOTS_STREAM_SECONDS = env.int("LIVE_SLOTS_STREAM_SECONDS", default=300)
+
+# Public API (/api/v1/): when API_KEYS (comma-separated) is set, requests need a matching
+# X-Api-Key header. Each key (or client address) may burst API_RATE_BURST requests,
+# refilled at API_RATE_PER_SECOND, per worker process (api.ratelimit): N workers allow up
+# to N times that. Behind proxies that append X-Forwarded-For (Render's load balancer is
+# one), TRUSTED_PROXY_COUNT says how many, so the client address is read past them.
+API_KEYS = env.list("API_KEYS", default=[])
+API_RATE_PER_SECOND = env.float("API_RATE_PER_SECOND", default=2)
+API_RATE_BURST = env.int("API_RATE_BURST", default=60)
+TRUSTED_PROXY_COUNT = env.int("TRUSTED_PROXY_COUNT", default=0)
+
+# Booking history older than this is rolled into daily summaries by compact_booking_events.
+BOOKING_EVENT_RETENTION_DAYS = env.int("BOOKING_EVENT_RETENTION_DAYS", default=365)
+
+# Per-request SQL/template timing with Server-Timing headers (core.instrumentation).
+# Requests over either budget are logged as JSON to the "rinkrent.instrumentation" logger.
+INSTRUMENTATION = env.bool("INSTRUMENTATION", default=False)
+INSTRUMENTATION_BUDGET_MS = env.int("INSTRUMENTATION_BUDGET_MS", default=500)
+INSTRUMENTATION_QUERY_BUDGET = env.int("INSTRUMENTATION_QUERY_BUDGET", default=50)
+
+# Metrics at /metrics/ (core.metrics): scraped with "Authorization: Bearer <METRICS_TOKEN>"
+# or viewed by staff. Under several gunicorn workers set METRICS_DIR to a directory shared
+# by them (cleared on start) so every worker reports totals for the whole server.
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+METRICS_DIR = env("METRICS_DIR", default="")
+METRICS_FLUSH_SECONDS = env.float("METRICS_FLUSH_SECONDS", default=2)
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
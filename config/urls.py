@@ -7,11 +7,20 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import instrumentation_summary, metrics_view
+
 urlpatterns = [
+    path(
+        "admin/instrumentation/",
+        admin.site.admin_view(instrumentation_summary),
+        name="instrumentation",
+    ),
     path("admin/", admin.site.urls),
+    path("metrics/", metrics_view, name="metrics"),
     path("", include("core.urls")),
     path("facility/", include("facilities.urls")),
     path("bookings/", include("customers.urls")),
+    path("api/v1/", include("api.urls")),
 ]
 
 if settings.DEBUG:
@@ -1,5 +1,8 @@
 """
 WSGI config for RinkRent project.
+
+The application gunicorn runs by default (gunicorn.conf.py; config.asgi with
+GUNICORN_ASGI=True).
 """
 
 import os
@@ -0,0 +1,91 @@
+"""
+Admin helpers for tables too large to count or list in full: a paginator that estimates
+the size of an unfiltered PostgreSQL table, and a list filter that takes an id typed into
+a box instead of rendering one link per related object.
+"""
+
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using="default"):
+    """Planner estimate of the table's rows on PostgreSQL (None elsewhere or never analyzed)."""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [connection.ops.quote_name(model._meta.db_table)],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 until the table has been vacuumed or analyzed.
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts an unfiltered table from pg_class.reltuples once it is over `exact_below`
+    rows, instead of a COUNT(*) that reads the whole table. Filtered lists, small tables
+    and other databases are counted exactly. Pair with show_full_result_count = False.
+    """
+
+    exact_below = 100_000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if isinstance(qs, QuerySet) and not qs.query.where:
+            estimate = estimated_row_count(qs.model, qs.db)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+
+class IdFilter(admin.SimpleListFilter):
+    """Filter on a related id entered in a text box; subclass with id_filter()."""
+
+    template = "admin/id_filter.html"
+    field_path = None
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(**{self.field_path: int(value)})
+        return queryset
+
+    def choices(self, changelist):
+        # One entry: what the template needs to render the box and keep the other filters.
+        others = [
+            (key, value)
+            for key, values in changelist.get_filters_params().items()
+            if key != self.parameter_name
+            for value in (values if isinstance(values, list) else [values])
+        ]
+        yield {
+            "value": self.value() or "",
+            "others": others,
+            "clear_url": changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+
+def id_filter(field_path, title, parameter_name=None):
+    """An IdFilter on `field_path` (e.g. "ice_surface__facility_id")."""
+    return type(
+        f"IdFilter_{field_path}",
+        (IdFilter,),
+        {
+            "title": title,
+            "parameter_name": parameter_name or field_path,
+            "field_path": field_path,
+        },
+    )
@@ -0,0 +1,15 @@
+"""
+Whether a cache is shared between processes.
+
+The default locmem cache lives in one worker: anything that must agree across workers
+(authorization, HTTP validators) may only be kept in a cache where this is true.
+"""
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(alias="default"):
+    """True unless the cache is per-process (locmem) or stores nothing (dummy)."""
+    return not isinstance(caches[alias], LocMemCache | DummyCache)
@@ -1,11 +1,35 @@
+from django.utils.functional import SimpleLazyObject
+
+from core.middleware import managed_facility_ids
+
+
 def user_has_facility(request):
     """True if the current user is a manager of any facility."""
     if not getattr(request, "user", None) or not request.user.is_authenticated:
         return {"user_has_facility": False}
-    try:
+    ids = getattr(request, "managed_facilities", None)
+    if ids is None:
+        ids = managed_facility_ids(request)
+    return {"user_has_facility": bool(ids)}
+
+
+def facility_switcher(request):
+    """
+    Facilities for the header switcher, only for managers of more than one. The names
+    are loaded lazily, so pages that never render the switcher don't query for them.
+    """
+    ids = getattr(request, "managed_facilities", None)
+    if not ids or len(ids) < 2:
+        return {"switcher_facilities": None}
+
+    def load():
         from bookings.models import Facility
+        from facilities.console import active_facility_id
+
+        active = active_facility_id(request)
+        facilities = list(Facility.objects.filter(pk__in=list(ids)).order_by("name", "pk"))
+        for facility in facilities:
+            facility.is_active = facility.pk == active
+        return facilities
 
-        has = Facility.objects.filter(managers=request.user).exists()
-    except Exception:
-        has = False
-    return {"user_has_facility": has}
+    return {"switcher_facilities": SimpleLazyObject(load)}
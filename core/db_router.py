@@ -0,0 +1,95 @@
+"""
+Read replicas (settings.DATABASE_REPLICAS, set from DATABASE_REPLICA_URLS).
+
+GET/HEAD requests to views decorated with @replica_reads send their reads to a replica;
+everything else, and every write, uses the primary ("default"). A visitor whose session made a write
+(any non-GET request, see ReplicaStickinessMiddleware) reads from the primary for the next
+REPLICA_STICKY_SECONDS, so they see their own booking on the page they are redirected to.
+Sessions are always read from the primary.
+"""
+
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+STICKY_SESSION_KEY = "_db_primary_until"
+SAFE_METHODS = ("GET", "HEAD")
+
+_use_replica = contextvars.ContextVar("use_replica", default=False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or model._meta.app_label == "sessions":
+            return None
+        replicas = settings.DATABASE_REPLICAS
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block, e.g. before writing based on what was read."""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def mark_sticky(request):
+    """Keep this session's reads on the primary for REPLICA_STICKY_SECONDS."""
+    request.session[STICKY_SESSION_KEY] = time.time() + settings.REPLICA_STICKY_SECONDS
+
+
+async def amark_sticky(request):
+    await request.session.aset(STICKY_SESSION_KEY, time.time() + settings.REPLICA_STICKY_SECONDS)
+
+
+def _sticky(until):
+    return until is not None and until > time.time()
+
+
+def replica_reads(view):
+    """Serve the view's reads from a replica unless the session wrote recently."""
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            use = request.method in SAFE_METHODS and not _sticky(
+                await request.session.aget(STICKY_SESSION_KEY)
+            )
+            token = _use_replica.set(use)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        use = request.method in SAFE_METHODS and not _sticky(
+            request.session.get(STICKY_SESSION_KEY)
+        )
+        token = _use_replica.set(use)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+
+    return wrapper
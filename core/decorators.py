@@ -10,9 +10,7 @@ def facility_manager_required(view_func):
     @wraps(view_func)
     @login_required
     def _wrapped(request, *args, **kwargs):
-        from bookings.models import Facility
-
-        if not Facility.objects.filter(managers=request.user).exists():
+        if not request.managed_facilities:
             return redirect("core:home")
         return view_func(request, *args, **kwargs)
 
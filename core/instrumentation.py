@@ -0,0 +1,200 @@
+"""
+Opt-in per-request instrumentation (settings.INSTRUMENTATION).
+
+For each request the middleware in core.middleware records SQL (count, total time,
+slowest statements, repeated statement fingerprints), template render time and total
+view time. The figures go out in a Server-Timing header. Requests over budget are
+logged as one JSON line. A rolling summary per URL name is kept in memory for the
+staff page at /admin/instrumentation/.
+"""
+
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from statistics import median, quantiles
+
+from django.template.base import Template
+
+logger = logging.getLogger("rinkrent.instrumentation")
+
+SLOWEST_KEPT = 5
+SUMMARY_WINDOW = 200
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """What one request spent, filled in by the SQL wrapper and the template hook."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+        self.statements = []  # (ms, sql)
+        self.fingerprints = Counter()
+
+    def record_query(self, sql, ms):
+        self.queries += 1
+        self.sql_ms += ms
+        self.statements.append((ms, sql))
+        self.fingerprints[fingerprint(sql)] += 1
+
+    def slowest(self):
+        return [
+            {"ms": round(ms, 2), "sql": sql[:300]}
+            for ms, sql in sorted(self.statements, key=lambda s: s[0], reverse=True)[:SLOWEST_KEPT]
+        ]
+
+    def duplicates(self):
+        return {sql[:300]: n for sql, n in self.fingerprints.most_common() if n > 1}
+
+
+_IN_LIST = re.compile(r"\bIN \(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SAVEPOINT = re.compile(r'"s\d+_x\d+"')
+
+
+def fingerprint(sql):
+    """SQL with literals, IN-lists and savepoint names collapsed, so repeats compare equal."""
+    sql = _SAVEPOINT.sub('"s?"', sql)
+    sql = _LITERALS.sub("?", sql)
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrapper hook: time each statement for the current request."""
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            metrics.record_query(sql, (time.perf_counter() - started) * 1000)
+
+
+_patch_lock = threading.Lock()
+
+
+def install_template_timer():
+    """Wrap Template.render once so render time is attributed to the current request."""
+    with _patch_lock:
+        if getattr(Template.render, "_instrumented", False):
+            return
+        original = Template.render
+
+        def render(self, context):
+            metrics = _current.get()
+            if metrics is None:
+                return original(self, context)
+            # Only the outermost render counts; includes and extends happen inside it.
+            metrics.template_depth += 1
+            started = time.perf_counter()
+            try:
+                return original(self, context)
+            finally:
+                metrics.template_depth -= 1
+                if metrics.template_depth == 0:
+                    metrics.template_ms += (time.perf_counter() - started) * 1000
+
+        render._instrumented = True
+        Template.render = render
+
+
+def server_timing(metrics, total_ms):
+    return ", ".join(
+        [
+            f'sql;dur={metrics.sql_ms:.1f};desc="{metrics.queries} queries"',
+            f"tpl;dur={metrics.template_ms:.1f}",
+            f"view;dur={total_ms:.1f}",
+        ]
+    )
+
+
+def log_if_over_budget(request, response, metrics, total_ms, url_name, budget_ms, query_budget):
+    if total_ms <= budget_ms and metrics.queries <= query_budget:
+        return
+    logger.warning(
+        json.dumps(
+            {
+                "event": "request_over_budget",
+                "method": request.method,
+                "path": request.path,
+                "url_name": url_name,
+                "status": response.status_code,
+                "total_ms": round(total_ms, 1),
+                "sql_ms": round(metrics.sql_ms, 1),
+                "template_ms": round(metrics.template_ms, 1),
+                "queries": metrics.queries,
+                "slowest": metrics.slowest(),
+                "duplicates": metrics.duplicates(),
+            }
+        )
+    )
+
+
+class Summary:
+    """Rolling per-URL-name figures over the last SUMMARY_WINDOW requests of each view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+
+    def add(self, url_name, metrics, total_ms):
+        with self._lock:
+            row = self._rows.get(url_name)
+            if row is None:
+                row = self._rows[url_name] = {
+                    "requests": 0,
+                    "recent": deque(maxlen=SUMMARY_WINDOW),
+                    "duplicates": Counter(),
+                }
+            row["requests"] += 1
+            row["recent"].append((total_ms, metrics.queries, metrics.sql_ms, metrics.template_ms))
+            row["duplicates"].update(metrics.duplicates())
+
+    def rows(self):
+        """One dict per URL name, slowest p95 first."""
+        with self._lock:
+            snapshot = {
+                name: (row["requests"], list(row["recent"]), row["duplicates"].copy())
+                for name, row in self._rows.items()
+            }
+        out = []
+        for name, (requests, recent, duplicates) in snapshot.items():
+            totals = [r[0] for r in recent]
+            p95 = quantiles(totals, n=20)[-1] if len(totals) > 1 else totals[0]
+            out.append(
+                {
+                    "url_name": name,
+                    "requests": requests,
+                    "p50_ms": round(median(totals), 1),
+                    "p95_ms": round(p95, 1),
+                    "avg_queries": round(sum(r[1] for r in recent) / len(recent), 1),
+                    "max_queries": max(r[1] for r in recent),
+                    "avg_sql_ms": round(sum(r[2] for r in recent) / len(recent), 1),
+                    "avg_template_ms": round(sum(r[3] for r in recent) / len(recent), 1),
+                    "top_duplicate": duplicates.most_common(1)[0] if duplicates else None,
+                }
+            )
+        return sorted(out, key=lambda r: r["p95_ms"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+summary = Summary()
@@ -0,0 +1,280 @@
+import hashlib
+import hmac
+import json
+import statistics
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from bookings.management.commands.seed_bench import BENCH_MANAGER, BENCH_PREFIX
+from bookings.models import Booking, Facility, IceSurface, Slot
+from bookings.services import ensure_slots_for_date, generate_slots_for_surface, get_facility_tz
+
+SCENARIOS = [
+    "generate_slots",
+    "ensure_slots",
+    "ensure_slots_cold",
+    "search",
+    "search_nearby",
+    "facility_detail",
+    "slot_list",
+    "my_bookings",
+    "book",
+    "webhook",
+]
+WEBHOOK_SECRET = "whsec_bench"
+COLD_CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the hot paths against bench data (see seed_bench) and print timings and query "
+        "counts as JSON, to compare between commits. Writes run in a rolled-back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations", type=int, default=20, help="Timed runs per scenario (default 20)."
+        )
+        parser.add_argument(
+            "--only", nargs="+", choices=SCENARIOS, help="Run just these scenarios."
+        )
+        parser.add_argument(
+            "--warm-cache",
+            action="store_true",
+            help="Serve cached reads from the configured cache (default: measure the DB path).",
+        )
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+        parser.add_argument(
+            "--compare", help="Earlier JSON report; print per-scenario changes to stderr."
+        )
+
+    def handle(self, *args, **options):
+        surface = (
+            IceSurface.objects.filter(facility__name__startswith=BENCH_PREFIX)
+            .select_related("facility")
+            .annotate(booked=Count("slots__booking"))
+            .order_by("-booked", "pk")
+            .first()
+        )
+        if surface is None:
+            raise CommandError("No bench data; run `manage.py seed_bench` first.")
+        self.surface = surface
+        self.client = Client()
+
+        overrides = {
+            "ALLOWED_HOSTS": ["testserver"],
+            "EMAIL_BACKEND": "django.core.mail.backends.locmem.EmailBackend",
+            "STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET,
+            "INSTRUMENTATION": False,
+        }
+        if not options["warm_cache"]:
+            overrides["CACHES"] = COLD_CACHES
+        results = {}
+        with override_settings(**overrides):
+            for name in options["only"] or SCENARIOS:
+                results[name] = self._measure(getattr(self, f"_{name}"), options["iterations"])
+
+        report = {"meta": self._meta(options), "results": results}
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(text + "\n")
+        else:
+            self.stdout.write(text)
+        if options["compare"]:
+            with open(options["compare"]) as fh:
+                self._compare(json.load(fh)["results"], results)
+
+    def _measure(self, scenario, iterations):
+        """Run the scenario once to warm up, then time it; writes are rolled back."""
+        timings = []
+        queries = 0
+        for i in range(iterations + 1):
+            with transaction.atomic():
+                run = scenario()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    run()
+                    elapsed = (time.perf_counter() - started) * 1000
+                transaction.set_rollback(True)
+            if i:
+                timings.append(elapsed)
+                queries = len(captured)
+        return {
+            "iterations": iterations,
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(
+                statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0], 3
+            ),
+            "min_ms": round(min(timings), 3),
+            "queries": queries,
+        }
+
+    def _meta(self, options):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                cwd=settings.BASE_DIR,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = ""
+        bench = Facility.objects.filter(name__startswith=BENCH_PREFIX)
+        return {
+            "created": timezone.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "database": connection.vendor,
+            "cache": "warm" if options["warm_cache"] else "cold",
+            "data": {
+                "facilities": bench.count(),
+                "surfaces": IceSurface.objects.filter(facility__in=bench).count(),
+                "slots": Slot.objects.filter(ice_surface__facility__in=bench).count(),
+                "bookings": Booking.objects.filter(slot__ice_surface__facility__in=bench).count(),
+            },
+        }
+
+    def _compare(self, before, after):
+        for name, now in after.items():
+            then = before.get(name)
+            if then is None:
+                continue
+            change = (
+                (now["p50_ms"] - then["p50_ms"]) / then["p50_ms"] * 100 if then["p50_ms"] else 0
+            )
+            sys.stderr.write(
+                f"{name:>18}: p50 {then['p50_ms']:.2f} -> {now['p50_ms']:.2f} ms ({change:+.0f}%), "
+                f"queries {then['queries']} -> {now['queries']}\n"
+            )
+
+    # Scenarios: each sets up (untimed) and returns the callable to time.
+
+    def _local_date(self, days_ahead=1):
+        tz = get_facility_tz(self.surface.facility)
+        return (timezone.localtime(timezone.now(), tz) + timedelta(days=days_ahead)).date()
+
+    def _generate_slots(self):
+        # A week past the seeded range, so every slot is created.
+        start = self._local_date(days_ahead=400)
+        return lambda: generate_slots_for_surface(self.surface, start, start + timedelta(days=6))
+
+    def _ensure_slots(self):
+        day = self._local_date()
+        return lambda: ensure_slots_for_date(self.surface, day)
+
+    def _ensure_slots_cold(self):
+        day = self._local_date(days_ahead=400)
+        return lambda: ensure_slots_for_date(self.surface, day)
+
+    def _get(self, url, **params):
+        def run():
+            response = self.client.get(url, params)
+            if response.status_code != 200:
+                raise CommandError(f"GET {url} returned {response.status_code}")
+
+        return run
+
+    def _search(self):
+        self.client.logout()
+        return self._get(reverse("customers:search"))
+
+    def _search_nearby(self):
+        self.client.logout()
+        facility = self.surface.facility
+        return self._get(reverse("customers:search"), lat=facility.latitude, lng=facility.longitude)
+
+    def _facility_detail(self):
+        self.client.logout()
+        return self._get(
+            reverse("customers:facility_detail", args=[self.surface.facility_id]),
+            surface=self.surface.pk,
+            date=self._local_date().isoformat(),
+        )
+
+    def _slot_list(self):
+        self.client.force_login(self.surface.facility.managers.get(username=BENCH_MANAGER))
+        session = self.client.session
+        session["active_facility_id"] = self.surface.facility_id
+        session.save()
+        return self._get(reverse("facilities:slot_list"), surface=self.surface.pk)
+
+    def _busiest_customer(self):
+        pk = (
+            Booking.objects.filter(slot__ice_surface__facility__name__startswith=BENCH_PREFIX)
+            .values_list("user", flat=True)
+            .annotate(n=Count("pk"))
+            .order_by("-n")
+            .first()
+        )
+        return get_user_model().objects.get(pk=pk)
+
+    def _my_bookings(self):
+        self.client.force_login(self._busiest_customer())
+        return self._get(reverse("customers:my_bookings"))
+
+    def _book(self):
+        self.client.force_login(self._busiest_customer())
+        slots = list(
+            Slot.objects.filter(
+                ice_surface=self.surface, state="available", start__gt=timezone.now()
+            ).values_list("pk", flat=True)[:2]
+        )
+        if not slots:
+            raise CommandError("No available future slot on the bench surface.")
+
+        def run():
+            response = self.client.post(
+                reverse("customers:book") + "?" + "&".join(f"slot={pk}" for pk in slots),
+                {"slot": slots, "sport": "hockey", "payment_method": "pay_later"},
+            )
+            if response.status_code != 302:
+                raise CommandError(f"book returned {response.status_code}")
+
+        return run
+
+    def _webhook(self):
+        booking = Booking.objects.filter(
+            slot__ice_surface=self.surface, payment_status="pending"
+        ).first()
+        if booking is None:
+            raise CommandError("No pending booking on the bench surface.")
+        booking.stripe_payment_intent_id = "pi_bench"
+        booking.save(update_fields=["stripe_payment_intent_id"])
+        payload = json.dumps(
+            {
+                "id": "evt_bench",
+                "object": "event",
+                "type": "payment_intent.succeeded",
+                "data": {"object": {"id": "pi_bench", "object": "payment_intent"}},
+            }
+        )
+        stamp = int(time.time())
+        signature = hmac.new(
+            WEBHOOK_SECRET.encode(), f"{stamp}.{payload}".encode(), hashlib.sha256
+        ).hexdigest()
+
+        def run():
+            response = self.client.post(
+                reverse("customers:stripe_webhook"),
+                payload,
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=f"t={stamp},v1={signature}",
+            )
+            if response.status_code != 200:
+                raise CommandError(f"webhook returned {response.status_code}")
+
+        return run
@@ -0,0 +1,89 @@
+import socket
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent GET requests at a running server and report throughput and latency. "
+        "--slow-clients holds extra connections open with a trickled request, the way slow "
+        "mobile clients do, to compare how WSGI and ASGI workers cope."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Full URL, e.g. http://127.0.0.1:8000/")
+        parser.add_argument("--requests", type=int, default=500, help="Total requests.")
+        parser.add_argument("--concurrency", type=int, default=20, help="Parallel clients.")
+        parser.add_argument(
+            "--slow-clients",
+            type=int,
+            default=0,
+            help="Connections that send their request one header per second meanwhile.",
+        )
+        parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout (s).")
+
+    def handle(self, *args, **options):
+        url = options["url"]
+        parts = urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise CommandError("Only plain http:// URLs are supported.")
+
+        stop = threading.Event()
+        slow = [
+            threading.Thread(target=self._slow_client, args=(parts, stop), daemon=True)
+            for _ in range(options["slow_clients"])
+        ]
+        for thread in slow:
+            thread.start()
+        time.sleep(0.5 if slow else 0)
+
+        def fetch(_):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=options["timeout"]) as response:
+                    response.read()
+                    ok = response.status == 200
+            except OSError:
+                ok = False
+            return ok, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            results = list(pool.map(fetch, range(options["requests"])))
+        elapsed = time.perf_counter() - started
+        stop.set()
+
+        timings = [ms for ok, ms in results if ok]
+        errors = len(results) - len(timings)
+        self.stdout.write(
+            f"{len(results)} requests, {options['concurrency']} concurrent, "
+            f"{options['slow_clients']} slow clients, {elapsed:.2f}s"
+        )
+        self.stdout.write(f"throughput: {len(timings) / elapsed:.1f} req/s, errors: {errors}")
+        if len(timings) > 1:
+            self.stdout.write(
+                f"latency: p50 {statistics.median(timings):.1f} ms, "
+                f"p95 {statistics.quantiles(timings, n=20)[-1]:.1f} ms, "
+                f"max {max(timings):.1f} ms"
+            )
+
+    @staticmethod
+    def _slow_client(parts, stop):
+        """Keep a connection busy by sending the request headers very slowly."""
+        while not stop.is_set():
+            try:
+                with socket.create_connection((parts.hostname, parts.port or 80), timeout=5) as s:
+                    s.sendall(f"GET {parts.path or '/'} HTTP/1.1\r\n".encode())
+                    for i in range(60):
+                        if stop.wait(1):
+                            return
+                        s.sendall(f"X-Slow-{i}: 1\r\n".encode())
+            except OSError:
+                if stop.wait(0.5):
+                    return
@@ -0,0 +1,35 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.caching import is_shared
+from core.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Resolve the URLconf, compile every template and fill the read caches if they are "
+        "shared (run at deploy time by build.sh; gunicorn.conf.py does the same in the "
+        "master before forking)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-caches", action="store_true", help="Skip filling the caches (no DB access)."
+        )
+        parser.add_argument("--json", action="store_true", help="Print the timings as JSON.")
+
+    def handle(self, *args, **options):
+        # A per-process cache filled here would be gone when this command exits.
+        alias = getattr(settings, "BOOKINGS_CACHE_ALIAS", "default")
+        steps = warm_up(caches=not options["no_caches"] and is_shared(alias))
+        if options["json"]:
+            self.stdout.write(json.dumps(steps, indent=2))
+            return
+        for step in steps:
+            detail = ", ".join(f"{k} {v}" for k, v in step.items() if k not in ("step", "ms"))
+            self.stdout.write(f"{step['step']:>10}: {step['ms']:7.1f} ms  {detail}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Warm-up done in {sum(s['ms'] for s in steps):.1f} ms")
+        )
@@ -0,0 +1,329 @@
+"""
+In-process metrics: counters and histograms rendered in Prometheus text format at
+/metrics/ (see core.views.metrics_view).
+
+Each process keeps its own values. With settings.METRICS_DIR set, every process also
+writes them to its own JSON file in that directory (atomically, from a background thread
+every METRICS_FLUSH_SECONDS and at exit, never in the request being counted), and
+/metrics/ sums all files, so any gunicorn worker can answer for the whole server. Files
+of processes that have exited (recycled workers) are folded into retired.json, so the
+directory doesn't grow and totals don't drop. Clear the directory when the server starts.
+
+All metrics are declared at the bottom of this module, so the endpoint knows every one
+of them regardless of which modules a worker has imported.
+"""
+
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+RETIRED = "retired.json"
+
+logger = logging.getLogger("rinkrent.metrics")
+
+
+def _merge(merged, name, key, value):
+    current = merged.get((name, key))
+    if current is None:
+        merged[(name, key)] = list(value) if isinstance(value, list) else value
+    elif isinstance(current, list):
+        merged[(name, key)] = [a + b for a, b in zip(current, value, strict=False)]
+    else:
+        merged[(name, key)] = current + value
+
+
+def _read_rows(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return []
+
+
+def _write_rows(path, rows):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(rows, fh)
+    os.replace(tmp, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._values = {}
+        self._pid = None
+        self._flusher_pid = None
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+
+    def _own_state(self):
+        # After a fork the child starts from zero under a file of its own.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._token = uuid.uuid4().hex[:8]
+            self._values = {}
+        return self._values
+
+    def add(self, name, key, amount):
+        with self._lock:
+            values = self._own_state()
+            values[(name, key)] = values.get((name, key), 0) + amount
+        self._maybe_flush()
+
+    def observe(self, histogram, key, value):
+        with self._lock:
+            values = self._own_state()
+            entry = values.get((histogram.name, key))
+            if entry is None:
+                # Per-bucket counts (not cumulative), then sum and count.
+                entry = values[(histogram.name, key)] = [0] * (len(histogram.buckets) + 3)
+            index = next(
+                (i for i, bound in enumerate(histogram.buckets) if value <= bound),
+                len(histogram.buckets),
+            )
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+        self._maybe_flush()
+
+    # Multi-process sharing
+
+    def _directory(self):
+        return getattr(settings, "METRICS_DIR", "")
+
+    def _maybe_flush(self):
+        # One flusher thread per process (threads don't survive a fork).
+        if not self._directory() or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_periodically, name="metrics-flush", daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(getattr(settings, "METRICS_FLUSH_SECONDS", 2))
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("Could not write metrics to %s", self._directory())
+
+    def flush(self):
+        directory = self._directory()
+        if not directory:
+            return
+        with self._lock:
+            values = self._own_state()
+            rows = [[name, list(key), value] for (name, key), value in values.items()]
+            path = os.path.join(directory, f"{self._pid}-{self._token}.json")
+        os.makedirs(directory, exist_ok=True)
+        _write_rows(path, rows)
+
+    def _retire(self, directory, filename):
+        """Fold an exited process's file into RETIRED; another collector may beat us to it."""
+        claimed = os.path.join(directory, filename.removesuffix(".json") + ".retiring")
+        try:
+            os.rename(os.path.join(directory, filename), claimed)
+        except OSError:
+            return
+        with open(os.path.join(directory, "retired.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            merged = {}
+            for path in (os.path.join(directory, RETIRED), claimed):
+                for name, key, value in _read_rows(path):
+                    _merge(merged, name, tuple(key), value)
+            _write_rows(
+                os.path.join(directory, RETIRED),
+                [[name, list(key), value] for (name, key), value in merged.items()],
+            )
+            os.remove(claimed)
+
+    def collect(self):
+        """{(name, label values): value} summed over every process."""
+        self.flush()
+        merged = {}
+        directory = self._directory()
+        if directory and os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                pid = filename.partition("-")[0]
+                if filename.endswith(".json") and pid.isdigit() and not _alive(int(pid)):
+                    self._retire(directory, filename)
+            for filename in os.listdir(directory):
+                if filename.endswith(".json"):
+                    for name, key, value in _read_rows(os.path.join(directory, filename)):
+                        _merge(merged, name, tuple(key), value)
+        else:
+            with self._lock:
+                for (name, key), value in self._own_state().items():
+                    _merge(merged, name, key, value)
+        return merged
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        values = self.collect()
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            samples = sorted((key, v) for (name, key), v in values.items() if name == metric.name)
+            for key, value in samples:
+                lines.extend(metric.samples(key, value))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount:
+            REGISTRY.add(self.name, self._key(labels), amount)
+
+    def samples(self, key, value):
+        return [f"{self.name}_total{_labels(zip(self.labelnames, key, strict=False))} {value}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        REGISTRY.observe(self, self._key(labels), value)
+
+    def time(self, **labels):
+        """
+        Time a block (``with h.time() as labels:``) or a sync/async function (``@h.time()``).
+        The yielded labels dict can be changed inside the block, e.g. to set an outcome;
+        a block that raises is recorded with outcome="error" if the metric has one.
+        """
+        return _Timer(self, labels)
+
+    def samples(self, key, value):
+        pairs = list(zip(self.labelnames, key, strict=False))
+        lines = []
+        cumulative = 0
+        for bound, count in zip([*self.buckets, "+Inf"], value, strict=False):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_labels([*pairs, ('le', bound)])} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(pairs)} {value[-2]}")
+        lines.append(f"{self.name}_count{_labels(pairs)} {value[-1]}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.base = labels
+
+    def __enter__(self):
+        self.labels = dict(self.base)
+        self.started = time.perf_counter()
+        return self.labels
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and "outcome" in self.histogram.labelnames:
+            self.labels["outcome"] = "error"
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+    def __call__(self, func):
+        if iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _Timer(self.histogram, self.base):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram, self.base):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+# Catalog
+
+SEARCH_SECONDS = Histogram("rinkrent_search_seconds", "Time to serve the customer search page.")
+BOOK_SECONDS = Histogram(
+    "rinkrent_book_seconds", "Time to serve the book view.", labelnames=["method"]
+)
+BOOKINGS_CREATED = Counter(
+    "rinkrent_bookings_created", "Bookings created by customers.", labelnames=["kind"]
+)
+PAYMENT_INTENT_SECONDS = Histogram(
+    "rinkrent_payment_intent_seconds",
+    "Latency of Stripe PaymentIntent creation.",
+    labelnames=["outcome"],
+)
+REFUNDS = Counter("rinkrent_refunds", "Stripe refunds attempted.", labelnames=["outcome"])
+WEBHOOK_SECONDS = Histogram(
+    "rinkrent_webhook_seconds", "Time to process a Stripe webhook.", labelnames=["outcome"]
+)
+WEBHOOK_EVENTS = Counter(
+    "rinkrent_webhook_events", "Stripe webhook events received.", labelnames=["type", "outcome"]
+)
+SLOTS_GENERATED = Counter("rinkrent_slots_generated", "Slots created from hours of operation.")
+BULK_SLOT_CHANGES = Counter(
+    "rinkrent_bulk_slot_changes", "Slots changed by bulk actions.", labelnames=["action"]
+)
+EMAILS_SENT = Counter(
+    "rinkrent_emails", "Notification emails handed to the mail backend.", labelnames=["outcome"]
+)
+LIVE_SLOT_EVENTS = Counter(
+    "rinkrent_live_slot_events",
+    "Slot changes pushed to live slot streams.",
+    labelnames=["trigger"],
+)
@@ -0,0 +1,196 @@
+"""
+Per-request facility membership, read-replica stickiness, an async-capable WhiteNoise
+for ASGI, and opt-in request instrumentation.
+
+``request.managed_facilities`` is the list of facility ids the user manages, resolved
+lazily at most once per request. With a shared cache (CACHE_URL) the ids are kept in the
+session alongside a per-user version stored in that cache; a committed change to
+``Facility.managers`` bumps the version, so every worker's next request re-reads
+membership instead of trusting the session copy. With the per-process default cache a
+revocation would only reach one worker, so membership is read on every request instead.
+"""
+
+import time
+import uuid
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from core import instrumentation
+from core.caching import is_shared
+from core.db_router import SAFE_METHODS, amark_sticky, mark_sticky
+
+SESSION_KEY = "_managed_facilities"
+
+
+def _version_key(user_id):
+    return f"managed-facilities:{user_id}"
+
+
+def _current_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_managed_facilities(user_ids):
+    """Once the current transaction commits, make these users' next requests re-read."""
+    if not is_shared():
+        return
+    keys = [_version_key(pk) for pk in user_ids]
+    if keys:
+        transaction.on_commit(
+            lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+        )
+
+
+def _read_managed_facility_ids(user):
+    from bookings.models import Facility
+
+    return list(Facility.objects.filter(managers=user).order_by("pk").values_list("pk", flat=True))
+
+
+def managed_facility_ids(request):
+    """Ids of the facilities request.user manages (lowest id first)."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return []
+    session = getattr(request, "session", None)
+    if session is None or not is_shared():
+        return _read_managed_facility_ids(user)
+    version = _current_version(user.pk)
+    cached = session.get(SESSION_KEY)
+    if cached and cached.get("user") == user.pk and cached.get("version") == version:
+        return cached["ids"]
+    ids = _read_managed_facility_ids(user)
+    session[SESSION_KEY] = {"user": user.pk, "version": version, "ids": ids}
+    return ids
+
+
+class FacilityMembershipMiddleware:
+    """Attach a lazy ``request.managed_facilities``; must come after auth and sessions."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Returns the inner response, or its coroutine when running under ASGI.
+        request.managed_facilities = SimpleLazyObject(lambda: managed_facility_ids(request))
+        return self.get_response(request)
+
+
+class ReplicaStickinessMiddleware:
+    """
+    After a write request (any method but GET/HEAD) from a visitor with a session, keep
+    that session's reads on the primary for a while (see core.db_router). Requests
+    without a session, such as Stripe webhooks, don't create one. Must come after sessions.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _wrote(request):
+        session = request.session
+        return request.method not in SAFE_METHODS and (session.session_key or session.modified)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self._wrote(request):
+            mark_sticky(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self._wrote(request):
+            await amark_sticky(request)
+        return response
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that can run in async mode, so under ASGI a sync-only middleware doesn't
+    push every request (static or not) onto a thread. Lookups are in-memory dict reads;
+    only serving a file and autorefresh scans run in a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class InstrumentationMiddleware:
+    """
+    Per-request SQL/template/view timing (see core.instrumentation). Opt in with
+    INSTRUMENTATION=True; otherwise Django drops this middleware at startup. Sync-only,
+    so under ASGI all of a request's queries run on the thread that is measuring them.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budget_ms = getattr(settings, "INSTRUMENTATION_BUDGET_MS", 500)
+        self.query_budget = getattr(settings, "INSTRUMENTATION_QUERY_BUDGET", 50)
+        instrumentation.install_template_timer()
+
+    def __call__(self, request):
+        metrics, token = instrumentation.start()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(instrumentation.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            instrumentation.finish(token)
+        total_ms = (time.perf_counter() - started) * 1000
+        match = getattr(request, "resolver_match", None)
+        url_name = match.view_name if match else "<unresolved>"
+        response["Server-Timing"] = instrumentation.server_timing(metrics, total_ms)
+        instrumentation.log_if_over_budget(
+            request, response, metrics, total_ms, url_name, self.budget_ms, self.query_budget
+        )
+        instrumentation.summary.add(url_name, metrics, total_ms)
+        return response
@@ -0,0 +1,26 @@
+"""Invalidate cached facility membership when managers are added, removed or deleted."""
+
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from bookings.models import Facility
+
+from .middleware import invalidate_managed_facilities
+
+
+@receiver(m2m_changed, sender=Facility.managers.through)
+def facility_managers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        # user.managed_facilities.add(...): the instance is the user.
+        invalidate_managed_facilities([instance.pk])
+    elif action == "pre_clear":
+        invalidate_managed_facilities(instance.managers.values_list("pk", flat=True))
+    else:
+        invalidate_managed_facilities(pk_set or ())
+
+
+@receiver(pre_delete, sender=Facility)
+def facility_deleted(sender, instance, **kwargs):
+    invalidate_managed_facilities(instance.managers.values_list("pk", flat=True))
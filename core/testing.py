@@ -0,0 +1,83 @@
+"""
+Query-budget assertions for tests.
+
+A hot view should cost the same number of queries whether it shows one row or a
+hundred; a new per-row relation access (N+1) otherwise ships silently. Mix
+QueryBudgetMixin into a TestCase and call assertConstantQueries with a seeding function
+and the request to measure. Failures list the offending SQL.
+"""
+
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core.instrumentation import fingerprint
+
+# Cached reads would hide the queries being budgeted; measure the database path.
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+@contextmanager
+def shared_cache():
+    """A file-based default cache, which core.caching.is_shared() treats as cross-process."""
+    filebased = "django.core.cache.backends.filebased.FileBasedCache"
+    with (
+        tempfile.TemporaryDirectory() as directory,
+        override_settings(CACHES={"default": {"BACKEND": filebased, "LOCATION": directory}}),
+    ):
+        yield
+
+
+def format_queries(queries):
+    return "\n".join(f"  {i}. {q['sql']}" for i, q in enumerate(queries, 1))
+
+
+class QueryBudgetMixin:
+    query_sizes = (1, 4)
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        """Fail if the block runs more than `budget` queries, listing all of them."""
+        with CaptureQueriesContext(connection) as captured:
+            yield captured
+        if len(captured) > budget:
+            self.fail(
+                f"{len(captured)} queries, budget {budget}:\n"
+                + format_queries(captured.captured_queries)
+            )
+
+    def assertConstantQueries(self, seed, run, sizes=None, budget=None):
+        """
+        For each size, seed(size) builds fixtures and returns whatever run needs; run(data)
+        is measured, then everything is rolled back. Fails when the count changes with size
+        (showing the statements that grew) or exceeds `budget`. Returns the count.
+        """
+        runs = []
+        for size in sizes or self.query_sizes:
+            with transaction.atomic(), override_settings(CACHES=NO_CACHE):
+                data = seed(size)
+                with CaptureQueriesContext(connection) as captured:
+                    run(data)
+                transaction.set_rollback(True)
+            runs.append((size, captured.captured_queries))
+
+        base_size, base = runs[0]
+        for size, queries in runs[1:]:
+            if len(queries) == len(base):
+                continue
+            before = Counter(fingerprint(q["sql"]) for q in base)
+            after = Counter(fingerprint(q["sql"]) for q in queries)
+            grew = "\n".join(
+                f"  {before[sql]} -> {n}x {sql}" for sql, n in after.items() if n != before[sql]
+            )
+            self.fail(
+                f"{len(base)} queries at size {base_size} but {len(queries)} at size {size}. "
+                f"Statements whose count changed:\n{grew}\n"
+                f"All queries at size {size}:\n{format_queries(queries)}"
+            )
+        if budget is not None and len(base) > budget:
+            self.fail(f"{len(base)} queries, budget {budget}:\n" + format_queries(base))
+        return len(base)
@@ -1,8 +1,30 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from bookings.models import Facility
+from bookings.models import Booking, Facility, IceSurface, Slot, SurfaceDailyRollup
+from core import instrumentation, metrics
+from core.admin_tools import EstimatedCountPaginator, estimated_row_count
+from core.db_router import ReplicaRouter
+from core.instrumentation import fingerprint
+from core.middleware import SESSION_KEY
 
 User = get_user_model()
 
@@ -48,3 +70,318 @@ class AuthTests(TestCase):
         )
         self.assertEqual(response.status_code, 302)
         self.assertTrue(User.objects.filter(username="newuser").exists())
+
+
+class FacilityMembershipTests(TestCase):
+    def setUp(self):
+        # Membership is only kept in the session when the cache is shared by workers.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = self.settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory.name,
+                }
+            }
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+        self.client = Client()
+        self.user = User.objects.create_user(username="mgr", password="pass")
+        self.facility = Facility.objects.create(name="Rink", timezone="UTC")
+        self.facility.managers.add(self.user)
+        self.client.login(username="mgr", password="pass")
+
+    def membership_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        return [q for q in ctx.captured_queries if "bookings_facility_managers" in q["sql"]]
+
+    def test_membership_is_read_once_then_served_from_session(self):
+        self.client.get(reverse("facilities:surface_list"))
+        self.assertEqual(
+            self.client.session[SESSION_KEY]["ids"],
+            [self.facility.pk],
+        )
+        self.assertEqual(self.membership_queries(reverse("facilities:surface_list")), [])
+
+    def test_removing_manager_takes_effect_on_next_request(self):
+        self.assertEqual(self.client.get(reverse("facilities:surface_list")).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.facility.managers.remove(self.user)
+        response = self.client.get(reverse("facilities:surface_list"))
+        self.assertRedirects(response, reverse("core:home"), fetch_redirect_response=False)
+
+    def test_adding_facility_from_user_side_invalidates(self):
+        customer = User.objects.create_user(username="cust", password="pass")
+        self.client.login(username="cust", password="pass")
+        self.assertEqual(self.client.get(reverse("core:home")).url, reverse("customers:search"))
+        with self.captureOnCommitCallbacks(execute=True):
+            customer.managed_facilities.add(self.facility)
+        self.assertEqual(self.client.get(reverse("core:home")).url, reverse("facilities:dashboard"))
+
+    def test_per_process_cache_reads_membership_every_request(self):
+        locmem = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        with self.settings(CACHES={"default": locmem}):
+            url = reverse("facilities:surface_list")
+            self.assertEqual(len(self.membership_queries(url)), 1)
+            self.assertNotIn(SESSION_KEY, self.client.session)
+            # No version bump reaches this request (as in another worker): the revocation
+            # still applies because nothing was cached.
+            self.facility.managers.remove(self.user)
+            response = self.client.get(url)
+        self.assertRedirects(response, reverse("core:home"), fetch_redirect_response=False)
+
+
+@override_settings(DATABASE_REPLICAS=["default"])
+class ReplicaRoutingTests(TestCase):
+    """The "replica" is the test database itself; routed reads are counted via random.choice."""
+
+    def setUp(self):
+        self.facility = Facility.objects.create(name="Rink", timezone="UTC")
+        self.surface = IceSurface.objects.create(facility=self.facility, name="A")
+        start = timezone.now() + timedelta(days=1)
+        self.slot = Slot.objects.create(
+            ice_surface=self.surface, start=start, end=start + timedelta(hours=1), rate=50
+        )
+        User.objects.create_user(username="c", password="p", email="c@example.com")
+        self.client.login(username="c", password="p")
+
+    def replica_reads(self, method, url, client=None, **kwargs):
+        with mock.patch("core.db_router.random.choice", side_effect=lambda a: a[0]) as choice:
+            response = getattr(client or self.client, method)(url, **kwargs)
+        return response, choice.call_count
+
+    def test_read_paths_use_a_replica(self):
+        day = self.slot.start.date().isoformat()
+        for url in [
+            reverse("customers:search"),
+            reverse("customers:my_bookings"),
+            reverse("customers:facility_detail", args=[self.facility.pk])
+            + f"?surface={self.surface.pk}&date={day}",
+        ]:
+            response, reads = self.replica_reads("get", url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertGreater(reads, 0, url)
+
+    def test_booking_and_webhook_read_the_primary(self):
+        url = reverse("customers:book") + f"?slot={self.slot.pk}"
+        self.assertEqual(self.replica_reads("get", url)[1], 0)
+        sessions = Session.objects.count()
+        _, reads = self.replica_reads("post", reverse("customers:stripe_webhook"), Client())
+        self.assertEqual(reads, 0)
+        self.assertEqual(Session.objects.count(), sessions)
+
+    def test_session_reads_primary_for_a_while_after_booking(self):
+        response = self.client.post(
+            reverse("customers:book") + f"?slot={self.slot.pk}",
+            {"slot": [self.slot.pk], "sport": "hockey", "payment_method": "pay_later"},
+        )
+        self.assertRedirects(response, reverse("customers:my_bookings"))
+        response, reads = self.replica_reads("get", reverse("customers:my_bookings"))
+        self.assertEqual(reads, 0)
+        self.assertEqual(len(response.context["upcoming"]), 1)
+        later = time.time() + settings.REPLICA_STICKY_SECONDS + 1
+        with mock.patch("core.db_router.time.time", return_value=later):
+            self.assertGreater(self.replica_reads("get", reverse("customers:my_bookings"))[1], 0)
+
+    @override_settings(DATABASE_REPLICAS=["replica1"])
+    def test_router_keeps_writes_and_migrations_on_primary(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Slot))
+        self.assertEqual(router.db_for_write(Slot), "default")
+        self.assertFalse(router.allow_migrate("replica1", "bookings"))
+        self.assertTrue(router.allow_migrate("default", "bookings"))
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def test_estimate_only_for_large_unfiltered_tables(self):
+        Slot.objects.all().delete()
+        with mock.patch("core.admin_tools.estimated_row_count", return_value=5_000_000):
+            self.assertEqual(EstimatedCountPaginator(Slot.objects.all(), 50).count, 5_000_000)
+            filtered = Slot.objects.filter(state="booked")
+            self.assertEqual(EstimatedCountPaginator(filtered, 50).count, 0)
+        with mock.patch("core.admin_tools.estimated_row_count", return_value=10):
+            self.assertEqual(EstimatedCountPaginator(Slot.objects.all(), 50).count, 0)
+        if connection.vendor != "postgresql":
+            self.assertIsNone(estimated_row_count(Slot))
+
+
+@override_settings(INSTRUMENTATION=True, INSTRUMENTATION_BUDGET_MS=0)
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.summary.clear()
+        facility = Facility.objects.create(name="Rink", timezone="UTC")
+        self.staff = User.objects.create_user(username="staff", password="pass", is_staff=True)
+        facility.managers.add(self.staff)
+        self.client.login(username="staff", password="pass")
+
+    def test_server_timing_header_and_over_budget_log(self):
+        with self.assertLogs("rinkrent.instrumentation", level="WARNING") as logs:
+            response = self.client.get(reverse("facilities:surface_list"))
+        self.assertRegex(response["Server-Timing"], r'^sql;dur=[\d.]+;desc="\d+ queries", tpl;')
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record["url_name"], "facilities:surface_list")
+        self.assertGreater(record["queries"], 0)
+        self.assertGreater(record["template_ms"], 0)
+
+    def test_staff_summary_page_lists_views(self):
+        with self.assertLogs("rinkrent.instrumentation", level="WARNING"):
+            self.client.get(reverse("facilities:surface_list"))
+            response = self.client.get(reverse("instrumentation"))
+        self.assertContains(response, "facilities:surface_list")
+
+    def test_fingerprint_collapses_literals_and_in_lists(self):
+        self.assertEqual(
+            fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s, %s) AND x = 'a'"),
+            fingerprint("SELECT 2 FROM t WHERE id IN (%s, %s) AND x = 'b'"),
+        )
+        # Captured test queries carry interpolated values rather than placeholders.
+        self.assertEqual(
+            fingerprint("SELECT 1 FROM t WHERE id IN (7)"),
+            fingerprint("SELECT 1 FROM t WHERE id IN (1, 2, 3)"),
+        )
+
+
+class InstrumentationOffTests(TestCase):
+    def test_no_header_when_disabled(self):
+        response = self.client.get(reverse("core:home"))
+        self.assertNotIn("Server-Timing", response)
+
+
+@override_settings(METRICS_TOKEN="s3cret")
+class MetricsTests(TestCase):
+    def test_endpoint_requires_token_or_staff(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertContains(response, "# TYPE rinkrent_book_seconds histogram")
+
+    def test_book_and_emails_are_counted(self):
+        before = metrics.REGISTRY.collect()
+        key = ("rinkrent_bookings_created", ("single",))
+        facility = Facility.objects.create(name="Rink", timezone="UTC")
+        manager = User.objects.create_user(username="m", password="p", email="m@example.com")
+        facility.managers.add(manager)
+        surface = IceSurface.objects.create(facility=facility, name="A")
+        start = timezone.now() + timedelta(days=1)
+        slot = Slot.objects.create(
+            ice_surface=surface, start=start, end=start + timedelta(hours=1), rate=Decimal("50")
+        )
+        User.objects.create_user(username="c", password="p", email="c@example.com")
+        self.client.login(username="c", password="p")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("customers:book") + f"?slot={slot.pk}",
+                {"slot": [slot.pk], "sport": "hockey", "payment_method": "pay_later"},
+            )
+        after = metrics.REGISTRY.collect()
+        self.assertEqual(after[key] - before.get(key, 0), 1)
+        emails = ("rinkrent_emails", ("sent",))
+        self.assertGreaterEqual(after[emails] - before.get(emails, 0), 1)
+        count = after[("rinkrent_book_seconds", ("POST",))][-1]
+        self.assertGreaterEqual(count, 1)
+
+    def test_shared_directory_sums_processes(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            other = [["rinkrent_slots_generated", [], 5]]
+            with open(os.path.join(directory, "99999-abc.json"), "w") as fh:
+                json.dump(other, fh)
+            metrics.SLOTS_GENERATED.inc(2)
+            rendered = metrics.REGISTRY.render()
+        total = next(
+            line for line in rendered.splitlines() if line.startswith("rinkrent_slots_generated")
+        )
+        self.assertGreaterEqual(float(total.split()[-1]), 7)
+
+    def test_counting_does_not_write_and_exited_processes_are_retired(self):
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            metrics.SLOTS_GENERATED.inc(1)
+            self.assertEqual(os.listdir(directory), [])
+            for n in range(2):
+                path = os.path.join(directory, f"{exited.pid}-{n}.json")
+                with open(path, "w") as fh:
+                    json.dump([["rinkrent_slots_generated", [], 5]], fh)
+                total = metrics.REGISTRY.collect()[("rinkrent_slots_generated", ())]
+            left = sorted(f for f in os.listdir(directory) if not f.startswith(f"{os.getpid()}-"))
+            with open(os.path.join(directory, metrics.RETIRED)) as fh:
+                retired = json.load(fh)
+        self.assertEqual(left, ["retired.json", "retired.lock"])
+        self.assertEqual(retired, [["rinkrent_slots_generated", [], 10]])
+        self.assertGreaterEqual(total, 11)
+
+
+class BenchCommandTests(TestCase):
+    def setUp(self):
+        call_command(
+            "seed_bench",
+            facilities=2,
+            surfaces=1,
+            days=4,
+            days_back=1,
+            customers=5,
+            stdout=StringIO(),
+        )
+
+    def test_seed_creates_bench_data(self):
+        facilities = Facility.objects.filter(name__startswith="Bench rink")
+        self.assertEqual(facilities.count(), 2)
+        slots = Slot.objects.filter(ice_surface__facility__in=facilities)
+        self.assertGreater(slots.count(), 4 * 14)
+        self.assertEqual(
+            Booking.objects.filter(slot__in=slots).count(), slots.filter(state="booked").count()
+        )
+        manager = User.objects.get(username="bench-manager")
+        self.assertEqual(set(manager.managed_facilities.all()), set(facilities))
+        self.assertTrue(SurfaceDailyRollup.objects.filter(ice_surface__facility__in=facilities))
+
+    def test_bench_reports_every_scenario(self):
+        out = StringIO()
+        call_command("bench", iterations=1, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["meta"]["cache"], "cold")
+        self.assertEqual(report["meta"]["data"]["facilities"], 2)
+        for name, row in report["results"].items():
+            self.assertGreaterEqual(row["mean_ms"], 0, name)
+            self.assertIsInstance(row["queries"], int)
+        self.assertEqual(len(report["results"]), 10)
+        # Writes were rolled back.
+        self.assertFalse(Booking.objects.filter(stripe_payment_intent_id="pi_bench").exists())
+
+
+class WarmupTests(TestCase):
+    def warmup_steps(self):
+        out = StringIO()
+        call_command("warmup", "--json", stdout=out)
+        return {step["step"]: step for step in json.loads(out.getvalue())}
+
+    def test_warmup_resolves_urls_and_compiles_templates(self):
+        steps = self.warmup_steps()
+        self.assertGreater(steps["urls"]["names"], 0)
+        self.assertGreater(steps["templates"]["templates"], 0)
+        # The default cache is per-process: filling it from the command would be wasted.
+        self.assertNotIn("caches", steps)
+
+    def test_warmup_fills_a_shared_cache(self):
+        Facility.objects.create(name="Warm Rink", timezone="UTC")
+        filebased = "django.core.cache.backends.filebased.FileBasedCache"
+        with (
+            tempfile.TemporaryDirectory() as directory,
+            self.settings(CACHES={"default": {"BACKEND": filebased, "LOCATION": directory}}),
+        ):
+            steps = self.warmup_steps()
+        self.assertEqual(steps["caches"]["facilities"], 1)
+
+    def test_views_do_not_import_stripe(self):
+        code = (
+            "import os, sys, django;"
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings');"
+            "django.setup(); import config.urls;"
+            "sys.exit('stripe' in sys.modules)"
+        )
+        result = subprocess.run([sys.executable, "-c", code], cwd=settings.BASE_DIR)
+        self.assertEqual(result.returncode, 0)
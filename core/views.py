@@ -1,12 +1,17 @@
+from django.conf import settings
+from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth import login as auth_login
 from django.contrib.auth.views import LoginView, LogoutView
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseRedirect
 from django.shortcuts import redirect, render
 from django.urls import reverse, reverse_lazy
+from django.utils.crypto import constant_time_compare
 from django.views.generic import CreateView
 
+from core import instrumentation, metrics
 from core.forms import LoginForm, RegisterForm
+from core.middleware import managed_facility_ids
 
 User = get_user_model()
 
@@ -14,13 +19,8 @@ User = get_user_model()
 def home(request):
     """Landing: redirect logged-in users by role, else show landing page."""
     if request.user.is_authenticated:
-        try:
-            from bookings.models import Facility
-
-            if Facility.objects.filter(managers=request.user).exists():
-                return redirect("facilities:dashboard")
-        except Exception:
-            pass
+        if request.managed_facilities:
+            return redirect("facilities:dashboard")
         return redirect("customers:search")
     return render(request, "core/home.html")
 
@@ -33,20 +33,14 @@ class Login(LoginView):
     def form_valid(self, form):
         """Log in and redirect by role; use form.get_user() so we redirect the user we just authenticated."""
         auth_login(self.request, form.get_user())
-        user = form.get_user()
 
         # Respect ?next= when present (e.g. after login_required redirect)
         redirect_to = self.get_redirect_url()
         if redirect_to:
             return HttpResponseRedirect(redirect_to)
 
-        try:
-            from bookings.models import Facility
-
-            if Facility.objects.filter(managers=user).exists():
-                return HttpResponseRedirect(reverse("facilities:dashboard"))
-        except Exception:
-            pass
+        if managed_facility_ids(self.request):
+            return HttpResponseRedirect(reverse("facilities:dashboard"))
         return HttpResponseRedirect(reverse("customers:search"))
 
 
@@ -58,3 +52,35 @@ class Register(CreateView):
     form_class = RegisterForm
     template_name = "core/register.html"
     success_url = reverse_lazy("core:login")
+
+
+def instrumentation_summary(request):
+    """Staff page (wrapped in admin_view in config.urls): rolling per-view timings."""
+    if request.method == "POST":
+        instrumentation.summary.clear()
+        return redirect("instrumentation")
+    return render(
+        request,
+        "admin/instrumentation.html",
+        {
+            **admin.site.each_context(request),
+            "title": "Request instrumentation",
+            "enabled": settings.INSTRUMENTATION,
+            "rows": instrumentation.summary.rows(),
+            "window": instrumentation.SUMMARY_WINDOW,
+        },
+    )
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint: staff session or ``Authorization: Bearer <METRICS_TOKEN>``."""
+    token = settings.METRICS_TOKEN
+    header = request.headers.get("Authorization", "")
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if token and header.startswith("Bearer "):
+        authorized = authorized or constant_time_compare(header[len("Bearer ") :], token)
+    if not authorized:
+        return HttpResponseForbidden("Forbidden")
+    return HttpResponse(
+        metrics.REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
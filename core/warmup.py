@@ -0,0 +1,92 @@
+"""
+Warm-up run before serving: resolve the URLconf (importing every view), compile every
+template and fill the read caches.
+
+gunicorn.conf.py runs it in the master after preloading the app, so forked workers start
+with all of it in memory; the master then closes its connections and connection pools,
+which must not be shared with the workers. build.sh runs it through `manage.py warmup`
+at deploy time, which fails the deploy on a broken URLconf or template and fills the
+caches only if they are shared (a per-process cache would die with the command).
+"""
+
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+
+def _timed(steps, name, func):
+    started = time.perf_counter()
+    detail = func()
+    steps.append({"step": name, "ms": round((time.perf_counter() - started) * 1000, 1), **detail})
+
+
+def _urls():
+    resolver = get_resolver()
+    # Lookup tables for resolve() and reverse() are built on first use, per namespace.
+    names = len(resolver.reverse_dict)
+    for _, namespace in resolver.namespace_dict.values():
+        names += len(namespace.reverse_dict)
+    return {"names": names}
+
+
+def _template_names():
+    names = set()
+    for engine in engines.all():
+        dirs = list(engine.dirs)
+        if engine.app_dirs:
+            dirs += [Path(app.path) / "templates" for app in apps.get_app_configs()]
+        for directory in map(Path, dirs):
+            if directory.is_dir():
+                names.update(str(p.relative_to(directory)) for p in directory.rglob("*.html"))
+    return sorted(names)
+
+
+def _templates():
+    names = _template_names()
+    for name in names:
+        get_template(name)
+    return {"templates": len(names)}
+
+
+def _caches():
+    from bookings.cache import get_facility, get_search_facilities
+
+    facilities = get_search_facilities()
+    for facility in facilities:
+        get_facility(facility.pk)
+    # Connections must not be shared with the workers forked after this.
+    release_connections()
+    return {"facilities": len(facilities)}
+
+
+def release_connections():
+    """Close every connection and, with DB_POOL, the pools themselves (not just return to them)."""
+    connections.close_all()
+    for connection in connections.all(initialized_only=True):
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
+
+
+def _stripe():
+    if not settings.STRIPE_SECRET_KEY:
+        return {"skipped": True}
+    import stripe  # noqa: F401
+
+    return {}
+
+
+def warm_up(caches=True):
+    """Run each step and return [{"step", "ms", ...counts}]."""
+    steps = []
+    _timed(steps, "urls", _urls)
+    _timed(steps, "templates", _templates)
+    _timed(steps, "stripe", _stripe)
+    if caches:
+        _timed(steps, "caches", _caches)
+    return steps
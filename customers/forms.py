@@ -1,6 +1,10 @@
+from datetime import date, datetime, timedelta
+
 from django import forms
+from django.utils import timezone
 
-from bookings.models import Booking
+from bookings.facility_calendar import facility_tz, local_instant
+from bookings.models import Booking, HoursOfOperation, IceSurface
 
 INPUT_CLASS = "input input-bordered w-full"
 
@@ -25,3 +29,103 @@ class BookingForm(forms.Form):
         widget=forms.RadioSelect(attrs={"class": "radio radio-primary"}),
         label="Payment",
     )
+
+
+class RecurringBookingForm(BookingForm):
+    """Book the same time every week for a season (e.g. a league's weekly hour)."""
+
+    MAX_WEEKS = 52
+    HOURS_CHOICES = [(1, "1 hour"), (2, "2 hours"), (3, "3 hours"), (4, "4 hours")]
+
+    surface = forms.ModelChoiceField(
+        queryset=IceSurface.objects.none(),
+        widget=forms.Select(attrs={"class": "select select-bordered w-full"}),
+    )
+    weekday = forms.TypedChoiceField(
+        choices=HoursOfOperation.WEEKDAYS,
+        coerce=int,
+        widget=forms.Select(attrs={"class": "select select-bordered w-full"}),
+    )
+    start_time = forms.TimeField(
+        widget=forms.TimeInput(attrs={"class": INPUT_CLASS, "type": "time", "step": 1800})
+    )
+    hours = forms.TypedChoiceField(
+        choices=HOURS_CHOICES,
+        coerce=int,
+        initial=1,
+        label="Duration",
+        widget=forms.Select(attrs={"class": "select select-bordered w-full"}),
+    )
+    start_date = forms.DateField(
+        label="First week", widget=forms.DateInput(attrs={"class": INPUT_CLASS, "type": "date"})
+    )
+    end_date = forms.DateField(
+        label="Last week", widget=forms.DateInput(attrs={"class": INPUT_CLASS, "type": "date"})
+    )
+
+    field_order = ["surface", "weekday", "start_time", "hours", "start_date", "end_date"]
+
+    def __init__(self, *args, **kwargs):
+        self.facility = kwargs.pop("facility")
+        super().__init__(*args, **kwargs)
+        self.fields["surface"].queryset = self.facility.ice_surfaces.all()
+
+    def clean(self):
+        data = super().clean()
+        tz = facility_tz(self.facility)
+        start, end = data.get("start_date"), data.get("end_date")
+        weekday, start_time = data.get("weekday"), data.get("start_time")
+        if start and start < timezone.localdate(timezone=tz):
+            self.add_error("start_date", "Choose a date from today on.")
+        elif start and weekday is not None and start_time:
+            first = start + timedelta(days=(weekday - start.weekday()) % 7)
+            if local_instant(first, start_time, tz) <= timezone.now():
+                self.add_error("start_date", "The first week has already started; start later.")
+        if start and end:
+            if end < start:
+                self.add_error("end_date", "Last week must be on or after the first week.")
+            elif (end - start).days > self.MAX_WEEKS * 7:
+                self.add_error("end_date", f"Book at most {self.MAX_WEEKS} weeks at a time.")
+        surface, hours = data.get("surface"), data.get("hours")
+        if surface and weekday is not None and start_time and hours:
+            self._check_hours(surface, weekday, start_time, hours)
+        return data
+
+    def _check_hours(self, surface, weekday, start_time, hours):
+        """The series must fit the surface's opening hours and line up with its hourly slots."""
+        opening = surface.hours_of_operation.filter(weekday=weekday).first()
+        if not opening:
+            self.add_error("weekday", f"{surface.name} is closed on that day.")
+            return
+        day = date(2000, 1, 1)
+        start = datetime.combine(day, start_time)
+        open_dt = datetime.combine(day, opening.open_time)
+        close_dt = datetime.combine(day, opening.close_time)
+        if start < open_dt or start + timedelta(hours=hours) > close_dt:
+            self.add_error(
+                "start_time",
+                f"Open {opening.open_time:%H:%M}–{opening.close_time:%H:%M} on that day.",
+            )
+        elif (start - open_dt) % timedelta(hours=1):
+            self.add_error("start_time", f"Slots start on the hour from {opening.open_time:%H:%M}.")
+
+
+class WaitlistForm(forms.Form):
+    """Wait for a slot on one day within a time window."""
+
+    date = forms.DateField(widget=forms.DateInput(attrs={"class": INPUT_CLASS, "type": "date"}))
+    time_from = forms.TimeField(
+        label="From", widget=forms.TimeInput(attrs={"class": INPUT_CLASS, "type": "time"})
+    )
+    time_to = forms.TimeField(
+        label="To", widget=forms.TimeInput(attrs={"class": INPUT_CLASS, "type": "time"})
+    )
+
+    def clean(self):
+        data = super().clean()
+        day, time_from, time_to = data.get("date"), data.get("time_from"), data.get("time_to")
+        if day and day < timezone.now().date():
+            self.add_error("date", "Choose a date from today on.")
+        if time_from and time_to and time_to <= time_from:
+            self.add_error("time_to", "The window must end after it starts.")
+        return data
@@ -0,0 +1,77 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from bookings.cache import bump
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the customer search page against the configured database, reconnecting on "
+        "every request versus keeping the connection open (CONN_MAX_AGE)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Requests per mode (default 200).",
+        )
+        parser.add_argument(
+            "--warm-cache",
+            action="store_true",
+            help="Let the search page be served from cache (default: measure the DB path).",
+        )
+
+    def handle(self, *args, **options):
+        db = connections["default"]
+        configured = db.settings_dict.get("CONN_MAX_AGE", 0)
+        if db.settings_dict.get("OPTIONS", {}).get("pool"):
+            modes = [("pool", 0)]
+        else:
+            modes = [("reconnect", 0), ("persistent", configured or 60)]
+        results = {}
+        try:
+            for label, max_age in modes:
+                db.close()
+                db.settings_dict["CONN_MAX_AGE"] = max_age
+                results[label] = self._run(options["requests"], options["warm_cache"])
+        finally:
+            db.close()
+            db.settings_dict["CONN_MAX_AGE"] = configured
+
+        for label, timings in results.items():
+            self.stdout.write(
+                f"{label:>10}: mean {statistics.fmean(timings):.2f} ms, "
+                f"p50 {statistics.median(timings):.2f} ms, "
+                f"p95 {statistics.quantiles(timings, n=20)[-1]:.2f} ms"
+            )
+        if "reconnect" in results:
+            saved = statistics.fmean(results["reconnect"]) - statistics.fmean(results["persistent"])
+            self.stdout.write(self.style.SUCCESS(f"Persistent connections save {saved:.2f} ms/req"))
+
+    def _run(self, count, warm_cache):
+        client = Client()
+        url = reverse("customers:search")
+        timings = []
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            client.get(url)
+            close_old_connections()
+            for _ in range(count):
+                if not warm_cache:
+                    bump("facilities")
+                started = time.perf_counter()
+                response = client.get(url)
+                # The test client keeps connections open; close them as a server would
+                # at the end of each request (honouring CONN_MAX_AGE).
+                close_old_connections()
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise RuntimeError(f"search returned {response.status_code}")
+        return timings
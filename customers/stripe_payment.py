@@ -1,9 +1,14 @@
-"""Stripe PaymentIntent for customer bookings."""
+"""
+Stripe PaymentIntent for customer bookings.
+
+The stripe SDK takes ~0.1 s to import, so it is imported where it is used rather than
+by every worker, command and test run that imports the views. The API key is passed
+with each request instead of being set on the module.
+"""
 
-import stripe
 from django.conf import settings
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from core.metrics import PAYMENT_INTENT_SECONDS, REFUNDS
 
 
 def create_booking_payment_intent(amount_cents, facility, booking_ids, metadata=None):
@@ -19,7 +24,10 @@ def create_booking_payment_intent(amount_cents, facility, booking_ids, metadata=
     }
     if facility.stripe_account_id:
         params["transfer_data"] = {"destination": facility.stripe_account_id}
-    pi = stripe.PaymentIntent.create(**params)
+    import stripe
+
+    with PAYMENT_INTENT_SECONDS.time(outcome="ok"):
+        pi = stripe.PaymentIntent.create(api_key=settings.STRIPE_SECRET_KEY, **params)
     return {"client_secret": pi.client_secret, "payment_intent_id": pi.id}
 
 
@@ -30,11 +38,16 @@ def refund_booking(booking):
     amount_cents = int(booking.amount_paid * 100) if booking.amount_paid else 0
     if amount_cents <= 0:
         return None
+    import stripe
+
     try:
         refund = stripe.Refund.create(
+            api_key=settings.STRIPE_SECRET_KEY,
             payment_intent=booking.stripe_payment_intent_id,
             amount=amount_cents,
         )
+        REFUNDS.inc(outcome="ok")
         return refund.id
     except Exception:
+        REFUNDS.inc(outcome="error")
         return None
@@ -1,34 +1,50 @@
 """Stripe webhook handler: mark bookings paid on payment_intent.succeeded."""
 
-import stripe
 from django.conf import settings
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
-from bookings.models import Booking
+from bookings.models import Booking, Slot
+from bookings.rollups import refresh_rollups_for_slots
+from core.metrics import WEBHOOK_EVENTS, WEBHOOK_SECONDS
 
 
 @require_POST
 @csrf_exempt
 def stripe_webhook(request):
     """Handle Stripe webhooks. Verify signature and update Booking payment status."""
+    with WEBHOOK_SECONDS.time() as labels:
+        response, event_type, outcome = _handle_webhook(request)
+        labels["outcome"] = outcome
+    WEBHOOK_EVENTS.inc(type=event_type, outcome=outcome)
+    return response
+
+
+def _handle_webhook(request):
+    """Returns (response, event type, outcome) for metrics."""
+    import stripe  # imported on use (see customers.stripe_payment)
+
     payload = request.body
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE", "")
     webhook_secret = settings.STRIPE_WEBHOOK_SECRET
     if not webhook_secret:
-        return HttpResponse("Webhook secret not configured", status=500)
+        return HttpResponse("Webhook secret not configured", status=500), "", "unconfigured"
     try:
         event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
     except ValueError:
-        return HttpResponse("Invalid payload", status=400)
+        return HttpResponse("Invalid payload", status=400), "", "invalid"
     except stripe.SignatureVerificationError:
-        return HttpResponse("Invalid signature", status=400)
+        return HttpResponse("Invalid signature", status=400), "", "invalid"
 
     if event["type"] == "payment_intent.succeeded":
         pi = event["data"]["object"]
-        pi_id = pi.get("id")
+        # StripeObject is no longer a dict in stripe 15+; attribute access works in all versions.
+        pi_id = getattr(pi, "id", None)
         if pi_id:
             Booking.objects.filter(stripe_payment_intent_id=pi_id).update(payment_status="paid")
+            # .update() skips model signals; refresh the dashboard rollups explicitly.
+            refresh_rollups_for_slots(Slot.objects.filter(booking__stripe_payment_intent_id=pi_id))
+        return HttpResponse(status=200), event["type"], "processed"
 
-    return HttpResponse(status=200)
+    return HttpResponse(status=200), event["type"], "ignored"
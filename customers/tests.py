@@ -1,12 +1,24 @@
-from datetime import timedelta
+import asyncio
+import hashlib
+import hmac
+import json
+import time as time_module
+from datetime import datetime, time, timedelta
 from decimal import Decimal
+from zoneinfo import ZoneInfo
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core import mail
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
-from bookings.models import Booking, Facility, IceSurface, Slot
+from bookings.events import log_event
+from bookings.models import Booking, Facility, HoursOfOperation, IceSurface, PricingRule, Slot
+from bookings.services import generate_slots_for_surface
+from core.testing import QueryBudgetMixin, shared_cache
+from customers.forms import RecurringBookingForm
 
 User = get_user_model()
 
@@ -27,6 +39,17 @@ class SearchTests(TestCase):
         self.assertContains(response, "Rink One")
         self.assertContains(response, "Rink Two")
 
+    def test_search_filters_by_every_checked_amenity(self):
+        Facility.objects.create(name="Full Rink", parking=True, change_rooms=True)
+        Facility.objects.create(name="Lot Rink", parking=True)
+        response = self.client.get(
+            reverse("customers:search"), {"amenity": ["parking", "change_rooms", "bogus"]}
+        )
+        self.assertEqual([f.name for f, _ in response.context["facility_list"]], ["Full Rink"])
+        self.assertContains(
+            response, 'value="change_rooms" class="checkbox checkbox-primary checkbox-xs" checked'
+        )
+
 
 class BookingFlowTests(TestCase):
     def setUp(self):
@@ -80,6 +103,23 @@ class BookingFlowTests(TestCase):
         self.slot.refresh_from_db()
         self.assertEqual(self.slot.state, "booked")
 
+    def test_book_charges_lead_time_price(self):
+        PricingRule.objects.create(
+            ice_surface=self.surface,
+            name="Last minute",
+            lead_time_hours=48,
+            adjustment="fixed",
+            amount=Decimal("40"),
+        )
+        self.client.login(username="booker", password="pass")
+        response = self.client.get(reverse("customers:book") + f"?slot={self.slot.pk}")
+        self.assertContains(response, "Total: $40")
+        self.client.post(
+            reverse("customers:book") + f"?slot={self.slot.pk}",
+            {"organization_name": "Team", "sport": "hockey", "payment_method": "pay_later"},
+        )
+        self.assertEqual(Booking.objects.get(slot=self.slot).amount_paid, Decimal("40"))
+
     def test_book_without_slot_redirects_to_search(self):
         """GET or POST to book with no slot redirects to search."""
         self.client.login(username="booker", password="pass")
@@ -103,3 +143,462 @@ class BookingFlowTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "No valid available slots")
         self.assertFalse(Booking.objects.filter(slot=self.slot).exists())
+
+
+class ActivityViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="u", password="pass", email="u@example.com")
+        facility = Facility.objects.create(name="F", timezone="UTC")
+        surface = IceSurface.objects.create(facility=facility, name="A")
+        start = timezone.now() + timedelta(days=1)
+        self.slots = [
+            Slot.objects.create(
+                ice_surface=surface,
+                start=start + timedelta(hours=n),
+                end=start + timedelta(hours=n + 1),
+                rate=Decimal("50"),
+            )
+            for n in range(2)
+        ]
+        self.client.force_login(self.user)
+
+    def test_booking_history_includes_its_group_event(self):
+        self.client.post(
+            reverse("customers:book") + "?" + "&".join(f"slot={s.pk}" for s in self.slots),
+            {"slot": [s.pk for s in self.slots], "sport": "hockey", "payment_method": "pay_later"},
+        )
+        second = Booking.objects.get(slot=self.slots[1])
+        response = self.client.get(reverse("customers:booking_activity", args=[second.pk]))
+        self.assertContains(response, "Booking created.")
+        self.assertContains(response, "(2 bookings)")
+        self.assertContains(self.client.get(reverse("customers:activity")), "(2 bookings)")
+
+    def test_other_customers_booking_is_not_found(self):
+        other = User.objects.create_user(username="o", password="pass")
+        booking = Booking.objects.create(slot=self.slots[0], user=other)
+        response = self.client.get(reverse("customers:booking_activity", args=[booking.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class WaitlistViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="w", password="pass", email="w@example.com")
+        self.facility = Facility.objects.create(name="F", timezone="UTC")
+        self.surface = IceSurface.objects.create(facility=self.facility, name="A")
+        self.day = timezone.now().date() + timedelta(days=2)
+        self.url = reverse(
+            "customers:waitlist_join",
+            kwargs={"facility_pk": self.facility.pk, "surface_pk": self.surface.pk},
+        )
+        self.client.force_login(self.user)
+
+    def test_join_list_and_leave(self):
+        response = self.client.post(
+            self.url, {"date": self.day.isoformat(), "time_from": "18:00", "time_to": "21:00"}
+        )
+        self.assertRedirects(
+            response,
+            reverse("customers:facility_detail", args=[self.facility.pk])
+            + f"?surface={self.surface.pk}&date={self.day.isoformat()}",
+            fetch_redirect_response=False,
+        )
+        entry = self.user.waitlist_entries.get()
+        self.assertEqual(entry.window_end - entry.window_start, timedelta(hours=3))
+        self.assertContains(self.client.get(reverse("customers:my_bookings")), "Waiting")
+        self.client.post(reverse("customers:waitlist_leave", args=[entry.pk]))
+        self.assertFalse(self.user.waitlist_entries.exists())
+
+    def test_window_must_end_after_it_starts(self):
+        self.client.post(
+            self.url, {"date": self.day.isoformat(), "time_from": "18:00", "time_to": "17:00"}
+        )
+        self.assertFalse(self.user.waitlist_entries.exists())
+
+
+class RecurringBookingViewTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="league", password="pass", email="l@example.com"
+        )
+        manager = User.objects.create_user(username="mgr", password="pass", email="m@example.com")
+        self.facility = Facility.objects.create(name="F", timezone="UTC")
+        self.facility.managers.add(manager)
+        self.surface = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("60")
+        )
+        self.first = timezone.now().date() + timedelta(days=2)
+        HoursOfOperation.objects.create(
+            ice_surface=self.surface,
+            weekday=self.first.weekday(),
+            open_time=time(6),
+            close_time=time(22),
+        )
+        self.client.login(username="league", password="pass")
+
+    def post(self, **extra):
+        data = {
+            "surface": self.surface.pk,
+            "weekday": self.first.weekday(),
+            "start_time": "20:00",
+            "hours": "1",
+            "start_date": self.first.isoformat(),
+            "end_date": (self.first + timedelta(weeks=3)).isoformat(),
+            "organization_name": "Beer League",
+            "sport": "hockey",
+            "payment_method": "pay_later",
+        }
+        data.update(extra)
+        return self.client.post(
+            reverse("customers:book_recurring", kwargs={"pk": self.facility.pk}), data
+        )
+
+    def test_recurring_booking_books_each_week_with_one_email(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post()
+        self.assertRedirects(
+            response, reverse("customers:my_bookings"), fetch_redirect_response=False
+        )
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_outside_opening_hours_rejected(self):
+        response = self.post(start_time="22:00")
+        self.assertContains(response, "Open 06:00–22:00 on that day.")
+        self.assertFalse(Booking.objects.exists())
+
+    def test_start_is_checked_against_facility_local_now(self):
+        # A zone where it is around noon now, so 06:00 today has passed and 20:00 has not.
+        offset = 12 - timezone.now().hour
+        self.facility.timezone = f"Etc/GMT{-offset:+d}"
+        today = timezone.localdate(timezone=ZoneInfo(self.facility.timezone))
+
+        def start_errors(day, start_time):
+            data = {"weekday": day.weekday(), "start_time": start_time, "start_date": day}
+            form = RecurringBookingForm(data, facility=self.facility)
+            return form.errors.get("start_date")
+
+        self.assertEqual(
+            start_errors(today - timedelta(days=1), "20:00"), ["Choose a date from today on."]
+        )
+        self.assertEqual(
+            start_errors(today, "06:00"), ["The first week has already started; start later."]
+        )
+        self.assertIsNone(start_errors(today, "20:00"))
+
+
+class AsyncReadPathTests(TestCase):
+    def setUp(self):
+        self.facility = Facility.objects.create(name="Async Rink", timezone="UTC")
+        self.surface = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("80")
+        )
+        self.day = timezone.now().date() + timedelta(days=1)
+        HoursOfOperation.objects.create(
+            ice_surface=self.surface,
+            weekday=self.day.weekday(),
+            open_time=time(7),
+            close_time=time(9),
+        )
+
+    async def test_availability_json_generates_and_lists_slots(self):
+        url = reverse(
+            "customers:availability_json",
+            kwargs={"facility_pk": self.facility.pk, "surface_pk": self.surface.pk},
+        )
+        response = await self.async_client.get(url, {"date": self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["available"], 2)
+        self.assertEqual([s["rate"] for s in data["slots"]], ["80.00", "80.00"])
+        response = await self.async_client.get(url, {"date": "tomorrow"})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_facility_detail_renders_grid_under_async_client(self):
+        response = await self.async_client.get(
+            reverse("customers:facility_detail", kwargs={"pk": self.facility.pk}),
+            {"surface": self.surface.pk, "date": self.day.isoformat()},
+        )
+        self.assertContains(response, "Async Rink")
+        self.assertEqual(len(response.context["all_slots"]), 2)
+        response = await self.async_client.get(
+            reverse("customers:facility_detail", kwargs={"pk": self.facility.pk + 999})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class AvailabilityBatchTests(TestCase):
+    def setUp(self):
+        self.facility = Facility.objects.create(name="Batch Rink", timezone="UTC")
+        self.a = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("80")
+        )
+        self.b = IceSurface.objects.create(
+            facility=self.facility, name="B", default_rate=Decimal("95")
+        )
+        self.day = timezone.now().date() + timedelta(days=1)
+        for surface in (self.a, self.b):
+            HoursOfOperation.objects.create(
+                ice_surface=surface,
+                weekday=self.day.weekday(),
+                open_time=time(7),
+                close_time=time(11),
+            )
+        self.url = reverse("customers:availability_batch", kwargs={"facility_pk": self.facility.pk})
+        self.params = {
+            "start": self.day.isoformat(),
+            "end": (self.day + timedelta(days=1)).isoformat(),
+        }
+
+    def test_encodes_states_gaps_and_rates_per_surface_and_day(self):
+        self.client.get(self.url, self.params)
+        slots = list(Slot.objects.filter(ice_surface=self.a).order_by("start"))
+        slots[1].state = "booked"
+        slots[1].rate = Decimal("120")
+        slots[1].save()
+        slots[2].delete()
+        data = self.client.get(self.url, self.params).json()
+        day, next_day = self.day.isoformat(), (self.day + timedelta(days=1)).isoformat()
+        self.assertEqual(
+            data["surfaces"][str(self.a.pk)][day],
+            {
+                "first": "07:00",
+                "states": "AB-A",
+                "rates": [["80.00", 1], ["120.00", 1], ["80.00", 1]],
+            },
+        )
+        self.assertEqual(data["surfaces"][str(self.b.pk)][day]["states"], "AAAA")
+        self.assertIsNone(data["surfaces"][str(self.a.pk)][next_day])
+        self.assertEqual(data["states"]["B"], "booked")
+
+        only_b = self.client.get(self.url, {**self.params, "surface": self.b.pk}).json()
+        self.assertEqual(list(only_b["surfaces"]), [str(self.b.pk)])
+        for bad in ({"start": "soon"}, {"surface": 999_999}, {**self.params, "end": "2000-01-01"}):
+            self.assertEqual(self.client.get(self.url, bad).status_code, 400)
+
+    def test_etag_answers_304_until_a_slot_changes(self):
+        # Per-process cache versions can't vouch for other workers: the rows are tagged.
+        response = self.client.get(self.url, self.params)
+        etag = response["ETag"]
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # A slot changed behind this process's cache, e.g. through another worker.
+        Slot.objects.filter(ice_surface=self.a).update(state="blocked")
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_shared_cache_etag_answers_304_without_a_query(self):
+        with shared_cache():
+            etag = self.client.get(self.url, self.params)["ETag"]
+            with self.assertNumQueries(0):
+                response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+            slot = Slot.objects.filter(ice_surface=self.b).first()
+            slot.state = "blocked"
+            slot.save()
+            response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+            self.assertIn(
+                "X", response.json()["surfaces"][str(self.b.pk)][self.day.isoformat()]["states"]
+            )
+
+
+class LiveSlotTests(TestCase):
+    def setUp(self):
+        self.facility = Facility.objects.create(name="Live Rink", timezone="UTC")
+        self.surface = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("80")
+        )
+        self.day = timezone.now().date() + timedelta(days=1)
+        HoursOfOperation.objects.create(
+            ice_surface=self.surface,
+            weekday=self.day.weekday(),
+            open_time=time(7),
+            close_time=time(9),
+        )
+        generate_slots_for_surface(self.surface, self.day, self.day)
+        self.slot = Slot.objects.filter(ice_surface=self.surface).order_by("start").first()
+        self.url = reverse(
+            "customers:live_slots",
+            kwargs={"facility_pk": self.facility.pk, "surface_pk": self.surface.pk},
+        )
+
+    async def open_stream(self):
+        response = await self.async_client.get(self.url, {"date": self.day.isoformat()})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+        return stream
+
+    @override_settings(LIVE_SLOTS_POLL_SECONDS=0)
+    async def test_publish_pushes_the_changed_cell(self):
+        stream = await self.open_stream()
+
+        def book():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.slot.state = "booked"
+                self.slot.save(update_fields=["state"])
+
+        await sync_to_async(book)()
+        event = (await asyncio.wait_for(anext(stream), 5)).decode()
+        await stream.aclose()
+        self.assertTrue(event.startswith(f"event: slot-{self.slot.pk}\n"))
+        self.assertIn("Booked", event)
+        self.assertNotIn('name="slot"', event)
+
+    @override_settings(LIVE_SLOTS_POLL_SECONDS=0.05)
+    async def test_poll_picks_up_changes_without_a_publish(self):
+        stream = await self.open_stream()
+        # A queryset update from another worker: no signal, no in-process publish.
+        await Slot.objects.filter(pk=self.slot.pk).aupdate(state="blocked")
+        event = (await asyncio.wait_for(anext(stream), 5)).decode()
+        await stream.aclose()
+        self.assertTrue(event.startswith(f"event: slot-{self.slot.pk}\n"))
+        self.assertIn("Blocked", event)
+
+    def test_wsgi_answers_no_content(self):
+        response = self.client.get(self.url, {"date": self.day.isoformat()})
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get(self.url, {"date": "tomorrow"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Hot customer views cost the same number of queries at every data size."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="q", password="pass", email="q@example.com")
+        self.day = timezone.now().date() + timedelta(days=1)
+
+    def _rink(self, name, surfaces=1):
+        manager = User.objects.create_user(username=f"{name}-mgr", email=f"{name}@example.com")
+        facility = Facility.objects.create(
+            name=name, timezone="UTC", latitude=Decimal("43.6"), longitude=Decimal("-79.4")
+        )
+        facility.managers.add(manager)
+        for n in range(surfaces):
+            surface = IceSurface.objects.create(
+                facility=facility, name=f"Pad {n}", default_rate=Decimal("100")
+            )
+            for weekday in range(7):
+                HoursOfOperation.objects.create(
+                    ice_surface=surface, weekday=weekday, open_time=time(6), close_time=time(22)
+                )
+        return facility
+
+    def _slots(self, surface, count, booked=0):
+        start = timezone.make_aware(datetime.combine(self.day, time(6)))
+        slots = []
+        for n in range(count):
+            slot = Slot.objects.create(
+                ice_surface=surface,
+                start=start + timedelta(hours=n),
+                end=start + timedelta(hours=n + 1),
+                rate=Decimal("100"),
+            )
+            if n < booked:
+                Booking.objects.create(
+                    slot=slot,
+                    user=self.user,
+                    amount_paid=slot.rate,
+                    stripe_payment_intent_id="pi_q",
+                )
+                slot.state = "booked"
+                slot.save()
+            slots.append(slot)
+        return slots
+
+    def _get(self, url, **params):
+        def run(_):
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+
+        return run
+
+    def test_search(self):
+        def seed(size):
+            for n in range(size):
+                self._rink(f"rink{n}", surfaces=2)
+
+        url = reverse("customers:search")
+        self.assertConstantQueries(seed, self._get(url), budget=3)
+        self.assertConstantQueries(seed, self._get(url, lat="43.7", lng="-79.4"), budget=3)
+
+    def test_facility_detail(self):
+        def seed(size):
+            facility = self._rink("rink", surfaces=size)
+            surface = facility.ice_surfaces.first()
+            self._slots(surface, 16, booked=size)
+            return facility, surface
+
+        def run(data):
+            facility, surface = data
+            url = reverse("customers:facility_detail", args=[facility.pk])
+            params = {"surface": surface.pk, "date": self.day.isoformat()}
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+
+        self.assertConstantQueries(seed, run, budget=5)
+
+    def test_my_bookings(self):
+        def seed(size):
+            for n in range(size):
+                self._slots(self._rink(f"rink{n}").ice_surfaces.get(), 2, booked=2)
+            self.client.force_login(self.user)
+
+        self.assertConstantQueries(seed, self._get(reverse("customers:my_bookings")), budget=8)
+
+    def test_activity(self):
+        def seed(size):
+            for n in range(size):
+                for slot in self._slots(self._rink(f"rink{n}").ice_surfaces.get(), 2, booked=2):
+                    log_event(slot.booking, "created", "Booking created.")
+            self.client.force_login(self.user)
+
+        self.assertConstantQueries(seed, self._get(reverse("customers:activity")), budget=7)
+
+    def test_book(self):
+        def seed(size):
+            slots = self._slots(self._rink("rink").ice_surfaces.get(), size)
+            self.client.force_login(self.user)
+            return [s.pk for s in slots]
+
+        def run(slot_ids):
+            response = self.client.post(
+                reverse("customers:book") + "?" + "&".join(f"slot={pk}" for pk in slot_ids),
+                {"slot": slot_ids, "sport": "hockey", "payment_method": "pay_later"},
+            )
+            self.assertRedirects(response, reverse("customers:my_bookings"))
+
+        self.assertConstantQueries(seed, run, budget=23)
+
+    def test_stripe_webhook(self):
+        payload = json.dumps(
+            {
+                "id": "evt_q",
+                "object": "event",
+                "type": "payment_intent.succeeded",
+                "data": {"object": {"id": "pi_q", "object": "payment_intent"}},
+            }
+        )
+        stamp = int(time_module.time())
+        signature = hmac.new(
+            b"whsec_test", f"{stamp}.{payload}".encode(), hashlib.sha256
+        ).hexdigest()
+
+        def seed(size):
+            self._slots(self._rink("rink").ice_surfaces.get(), size, booked=size)
+
+        def run(_):
+            response = self.client.post(
+                reverse("customers:stripe_webhook"),
+                payload,
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=f"t={stamp},v1={signature}",
+            )
+            self.assertEqual(response.status_code, 200)
+
+        self.assertConstantQueries(seed, run, budget=6)
+        self.assertEqual(Booking.objects.filter(payment_status="paid").count(), 0)
@@ -8,13 +8,37 @@ urlpatterns = [
     path("", views.search, name="search"),
     path("payment/", views.payment, name="payment"),
     path("my-bookings/", views.my_bookings, name="my_bookings"),
+    path("activity/", views.activity, name="activity"),
     path("facility/<int:pk>/", views.facility_detail, name="facility_detail"),
     path(
         "facility/<int:facility_pk>/surface/<int:surface_pk>/",
         views.availability,
         name="availability",
     ),
+    path(
+        "facility/<int:facility_pk>/availability.json",
+        views.availability_batch,
+        name="availability_batch",
+    ),
+    path(
+        "facility/<int:facility_pk>/surface/<int:surface_pk>/availability.json",
+        views.availability_json,
+        name="availability_json",
+    ),
+    path(
+        "facility/<int:facility_pk>/surface/<int:surface_pk>/live/",
+        views.live_slots,
+        name="live_slots",
+    ),
+    path(
+        "facility/<int:facility_pk>/surface/<int:surface_pk>/waitlist/",
+        views.waitlist_join,
+        name="waitlist_join",
+    ),
+    path("waitlist/<int:pk>/leave/", views.waitlist_leave, name="waitlist_leave"),
     path("book/", views.book, name="book"),
+    path("facility/<int:pk>/recurring/", views.book_recurring, name="book_recurring"),
+    path("booking/<int:booking_pk>/activity/", views.booking_activity, name="booking_activity"),
     path("booking/<int:booking_pk>/cancel/", views.booking_cancel, name="booking_cancel"),
     path("stripe/webhook/", stripe_webhooks.stripe_webhook, name="stripe_webhook"),
 ]
@@ -1,23 +1,63 @@
 import logging
 import math
-from datetime import datetime
+from datetime import datetime, timedelta
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag, urlencode
 from django.views.decorators.http import require_http_methods
 
-from bookings.models import Booking, Facility, IceSurface, Slot
-from bookings.notifications import notify_booking_cancelled_by_customer, notify_booking_created
+from bookings.availability import (
+    BATCH_DAYS,
+    MAX_DAYS,
+    STATE_CODES,
+    aavailability_rows,
+    availability_scopes,
+    encode_availability,
+    rows_tag,
+)
+from bookings.cache import (
+    aget_facility,
+    aget_search_facilities,
+    aget_slot_grid,
+    aversion_tag,
+    get_surfaces,
+    versions_shared,
+)
+from bookings.events import booking_events, customer_events, feed_page
+from bookings.facility_calendar import day_bounds, facility_tz
+from bookings.live import event_stream, slot_events
+from bookings.models import (
+    AMENITY_BITS,
+    Booking,
+    Facility,
+    IceSurface,
+    Slot,
+    WaitlistEntry,
+    amenity_mask,
+)
+from bookings.notifications import notify_booking_cancelled_by_customer
+from bookings.pricing import quote_slots
 from bookings.services import (
+    book_recurring_slots,
+    book_slots,
     can_cancel_booking,
-    get_all_slots_for_date,
+    ensure_slots_for_range,
+    recurring_starts,
     release_slot,
 )
-from customers.forms import BookingForm
+from bookings.waitlist import join_waitlist, upcoming_entries
+from core.db_router import replica_reads
+from core.metrics import BOOK_SECONDS, BOOKINGS_CREATED, SEARCH_SECONDS
+from customers.forms import BookingForm, RecurringBookingForm, WaitlistForm
 from customers.stripe_payment import create_booking_payment_intent, refund_booking
 
 
@@ -30,8 +70,10 @@ def _approx_km(lat1, lng1, lat2, lng2):
     return R * math.sqrt(dlat * dlat + x * x)
 
 
-def search(request):
-    """List facilities; optional sort by distance if lat/lng provided."""
+@replica_reads
+@SEARCH_SECONDS.time()
+async def search(request):
+    """List facilities, optionally only those with every ?amenity=; sorted by distance if lat/lng given."""
     try:
         lat = float(request.GET.get("lat")) if request.GET.get("lat") is not None else None
     except (ValueError, TypeError):
@@ -40,9 +82,10 @@ def search(request):
         lng = float(request.GET.get("lng")) if request.GET.get("lng") is not None else None
     except (ValueError, TypeError):
         lng = None
-    facilities = Facility.objects.prefetch_related(
-        "ice_surfaces", "ice_surfaces__hours_of_operation"
-    ).all()
+    facilities = await aget_search_facilities()
+    amenities = [a for a in request.GET.getlist("amenity") if a in AMENITY_BITS]
+    if wanted := amenity_mask(amenities):
+        facilities = [f for f in facilities if f.has_amenities(wanted)]
 
     facility_list = []
     if lat is not None and lng is not None:
@@ -61,17 +104,35 @@ def search(request):
     else:
         facility_list = [(f, None) for f in facilities]
 
-    return render(
+    # Templates may touch the session/user lazily (context processors), so render in a thread.
+    return await sync_to_async(render)(
         request,
         "customers/search.html",
-        {"facility_list": facility_list, "lat": lat, "lng": lng},
+        {
+            "facility_list": facility_list,
+            "lat": lat,
+            "lng": lng,
+            "amenity_choices": [
+                (name, label, name in amenities) for name, label in Facility.AMENITY_FIELDS
+            ],
+        },
     )
 
 
-def facility_detail(request, pk):
+def _find_surface(surfaces, surface_id):
+    surface = next((s for s in surfaces if s.pk == surface_id), None)
+    if surface is None:
+        raise Http404("No IceSurface matches the given query.")
+    return surface
+
+
+@replica_reads
+async def facility_detail(request, pk):
     """Show facility: surface dropdown + date, then grid of slots (available clickable, taken shown)."""
-    facility = get_object_or_404(Facility, pk=pk)
-    surfaces = facility.ice_surfaces.all()
+    facility = await aget_facility(pk)
+    if facility is None:
+        raise Http404("No Facility matches the given query.")
+    surfaces = get_surfaces(facility)
     today = timezone.now().date()
     min_date = today.isoformat()
     surface_id_raw = request.GET.get("surface")
@@ -82,13 +143,13 @@ def facility_detail(request, pk):
     if surface_id_raw and date_str:
         try:
             surface_id = int(surface_id_raw)
-            surface = get_object_or_404(IceSurface, pk=surface_id, facility=facility)
+            surface = _find_surface(surfaces, surface_id)
             day = datetime.strptime(date_str, "%Y-%m-%d").date()
-            all_slots = get_all_slots_for_date(surface, day)
+            all_slots = await aget_slot_grid(surface, day)
         except (ValueError, TypeError):
             pass
 
-    return render(
+    return await sync_to_async(render)(
         request,
         "customers/facility_detail.html",
         {
@@ -102,6 +163,131 @@ def facility_detail(request, pk):
     )
 
 
+@replica_reads
+async def availability_json(request, facility_pk, surface_pk):
+    """Slots of one surface on one day as JSON (?date=YYYY-MM-DD), from the slot grid cache."""
+    facility = await aget_facility(facility_pk)
+    if facility is None:
+        raise Http404("No Facility matches the given query.")
+    surface = _find_surface(get_surfaces(facility), surface_pk)
+    try:
+        day = datetime.strptime(request.GET.get("date", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return JsonResponse({"error": "date must be YYYY-MM-DD"}, status=400)
+    slots = await aget_slot_grid(surface, day)
+    return JsonResponse(
+        {
+            "facility": facility.pk,
+            "surface": surface.pk,
+            "date": day.isoformat(),
+            "timezone": facility.timezone,
+            "available": sum(1 for s in slots if s.state == "available"),
+            "slots": [
+                {
+                    "id": s.pk,
+                    "start": s.start.isoformat(),
+                    "end": s.end.isoformat(),
+                    "rate": str(s.rate),
+                    "state": s.state,
+                }
+                for s in slots
+            ],
+        }
+    )
+
+
+def _batch_params(request, facility):
+    """(surfaces, first_day, last_day) from ?surface=&start=&end=; ValueError if invalid."""
+    surfaces = get_surfaces(facility)
+    try:
+        wanted = {int(pk) for pk in request.GET.getlist("surface")}
+        start, end = request.GET.get("start"), request.GET.get("end")
+        first_day = (
+            datetime.strptime(start, "%Y-%m-%d").date()
+            if start
+            else timezone.localdate(timezone=facility_tz(facility))
+        )
+        last_day = (
+            datetime.strptime(end, "%Y-%m-%d").date()
+            if end
+            else first_day + timedelta(days=BATCH_DAYS - 1)
+        )
+    except ValueError:
+        raise ValueError("surface must be an id, start and end YYYY-MM-DD") from None
+    if not 0 <= (last_day - first_day).days < MAX_DAYS:
+        raise ValueError(f"end must be on or after start and at most {MAX_DAYS} days in")
+    if wanted - {s.pk for s in surfaces}:
+        raise ValueError("unknown surface")
+    return [s for s in surfaces if not wanted or s.pk in wanted], first_day, last_day
+
+
+@replica_reads
+async def availability_batch(request, facility_pk):
+    """
+    Compact availability of many surfaces over a date range as JSON (see
+    bookings/availability.py). ?surface= repeats (default: all), ?start=/?end= are
+    facility-local dates (default: today and BATCH_DAYS on). With a shared cache the
+    ETag comes from the cache versions alone, so a matching If-None-Match is answered
+    without a query; otherwise it is a hash of the slot rows.
+    """
+    facility = await aget_facility(facility_pk)
+    if facility is None:
+        raise Http404("No Facility matches the given query.")
+    try:
+        surfaces, first_day, last_day = _batch_params(request, facility)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    scopes = availability_scopes(facility, surfaces, first_day, last_day)
+    shared = versions_shared()
+    if shared:
+        etag = quote_etag(await aversion_tag(scopes))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+    generated = await sync_to_async(ensure_slots_for_range)(surfaces, first_day, last_day)
+    rows = await aavailability_rows(facility, surfaces, first_day, last_day)
+    if not shared:
+        etag = quote_etag(rows_tag(facility, surfaces, rows))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+    elif generated:
+        # Generating missing days bumps their versions: tag what is actually served.
+        etag = quote_etag(await aversion_tag(scopes))
+    response = JsonResponse(
+        {
+            "facility": facility.pk,
+            "timezone": facility.timezone,
+            "start": first_day.isoformat(),
+            "end": last_day.isoformat(),
+            "states": {code: state for state, code in STATE_CODES.items()},
+            "surfaces": encode_availability(facility, surfaces, first_day, last_day, rows),
+        }
+    )
+    response["ETag"] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+async def live_slots(request, facility_pk, surface_pk):
+    """Server-Sent Events re-rendering each slot of the facility_detail grid that changes."""
+    facility = await aget_facility(facility_pk)
+    if facility is None:
+        raise Http404("No Facility matches the given query.")
+    surface = _find_surface(get_surfaces(facility), surface_pk)
+    try:
+        day = datetime.strptime(request.GET.get("date", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return HttpResponseBadRequest("date must be YYYY-MM-DD")
+    start, end = day_bounds(facility_tz(facility), day)
+    slots = Slot.objects.filter(ice_surface=surface, start__gte=start, start__lt=end)
+
+    def render_cell(slot):
+        return render_to_string("components/slot_cell.html", {"slot": slot})
+
+    return event_stream(request, slot_events(slots, [surface.pk], render_cell))
+
+
 def availability(request, facility_pk, surface_pk):
     """Legacy: redirect to facility_detail with surface and date in query params."""
     date_str = request.GET.get("date", "")
@@ -111,9 +297,58 @@ def availability(request, facility_pk, surface_pk):
     return redirect(url)
 
 
+def _start_payment(request, facility, bookings, total_cents, pay_now):
+    """
+    After bookings are created: start a Stripe PaymentIntent for the whole total when the
+    customer chose to pay now (and Stripe is set up), else fall back to paying at the rink.
+    """
+    stripe_secret = (getattr(settings, "STRIPE_SECRET_KEY", None) or "").strip()
+    stripe_publishable = (getattr(settings, "STRIPE_PUBLISHABLE_KEY", None) or "").strip()
+
+    if pay_now and total_cents > 0:
+        if not stripe_secret or not stripe_publishable:
+            messages.warning(
+                request,
+                "Booking confirmed. Stripe keys are not set in server config; please pay at the rink.",
+            )
+        elif not facility.stripe_account_id:
+            messages.warning(
+                request,
+                "Booking confirmed. This facility has not connected Stripe for online payments; please pay at the rink.",
+            )
+        else:
+            try:
+                result = create_booking_payment_intent(
+                    total_cents,
+                    facility,
+                    [b.pk for b in bookings],
+                    metadata={"booking_ids": ",".join(str(b.pk) for b in bookings)},
+                )
+                Booking.objects.filter(pk__in=[b.pk for b in bookings]).update(
+                    stripe_payment_intent_id=result["payment_intent_id"]
+                )
+                request.session["payment_client_secret"] = result["client_secret"]
+                request.session.modified = True
+                return redirect("customers:payment")
+            except Exception as e:
+                logging.exception("Stripe PaymentIntent failed: %s", e)
+                messages.warning(
+                    request,
+                    f"Booking confirmed. Payment could not be started ({str(e)[:80]}); please pay at the rink.",
+                )
+    elif pay_now:
+        messages.info(request, "Booking confirmed. Pay at the rink when you arrive.")
+    return redirect("customers:my_bookings")
+
+
 @login_required
 @require_http_methods(["GET", "POST"])
 def book(request):
+    with BOOK_SECONDS.time(method=request.method):
+        return _book(request)
+
+
+def _book(request):
     """Book selected slot(s): POST with slot ids, organization, sport. Creates Booking(s); payment in step 6."""
     slot_ids = request.GET.getlist("slot") or request.POST.getlist("slot")
     if not slot_ids:
@@ -142,79 +377,34 @@ def book(request):
     if request.method == "POST":
         form = BookingForm(request.POST)
         if form.is_valid():
-            slot_ids = [s.pk for s in slots]
-            slots_recheck = (
-                Slot.objects.filter(pk__in=slot_ids, state="available")
-                .select_related("ice_surface", "ice_surface__facility")
-                .order_by("start")
+            # book_slots claims the slots with a conditional UPDATE, so a slot taken since
+            # they were loaded above makes the whole booking fail rather than double-book.
+            slots = list(slots)
+            prices = quote_slots(slots)
+            bookings_created = book_slots(
+                request.user,
+                slots,
+                prices,
+                organization_name=form.cleaned_data.get("organization_name", ""),
+                sport=form.cleaned_data["sport"],
             )
-            if slots_recheck.count() != len(slot_ids):
+            if not bookings_created:
                 return render(
                     request,
                     "customers/book_error.html",
                     {"message": "One or more slots are no longer available. Please choose again."},
                 )
-            slots = list(slots_recheck)
-            total = sum(s.rate for s in slots)
-            total_cents = int(total * 100)
-            bookings_created = []
+            total_cents = int(sum(prices.values()) * 100)
             pay_now = form.cleaned_data.get("payment_method") == "pay_now"
 
-            for slot in slots:
-                booking = Booking.objects.create(
-                    slot=slot,
-                    user=request.user,
-                    organization_name=form.cleaned_data.get("organization_name", ""),
-                    sport=form.cleaned_data["sport"],
-                    amount_paid=slot.rate,
-                    payment_status="pending",
-                )
-                slot.state = "booked"
-                slot.save(update_fields=["state"])
-                bookings_created.append(booking)
-                notify_booking_created(booking)
-
-            stripe_secret = (getattr(settings, "STRIPE_SECRET_KEY", None) or "").strip()
-            stripe_publishable = (getattr(settings, "STRIPE_PUBLISHABLE_KEY", None) or "").strip()
-
-            if pay_now and total_cents > 0:
-                if not stripe_secret or not stripe_publishable:
-                    messages.warning(
-                        request,
-                        "Booking confirmed. Stripe keys are not set in server config; please pay at the rink.",
-                    )
-                elif not facility.stripe_account_id:
-                    messages.warning(
-                        request,
-                        "Booking confirmed. This facility has not connected Stripe for online payments; please pay at the rink.",
-                    )
-                else:
-                    try:
-                        result = create_booking_payment_intent(
-                            total_cents,
-                            facility,
-                            [b.pk for b in bookings_created],
-                            metadata={"booking_ids": ",".join(str(b.pk) for b in bookings_created)},
-                        )
-                        for b in bookings_created:
-                            b.stripe_payment_intent_id = result["payment_intent_id"]
-                            b.save(update_fields=["stripe_payment_intent_id"])
-                        request.session["payment_client_secret"] = result["client_secret"]
-                        request.session.modified = True
-                        return redirect("customers:payment")
-                    except Exception as e:
-                        logging.exception("Stripe PaymentIntent failed: %s", e)
-                        messages.warning(
-                            request,
-                            "Booking confirmed. Payment could not be started (%s); please pay at the rink.",
-                            str(e)[:80],
-                        )
-            elif pay_now:
-                messages.info(request, "Booking confirmed. Pay at the rink when you arrive.")
-            return redirect("customers:my_bookings")
+            BOOKINGS_CREATED.inc(len(bookings_created), kind="single")
+            return _start_payment(request, facility, bookings_created, total_cents, pay_now)
     else:
         form = BookingForm()
-    total = sum(s.rate for s in slots)
+    prices = quote_slots(slots)
+    for s in slots:
+        s.price = prices[s.pk]
+    total = sum(prices.values())
     can_pay_now = bool(
         facility.stripe_account_id
         and getattr(settings, "STRIPE_SECRET_KEY", None)
@@ -236,6 +426,46 @@ def book(request):
     )
 
 
+@login_required
+@require_http_methods(["GET", "POST"])
+def book_recurring(request, pk):
+    """Book the same hour(s) every week across a date range, all or nothing, one payment."""
+    facility = get_object_or_404(Facility, pk=pk)
+    conflicts = []
+    if request.method == "POST":
+        form = RecurringBookingForm(request.POST, facility=facility)
+        if form.is_valid():
+            data = form.cleaned_data
+            surface = data["surface"]
+            starts = recurring_starts(
+                surface,
+                data["weekday"],
+                data["start_time"],
+                data["hours"],
+                data["start_date"],
+                data["end_date"],
+            )
+            bookings, conflicts = book_recurring_slots(
+                request.user,
+                surface,
+                starts,
+                organization_name=data.get("organization_name", ""),
+                sport=data["sport"],
+            )
+            if bookings:
+                messages.success(request, f"Booked {len(bookings)} slots on {surface.name}.")
+                total_cents = int(sum(b.amount_paid for b in bookings) * 100)
+                pay_now = data.get("payment_method") == "pay_now"
+                return _start_payment(request, facility, bookings, total_cents, pay_now)
+    else:
+        form = RecurringBookingForm(facility=facility)
+    return render(
+        request,
+        "customers/book_recurring.html",
+        {"facility": facility, "form": form, "conflicts": conflicts},
+    )
+
+
 @login_required
 def payment(request):
     """Stripe payment page: confirm PaymentIntent with client_secret from session."""
@@ -257,6 +487,7 @@ def payment(request):
     )
 
 
+@replica_reads
 @login_required
 def my_bookings(request):
     """List current user's upcoming and past bookings."""
@@ -271,10 +502,64 @@ def my_bookings(request):
     return render(
         request,
         "customers/my_bookings.html",
-        {"upcoming": upcoming, "past": past},
+        {"upcoming": upcoming, "past": past, "waitlist": upcoming_entries(request.user)},
+    )
+
+
+@replica_reads
+@login_required
+def activity(request):
+    """The user's booking history, newest first, a page at a time (?before=<cursor>)."""
+    events, next_cursor = feed_page(customer_events(request.user), request.GET.get("before"))
+    return render(
+        request, "customers/activity.html", {"events": events, "next_cursor": next_cursor}
     )
 
 
+@replica_reads
+@login_required
+def booking_activity(request, booking_pk):
+    """History of one of the user's bookings, including group events it was part of."""
+    booking = get_object_or_404(
+        Booking.objects.select_related("slot__ice_surface__facility"),
+        pk=booking_pk,
+        user=request.user,
+    )
+    events, next_cursor = feed_page(booking_events(booking), request.GET.get("before"))
+    return render(
+        request,
+        "customers/activity.html",
+        {"booking": booking, "events": events, "next_cursor": next_cursor},
+    )
+
+
+@login_required
+@require_http_methods(["POST"])
+def waitlist_join(request, facility_pk, surface_pk):
+    """Join the waitlist for a surface's slots on a day within a time window."""
+    surface = get_object_or_404(
+        IceSurface.objects.select_related("facility"), pk=surface_pk, facility_id=facility_pk
+    )
+    form = WaitlistForm(request.POST)
+    if form.is_valid():
+        data = form.cleaned_data
+        join_waitlist(request.user, surface, data["date"], data["time_from"], data["time_to"])
+        messages.success(request, "You're on the waitlist. We'll email you when a slot opens up.")
+    else:
+        errors = [e for field_errors in form.errors.values() for e in field_errors]
+        messages.error(request, errors[0])
+    query = urlencode({"surface": surface.pk, "date": request.POST.get("date", "")})
+    return redirect(reverse("customers:facility_detail", args=[facility_pk]) + "?" + query)
+
+
+@login_required
+@require_http_methods(["POST"])
+def waitlist_leave(request, pk):
+    get_object_or_404(WaitlistEntry, pk=pk, user=request.user).delete()
+    messages.success(request, "Removed from the waitlist.")
+    return redirect("customers:my_bookings")
+
+
 @login_required
 @require_http_methods(["POST"])
 def booking_cancel(request, booking_pk):
@@ -0,0 +1,105 @@
+"""
+Cross-facility console for operators managing several rinks.
+
+Every figure comes from a query grouped by facility (or one query filtered to all of
+them), so the number of queries per page does not grow with the number of facilities.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from bookings.facility_calendar import day_bounds, local_date
+from bookings.models import Booking, Facility, Slot
+from bookings.rollups import (
+    ROLLUP_COUNT_FIELDS,
+    ROLLUP_MONEY_FIELDS,
+    _utilization,
+    summarize_rollups_by_facility,
+)
+from bookings.services import get_facility_tz
+
+ACTIVE_FACILITY_SESSION_KEY = "active_facility_id"
+SCHEDULE_LIMIT = 200
+
+
+def active_facility_id(request):
+    """Facility the manager is working on: the one picked in the switcher, else their first."""
+    ids = request.managed_facilities
+    if not ids:
+        return None
+    chosen = request.session.get(ACTIVE_FACILITY_SESSION_KEY)
+    return chosen if chosen in ids else ids[0]
+
+
+def _today_filter(facilities, now):
+    """Q matching slots that start 'today' in each facility's own timezone."""
+    by_tz = defaultdict(list)
+    for facility in facilities:
+        by_tz[get_facility_tz(facility)].append(facility.pk)
+    q = Q(pk__in=[])
+    for tz, ids in by_tz.items():
+        day_start, day_end = day_bounds(tz, local_date(now, tz))
+        q |= Q(ice_surface__facility_id__in=ids, start__gte=day_start, start__lt=day_end)
+    return q
+
+
+def console_summary(facility_ids, start_date, end_date, now=None):
+    """
+    Per-facility utilization/revenue for the date range, pending payments and today's
+    booked slots, plus portfolio totals and today's schedule across all facilities.
+    """
+    now = now or timezone.now()
+    facilities = list(Facility.objects.filter(pk__in=facility_ids).order_by("name", "pk"))
+    usage = summarize_rollups_by_facility(facility_ids, start_date, end_date)
+    pending = {
+        row["slot__ice_surface__facility_id"]: row
+        for row in Booking.objects.filter(
+            slot__ice_surface__facility_id__in=facility_ids, payment_status="pending"
+        )
+        .values("slot__ice_surface__facility_id")
+        .annotate(count=Count("pk"), amount=Sum("amount_paid"))
+        .order_by()
+    }
+    today = _today_filter(facilities, now)
+    taken = Q(state__in=["booked", "manually_reserved"])
+    today_counts = dict(
+        Slot.objects.filter(today & taken)
+        .values("ice_surface__facility_id")
+        .annotate(count=Count("pk"))
+        .order_by()
+        .values_list("ice_surface__facility_id", "count")
+    )
+
+    rows = []
+    totals = {f: 0 for f in ROLLUP_COUNT_FIELDS}
+    totals.update({f: Decimal("0") for f in ROLLUP_MONEY_FIELDS})
+    totals.update(pending_count=0, pending_amount=Decimal("0"), today_count=0)
+    for facility in facilities:
+        stats = usage.get(facility.pk) or {f: 0 for f in ROLLUP_COUNT_FIELDS + ROLLUP_MONEY_FIELDS}
+        owed = pending.get(facility.pk, {})
+        row = {
+            "facility": facility,
+            **stats,
+            "utilization": _utilization(stats),
+            "pending_count": owed.get("count", 0),
+            "pending_amount": owed.get("amount") or Decimal("0"),
+            "today_count": today_counts.get(facility.pk, 0),
+        }
+        for f in totals:
+            totals[f] += row[f] or 0
+        rows.append(row)
+    totals["utilization"] = _utilization(totals)
+
+    schedule = list(
+        Slot.objects.filter(today & taken)
+        .select_related("ice_surface__facility", "booking__user", "manual_reservation")
+        .order_by("start", "ice_surface__facility__name", "ice_surface__name")[:SCHEDULE_LIMIT]
+    )
+    for slot in schedule:
+        slot.local_start = timezone.localtime(
+            slot.start, get_facility_tz(slot.ice_surface.facility)
+        )
+    return {"facilities": rows, "totals": totals, "schedule": schedule}
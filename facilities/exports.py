@@ -0,0 +1,123 @@
+"""Streaming CSV exports of slots, bookings and booking events for facility managers."""
+
+import csv
+from datetime import datetime
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from bookings.facility_calendar import day_range
+from bookings.models import Booking, BookingEvent, Slot
+
+CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each row back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value, tz):
+    if isinstance(value, datetime):
+        return timezone.localtime(value, tz).strftime("%Y-%m-%d %H:%M")
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        # Keep spreadsheets from evaluating customer-entered text as a formula.
+        return "'" + value
+    return "" if value is None else value
+
+
+def stream_csv(filename, header, rows, tz):
+    """StreamingHttpResponse that writes the header then each row as it is read."""
+    writer = csv.writer(_Echo())
+
+    def generate():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow([_cell(v, tz) for v in row])
+
+    response = StreamingHttpResponse(generate(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def slot_rows(facility, tz, start_date, end_date, surface_id=None):
+    start, end = day_range(tz, start_date, end_date)
+    qs = Slot.objects.filter(ice_surface__facility=facility, start__gte=start, start__lt=end)
+    if surface_id:
+        qs = qs.filter(ice_surface_id=surface_id)
+    return (
+        qs.order_by("start", "ice_surface_id")
+        .values_list("pk", "ice_surface__name", "start", "end", "rate", "state")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+SLOT_HEADER = ["slot_id", "surface", "start", "end", "rate", "state"]
+
+
+def booking_rows(facility, tz, start_date, end_date, surface_id=None):
+    start, end = day_range(tz, start_date, end_date)
+    qs = Booking.objects.filter(
+        slot__ice_surface__facility=facility, slot__start__gte=start, slot__start__lt=end
+    )
+    if surface_id:
+        qs = qs.filter(slot__ice_surface_id=surface_id)
+    return (
+        qs.order_by("slot__start", "slot__ice_surface_id")
+        .values_list(
+            "pk",
+            "slot__ice_surface__name",
+            "slot__start",
+            "slot__end",
+            "user__username",
+            "user__email",
+            "organization_name",
+            "sport",
+            "amount_paid",
+            "payment_status",
+            "stripe_payment_intent_id",
+            "created_at",
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+BOOKING_HEADER = [
+    "booking_id",
+    "surface",
+    "start",
+    "end",
+    "customer",
+    "email",
+    "organization",
+    "sport",
+    "amount",
+    "payment_status",
+    "payment_intent",
+    "created_at",
+]
+
+
+def event_rows(facility, tz, start_date, end_date, surface_id=None):
+    start, end = day_range(tz, start_date, end_date)
+    qs = BookingEvent.objects.filter(facility=facility, created_at__gte=start, created_at__lt=end)
+    if surface_id:
+        qs = qs.filter(booking__slot__ice_surface_id=surface_id)
+    return (
+        qs.order_by("created_at", "pk")
+        .values_list("pk", "created_at", "event_type", "booking_id", "user__username", "message")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+EVENT_HEADER = ["event_id", "created_at", "event_type", "booking_id", "user", "message"]
+
+
+# kind -> (CSV header, row source)
+EXPORTS = {
+    "slots": (SLOT_HEADER, slot_rows),
+    "bookings": (BOOKING_HEADER, booking_rows),
+    "events": (EVENT_HEADER, event_rows),
+}
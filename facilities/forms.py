@@ -1,9 +1,18 @@
 from datetime import time as time_type
+from decimal import Decimal
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from django import forms
 from django.contrib.auth import get_user_model
 
-from bookings.models import Facility, HoursOfOperation, IceSurface, ManualReservation
+from bookings.models import (
+    Facility,
+    HoursOfOperation,
+    IceSurface,
+    ManualReservation,
+    PricingRule,
+)
+from bookings.services import BULK_ACTIONS
 
 User = get_user_model()
 INPUT_CLASS = "input input-bordered w-full"
@@ -105,9 +114,15 @@ class TimeSelect30CompactWidget(forms.MultiWidget):
 
     def __init__(self, attrs=None):
         widgets = (
-            forms.Select(attrs={"class": "select select-bordered", **(attrs or {})}, choices=HOUR_12_CHOICES),
-            forms.Select(attrs={"class": "select select-bordered", **(attrs or {})}, choices=MINUTE_CHOICES),
-            forms.Select(attrs={"class": "select select-bordered", **(attrs or {})}, choices=AMPM_CHOICES),
+            forms.Select(
+                attrs={"class": "select select-bordered", **(attrs or {})}, choices=HOUR_12_CHOICES
+            ),
+            forms.Select(
+                attrs={"class": "select select-bordered", **(attrs or {})}, choices=MINUTE_CHOICES
+            ),
+            forms.Select(
+                attrs={"class": "select select-bordered", **(attrs or {})}, choices=AMPM_CHOICES
+            ),
         )
         super().__init__(widgets, attrs)
 
@@ -332,10 +347,14 @@ class AddHoursForm(forms.Form):
     """Add or update hours for multiple selected days with one open/close time range."""
 
     open_time = forms.TimeField(
-        widget=TimeSelect30Widget(attrs={"class": "select select-bordered w-full", "id": "id_open_time"}),
+        widget=TimeSelect30Widget(
+            attrs={"class": "select select-bordered w-full", "id": "id_open_time"}
+        ),
     )
     close_time = forms.TimeField(
-        widget=TimeSelect30Widget(attrs={"class": "select select-bordered w-full", "id": "id_close_time"}),
+        widget=TimeSelect30Widget(
+            attrs={"class": "select select-bordered w-full", "id": "id_close_time"}
+        ),
     )
 
     def __init__(self, *args, **kwargs):
@@ -389,10 +408,14 @@ class BulkHoursForm(forms.Form):
     """Set hours for multiple days at once with one open/close time range."""
 
     open_time = forms.TimeField(
-        widget=TimeSelect30Widget(attrs={"class": "select select-bordered w-full", "id": "id_open_time"}),
+        widget=TimeSelect30Widget(
+            attrs={"class": "select select-bordered w-full", "id": "id_open_time"}
+        ),
     )
     close_time = forms.TimeField(
-        widget=TimeSelect30Widget(attrs={"class": "select select-bordered w-full", "id": "id_close_time"}),
+        widget=TimeSelect30Widget(
+            attrs={"class": "select select-bordered w-full", "id": "id_close_time"}
+        ),
     )
 
     def __init__(self, *args, **kwargs):
@@ -437,6 +460,56 @@ class BulkHoursForm(forms.Form):
                 )
 
 
+class PricingRuleForm(forms.ModelForm):
+    """Peak/off-peak or last-minute pricing rule for one surface."""
+
+    class Meta:
+        model = PricingRule
+        fields = [
+            "name",
+            "priority",
+            "weekday",
+            "start_time",
+            "end_time",
+            "start_date",
+            "end_date",
+            "season_start_month",
+            "season_end_month",
+            "lead_time_hours",
+            "adjustment",
+            "amount",
+        ]
+        widgets = {
+            "name": forms.TextInput(attrs={"class": INPUT_CLASS}),
+            "priority": forms.NumberInput(attrs={"class": INPUT_CLASS}),
+            "weekday": forms.Select(attrs={"class": "select select-bordered w-full"}),
+            "start_time": forms.TimeInput(attrs={"class": INPUT_CLASS, "type": "time"}),
+            "end_time": forms.TimeInput(attrs={"class": INPUT_CLASS, "type": "time"}),
+            "start_date": forms.DateInput(attrs={"class": INPUT_CLASS, "type": "date"}),
+            "end_date": forms.DateInput(attrs={"class": INPUT_CLASS, "type": "date"}),
+            "season_start_month": forms.Select(attrs={"class": "select select-bordered w-full"}),
+            "season_end_month": forms.Select(attrs={"class": "select select-bordered w-full"}),
+            "lead_time_hours": forms.NumberInput(attrs={"class": INPUT_CLASS}),
+            "adjustment": forms.Select(attrs={"class": "select select-bordered w-full"}),
+            "amount": forms.NumberInput(attrs={"class": INPUT_CLASS, "step": "0.01"}),
+        }
+
+    def clean(self):
+        data = super().clean()
+        start_t, end_t = data.get("start_time"), data.get("end_time")
+        if start_t and end_t and start_t >= end_t:
+            self.add_error("end_time", "End time must be after start time.")
+        start_d, end_d = data.get("start_date"), data.get("end_date")
+        if start_d and end_d and end_d < start_d:
+            self.add_error("end_date", "End date must be on or after start date.")
+        if bool(data.get("season_start_month")) != bool(data.get("season_end_month")):
+            self.add_error("season_end_month", "Set both season months, or neither.")
+        amount = data.get("amount")
+        if amount is not None and amount < 0:
+            self.add_error("amount", "Amount can't be negative.")
+        return data
+
+
 class ManualReservationForm(forms.ModelForm):
     class Meta:
         model = ManualReservation
@@ -447,3 +520,187 @@ class ManualReservationForm(forms.ModelForm):
                 attrs={"class": "textarea textarea-bordered w-full", "rows": 2}
             ),
         }
+
+
+class BulkSlotActionForm(forms.Form):
+    """Block, unblock, reprice or release every slot matching surfaces, dates, weekdays and times."""
+
+    MAX_DAYS = 366
+
+    surfaces = forms.ModelMultipleChoiceField(
+        queryset=IceSurface.objects.none(),
+        widget=forms.CheckboxSelectMultiple(attrs={"class": "checkbox checkbox-primary"}),
+    )
+    start_date = forms.DateField(
+        widget=forms.DateInput(attrs={"class": INPUT_CLASS, "type": "date"})
+    )
+    end_date = forms.DateField(widget=forms.DateInput(attrs={"class": INPUT_CLASS, "type": "date"}))
+    weekdays = forms.TypedMultipleChoiceField(
+        choices=HoursOfOperation.WEEKDAYS,
+        coerce=int,
+        required=False,
+        help_text="Leave empty for every day.",
+        widget=forms.CheckboxSelectMultiple(attrs={"class": "checkbox checkbox-primary"}),
+    )
+    time_from = forms.TimeField(
+        required=False,
+        label="From (start time)",
+        widget=forms.TimeInput(attrs={"class": INPUT_CLASS, "type": "time"}),
+    )
+    time_to = forms.TimeField(
+        required=False,
+        label="Until (start time before)",
+        widget=forms.TimeInput(attrs={"class": INPUT_CLASS, "type": "time"}),
+    )
+    action = forms.ChoiceField(
+        choices=BULK_ACTIONS,
+        widget=forms.Select(attrs={"class": "select select-bordered w-full"}),
+    )
+    rate = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=0,
+        required=False,
+        help_text="New rate per slot (Set rate only).",
+        widget=forms.NumberInput(attrs={"class": INPUT_CLASS, "step": "0.01"}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        facility = kwargs.pop("facility")
+        super().__init__(*args, **kwargs)
+        self.fields["surfaces"].queryset = facility.ice_surfaces.all()
+
+    def clean(self):
+        data = super().clean()
+        start, end = data.get("start_date"), data.get("end_date")
+        if start and end:
+            if end < start:
+                self.add_error("end_date", "End date must be on or after start date.")
+            elif (end - start).days >= self.MAX_DAYS:
+                self.add_error("end_date", f"Choose a range of at most {self.MAX_DAYS} days.")
+        time_from, time_to = data.get("time_from"), data.get("time_to")
+        if time_from and time_to and time_from >= time_to:
+            self.add_error("time_to", "Must be after the start of the time window.")
+        if data.get("action") == "set_rate" and data.get("rate") is None:
+            self.add_error("rate", "Enter the new rate.")
+        return data
+
+
+class FacilityImportForm(forms.Form):
+    """Upload for facilities.imports: a CSV or JSON file and an optional slot horizon."""
+
+    MAX_BYTES = 5 * 1024 * 1024
+
+    file = forms.FileField(
+        help_text="CSV with a header row, or a JSON list of rows.",
+        widget=forms.ClearableFileInput(
+            attrs={"class": "file-input file-input-bordered w-full", "accept": ".csv,.json"}
+        ),
+    )
+    slot_days = forms.IntegerField(
+        label="Generate slots for the next (days)",
+        min_value=0,
+        max_value=366,
+        initial=0,
+        required=False,
+        help_text="0 leaves slot generation to the usual schedule.",
+        widget=forms.NumberInput(attrs={"class": INPUT_CLASS}),
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data["file"]
+        if not upload.name.lower().endswith((".csv", ".json")):
+            raise forms.ValidationError("Upload a .csv or .json file.")
+        if upload.size > self.MAX_BYTES:
+            raise forms.ValidationError("The file is larger than 5 MB.")
+        return upload
+
+
+def _split_list(value):
+    """'a; b' or 'a, b' (or a JSON list) as a list of non-blank strings."""
+    if isinstance(value, list):
+        items = value
+    else:
+        items = str(value or "").replace(";", ",").split(",")
+    return [str(item).strip() for item in items if str(item).strip()]
+
+
+class FacilityImportRowForm(forms.Form):
+    """
+    One row of a facility import (facilities.imports). Facility columns may repeat on every
+    row of the facility or appear once; surface and hours columns are optional, so a row
+    can describe a facility, a surface of it, or one weekday's hours of that surface.
+    """
+
+    facility = forms.CharField(max_length=255)
+    address_line1 = forms.CharField(max_length=255, required=False)
+    address_line2 = forms.CharField(max_length=255, required=False)
+    city = forms.CharField(max_length=100, required=False)
+    province = forms.CharField(max_length=100, required=False)
+    postal_code = forms.CharField(max_length=20, required=False)
+    timezone = forms.CharField(max_length=63, required=False)
+    amenities = forms.CharField(required=False)
+    managers = forms.CharField(required=False)
+    surface = forms.CharField(max_length=255, required=False)
+    display_order = forms.IntegerField(min_value=0, max_value=32767, required=False)
+    default_rate = forms.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal("0"), required=False
+    )
+    weekday = forms.CharField(required=False)
+    open_time = forms.TimeField(required=False)
+    close_time = forms.TimeField(required=False)
+
+    WEEKDAY_NAMES = {label.lower(): i for i, label in HoursOfOperation.WEEKDAYS}
+
+    def __init__(self, data, **kwargs):
+        # JSON rows may give amenities/managers as lists and numbers as numbers.
+        data = {
+            key: ", ".join(_split_list(value)) if isinstance(value, list) else value
+            for key, value in data.items()
+        }
+        super().__init__(data, **kwargs)
+
+    def clean_timezone(self):
+        name = self.cleaned_data["timezone"]
+        if name:
+            try:
+                ZoneInfo(name)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise forms.ValidationError(f"Unknown timezone {name!r}.") from None
+        return name
+
+    def clean_amenities(self):
+        names = _split_list(self.cleaned_data["amenities"])
+        known = {name for name, _ in Facility.AMENITY_FIELDS}
+        unknown = [n for n in names if n not in known]
+        if unknown:
+            raise forms.ValidationError(
+                f"Unknown amenities {', '.join(unknown)}; use {', '.join(sorted(known))}."
+            )
+        return names
+
+    def clean_managers(self):
+        return _split_list(self.cleaned_data["managers"])
+
+    def clean_weekday(self):
+        value = self.cleaned_data["weekday"].strip().lower()
+        if not value:
+            return None
+        if value.isdigit() and int(value) < 7:
+            return int(value)
+        for name, i in self.WEEKDAY_NAMES.items():
+            if len(value) >= 3 and name.startswith(value):
+                return i
+        raise forms.ValidationError("Weekday must be 0-6 (Monday = 0) or a day name.")
+
+    def clean(self):
+        data = super().clean()
+        surface_columns = ("display_order", "default_rate", "weekday", "open_time", "close_time")
+        if not data.get("surface") and any(data.get(f) is not None for f in surface_columns):
+            self.add_error("surface", "Name the surface these columns belong to.")
+        hours = [data.get(f) for f in ("weekday", "open_time", "close_time")]
+        if any(v is not None for v in hours) and any(v is None for v in hours):
+            self.add_error("weekday", "Give weekday, open_time and close_time together.")
+        elif hours[1] is not None and hours[1] >= hours[2]:
+            self.add_error("close_time", "Close time must be after open time.")
+        return data
@@ -0,0 +1,302 @@
+"""
+Bulk import of facilities, their managers, surfaces, rates and weekly hours from CSV or
+JSON, for onboarding a chain of rinks at once (manage.py import_facilities, or the
+upload page in the facility console).
+
+Each row is validated with FacilityImportRowForm (a CSV file has a header row with
+IMPORT_COLUMNS; JSON is a list of objects with the same keys). Facilities are matched by
+name, surfaces by facility and name, hours by surface and weekday: matches are updated,
+the rest created. Every row is checked before anything is written, and then everything is
+written in one transaction with a handful of bulk_create/bulk_update statements, so a
+file loads completely or not at all.
+"""
+
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from bookings.cache import invalidate_facility, invalidate_surface
+from bookings.facility_calendar import facility_tz
+from bookings.models import Facility, HoursOfOperation, IceSurface, amenity_mask
+from bookings.pricing import reprice_future_slots
+from bookings.services import generate_slots_for_surfaces
+from core.middleware import invalidate_managed_facilities
+from facilities.forms import FacilityImportRowForm
+
+IMPORT_COLUMNS = [
+    "facility",
+    "address_line1",
+    "address_line2",
+    "city",
+    "province",
+    "postal_code",
+    "timezone",
+    "amenities",
+    "managers",
+    "surface",
+    "display_order",
+    "default_rate",
+    "weekday",
+    "open_time",
+    "close_time",
+]
+FACILITY_COLUMNS = ["address_line1", "address_line2", "city", "province", "postal_code", "timezone"]
+SURFACE_COLUMNS = ["display_order", "default_rate"]
+MAX_ROWS = 10_000
+
+User = get_user_model()
+
+
+class ImportFileError(ValueError):
+    """The file itself can't be read (as opposed to errors in its rows)."""
+
+
+def read_rows(data, filename):
+    """[(row number, {column: value})] from CSV or JSON bytes; the extension picks the format."""
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportFileError("The file must be UTF-8 text.") from None
+    if filename.lower().endswith(".json"):
+        try:
+            items = json.loads(text)
+        except ValueError as e:
+            raise ImportFileError(f"Invalid JSON: {e}") from None
+        if not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+            raise ImportFileError("JSON must be a list of objects, one per row.")
+        rows = list(enumerate(items, start=1))
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        if "facility" not in (reader.fieldnames or []):
+            raise ImportFileError(f"CSV needs a header row with {', '.join(IMPORT_COLUMNS)}.")
+        rows = [(reader.line_num, row) for row in reader]
+    if len(rows) > MAX_ROWS:
+        raise ImportFileError(f"At most {MAX_ROWS} rows per file.")
+    return rows
+
+
+def _agree(plan, key, value, number, errors, what):
+    """Record value under key unless an earlier row gave a different one."""
+    if value in (None, "", []):
+        return
+    earlier = plan.setdefault(key, (value, number))
+    if earlier[0] != value:
+        errors.append((number, f"{what} conflicts with row {earlier[1]}."))
+
+
+def _plan(rows, existing, errors):
+    """Validated rows folded into {facility name: {...}}, with errors per row appended."""
+    facilities = {}
+    for number, row in rows:
+        form = FacilityImportRowForm(row)
+        if not form.is_valid():
+            for field, messages in form.errors.items():
+                label = "row" if field == "__all__" else field
+                errors.extend((number, f"{label}: {m}") for m in messages)
+            continue
+        data = form.cleaned_data
+        name = data["facility"]
+        if len(existing.get(name, ())) > 1:
+            errors.append((number, f"{len(existing[name])} facilities are named {name!r}."))
+            continue
+        plan = facilities.setdefault(name, {"fields": {}, "managers": {}, "surfaces": {}})
+        for column in FACILITY_COLUMNS:
+            _agree(plan["fields"], column, data[column], number, errors, column)
+        if data["amenities"]:
+            _agree(
+                plan["fields"], "amenities", sorted(data["amenities"]), number, errors, "amenities"
+            )
+        for manager in data["managers"]:
+            plan["managers"].setdefault(manager, number)
+        if not data["surface"]:
+            continue
+        surface = plan["surfaces"].setdefault(data["surface"], {"fields": {}, "hours": {}})
+        for column in SURFACE_COLUMNS:
+            _agree(surface["fields"], column, data[column], number, errors, column)
+        if data["weekday"] is not None:
+            hours = (data["open_time"], data["close_time"])
+            _agree(surface["hours"], data["weekday"], hours, number, errors, "hours")
+    return facilities
+
+
+def _managers(facilities, errors, manager):
+    """
+    {username or email: user} for every manager named, with unknown ones reported. An
+    uploading manager who isn't staff may only name themself.
+    """
+    names = {m for plan in facilities.values() for m in plan["managers"]}
+    if not names:
+        return {}
+    users = {}
+    for user in User.objects.filter(Q(username__in=names) | Q(email__in=names)):
+        users.setdefault(user.username, user)
+        if user.email:
+            users.setdefault(user.email, user)
+    restricted = manager is not None and not manager.is_staff
+    for plan in facilities.values():
+        for name, number in plan["managers"].items():
+            if name not in users:
+                errors.append((number, f"managers: no user {name!r}."))
+            elif restricted and users[name] != manager:
+                errors.append((number, f"managers: only staff can add {name!r}."))
+    return users
+
+
+def _apply_facility(facility, fields):
+    for column, (value, _) in fields.items():
+        if column == "amenities":
+            for amenity, _label in Facility.AMENITY_FIELDS:
+                setattr(facility, amenity, amenity in value)
+            # bulk writes skip Facility.save(), which keeps the mask in step.
+            facility.amenity_mask = amenity_mask(value)
+        else:
+            setattr(facility, column, value)
+
+
+def import_facilities(rows, manager=None, slot_days=0):
+    """
+    Validate and load rows from read_rows. With a manager (the upload page) only their own
+    facilities are matched and updated, they manage every facility created, and unless
+    they are staff the managers column may name only them. With
+    slot_days, slots for that many days from each facility's local today are generated
+    for the imported surfaces in the same transaction.
+
+    Returns (counts, errors): errors is [(row number, message)], and when it is not empty
+    nothing was written.
+    """
+    scope = Facility.objects.all() if manager is None else Facility.objects.filter(managers=manager)
+    names = {str(row.get("facility") or "").strip() for _, row in rows}
+    existing = defaultdict(list)
+    for facility in scope.filter(name__in=names):
+        existing[facility.name].append(facility)
+
+    errors = []
+    facilities = _plan(rows, existing, errors)
+    users = _managers(facilities, errors, manager)
+    if not facilities and not errors:
+        errors.append((0, "The file has no rows."))
+    if errors:
+        return {}, sorted(errors, key=lambda e: e[0])
+
+    now = timezone.now()
+    counts = defaultdict(int)
+    with transaction.atomic():
+        new_facilities, changed_facilities, by_name = [], [], {}
+        for name, plan in facilities.items():
+            found = existing.get(name)
+            facility = found[0] if found else Facility(name=name, timezone="UTC")
+            _apply_facility(facility, plan["fields"])
+            facility.updated_at = now
+            (changed_facilities if found else new_facilities).append(facility)
+            by_name[name] = facility
+        Facility.objects.bulk_create(new_facilities)
+        Facility.objects.bulk_update(
+            changed_facilities,
+            [
+                *FACILITY_COLUMNS,
+                *(a for a, _ in Facility.AMENITY_FIELDS),
+                "amenity_mask",
+                "updated_at",
+            ],
+        )
+        counts["facilities_created"], counts["facilities_updated"] = (
+            len(new_facilities),
+            len(changed_facilities),
+        )
+
+        links = [
+            (by_name[name].pk, users[m].pk)
+            for name, plan in facilities.items()
+            for m in plan["managers"]
+        ]
+        if manager is not None:
+            links.extend((f.pk, manager.pk) for f in new_facilities)
+        Through = Facility.managers.through
+        Through.objects.bulk_create(
+            [Through(facility_id=f, user_id=u) for f, u in set(links)], ignore_conflicts=True
+        )
+
+        surfaces_by_key = {
+            (s.facility_id, s.name): s
+            for s in IceSurface.objects.filter(
+                facility__in=changed_facilities,
+                name__in={s for plan in facilities.values() for s in plan["surfaces"]},
+            )
+        }
+        new_surfaces, changed_surfaces, repriced, planned = [], [], [], []
+        for name, plan in facilities.items():
+            facility = by_name[name]
+            for surface_name, surface_plan in plan["surfaces"].items():
+                surface = surfaces_by_key.get((facility.pk, surface_name))
+                is_new = surface is None
+                if is_new:
+                    surface = IceSurface(facility=facility, name=surface_name)
+                old_rate = surface.default_rate
+                for column, (value, _) in surface_plan["fields"].items():
+                    setattr(surface, column, value)
+                surface.updated_at = now
+                if is_new:
+                    new_surfaces.append(surface)
+                else:
+                    changed_surfaces.append(surface)
+                    if surface.default_rate != old_rate:
+                        repriced.append(surface)
+                planned.append((surface, surface_plan["hours"]))
+        IceSurface.objects.bulk_create(new_surfaces)
+        IceSurface.objects.bulk_update(changed_surfaces, [*SURFACE_COLUMNS, "updated_at"])
+        counts["surfaces_created"], counts["surfaces_updated"] = (
+            len(new_surfaces),
+            len(changed_surfaces),
+        )
+
+        hours_by_key = {
+            (h.ice_surface_id, h.weekday): h
+            for h in HoursOfOperation.objects.filter(ice_surface__in=changed_surfaces)
+        }
+        new_hours, changed_hours = [], []
+        for surface, hours in planned:
+            for weekday, ((open_time, close_time), _) in hours.items():
+                h = hours_by_key.get((surface.pk, weekday))
+                if h is None:
+                    new_hours.append(
+                        HoursOfOperation(
+                            ice_surface=surface,
+                            weekday=weekday,
+                            open_time=open_time,
+                            close_time=close_time,
+                        )
+                    )
+                else:
+                    h.open_time, h.close_time = open_time, close_time
+                    changed_hours.append(h)
+        HoursOfOperation.objects.bulk_create(new_hours)
+        HoursOfOperation.objects.bulk_update(changed_hours, ["open_time", "close_time"])
+        counts["hours_created"], counts["hours_updated"] = len(new_hours), len(changed_hours)
+
+        # Bulk writes skip the model signals: reprice and invalidate as they would.
+        for surface in repriced:
+            reprice_future_slots(surface)
+        for facility in by_name.values():
+            invalidate_facility(facility.pk)
+        for surface in changed_surfaces:
+            invalidate_surface(surface.pk)
+        invalidate_managed_facilities({u for _, u in links})
+
+        if slot_days:
+            # A chain can span time zones: start each surface on its facility's today.
+            tzs = {f.pk: facility_tz(f) for f in by_name.values()}
+            by_today = defaultdict(list)
+            for surface, _ in planned:
+                by_today[timezone.localdate(timezone=tzs[surface.facility_id])].append(surface)
+            counts["slots_created"] = sum(
+                generate_slots_for_surfaces(surfaces, today, today + timedelta(days=slot_days - 1))
+                for today, surfaces in by_today.items()
+            )
+    return dict(counts), []
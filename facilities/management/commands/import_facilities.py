@@ -0,0 +1,37 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from facilities.imports import IMPORT_COLUMNS, ImportFileError, import_facilities, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update facilities, managers, surfaces, rates and weekly hours from a CSV "
+        f"or JSON file (columns: {', '.join(IMPORT_COLUMNS)})."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="A .csv file with a header row, or a .json list.")
+        parser.add_argument(
+            "--slot-days",
+            type=int,
+            default=0,
+            help="Also generate slots for this many days from today for the imported surfaces.",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        try:
+            rows = read_rows(path.read_bytes(), path.name)
+        except OSError as e:
+            raise CommandError(f"Can't read {path}: {e}") from None
+        except ImportFileError as e:
+            raise CommandError(str(e)) from None
+        counts, errors = import_facilities(rows, slot_days=options["slot_days"])
+        if errors:
+            for number, message in errors:
+                self.stderr.write(f"Row {number}: {message}")
+            raise CommandError(f"{len(errors)} errors; nothing was imported.")
+        summary = ", ".join(f"{name.replace('_', ' ')} {n}" for name, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Imported {path.name}: {summary}."))
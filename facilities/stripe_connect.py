@@ -1,16 +1,20 @@
-"""Stripe Connect: create account link for facility onboarding."""
+"""
+Stripe Connect: create account link for facility onboarding.
 
-import stripe
-from django.conf import settings
+stripe is imported on use (see customers.stripe_payment).
+"""
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from django.conf import settings
 
 
 def get_or_create_connect_account(facility):
     """Create Stripe Express account for facility if none; return account id."""
     if facility.stripe_account_id:
         return facility.stripe_account_id
+    import stripe
+
     account = stripe.Account.create(
+        api_key=settings.STRIPE_SECRET_KEY,
         type="express",
         country="CA",
         email=facility.managers.first().email if facility.managers.exists() else None,
@@ -24,7 +28,10 @@ def create_account_link(account_id, request):
     """Create AccountLink for onboarding; redirect URL uses request.build_absolute_uri."""
     return_url = request.build_absolute_uri("/facility/")
     refresh_url = request.build_absolute_uri("/facility/")
+    import stripe
+
     return stripe.AccountLink.create(
+        api_key=settings.STRIPE_SECRET_KEY,
         account=account_id,
         refresh_url=refresh_url,
         return_url=return_url,
@@ -1,8 +1,35 @@
+import asyncio
+import csv
+import io
+import json
+import tempfile
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from bookings.models import Facility, HoursOfOperation, IceSurface
+from bookings.models import (
+    Booking,
+    Facility,
+    HoursOfOperation,
+    IceSurface,
+    Slot,
+    SurfaceDailyRollup,
+)
+from bookings.services import bulk_slot_action
+from core.testing import QueryBudgetMixin
+from facilities.imports import IMPORT_COLUMNS
 
 User = get_user_model()
 
@@ -26,6 +53,23 @@ class FacilityAccessTests(TestCase):
         response = self.client.get(reverse("facilities:dashboard"))
         self.assertEqual(response.status_code, 200)
 
+    def test_dashboard_shows_rollup_stats(self):
+        surface = IceSurface.objects.create(facility=self.facility, name="Main")
+        today = timezone.now().date()
+        SurfaceDailyRollup.objects.create(
+            ice_surface=surface,
+            date=today,
+            slots_available=3,
+            slots_booked=1,
+            revenue=Decimal("80"),
+            revenue_paid=Decimal("80"),
+            refreshed_at=timezone.now(),
+        )
+        self.client.login(username="customer", password="pass")
+        response = self.client.get(reverse("facilities:dashboard"))
+        self.assertContains(response, "25.0%")
+        self.assertContains(response, "$80")
+
 
 class AddHoursTests(TestCase):
     """Add hours of operation with multiple days selected."""
@@ -61,12 +105,398 @@ class AddHoursTests(TestCase):
             follow=False,
         )
         self.assertEqual(response.status_code, 302)
-        hours = list(
-            HoursOfOperation.objects.filter(ice_surface=self.surface).order_by("weekday")
-        )
+        hours = list(HoursOfOperation.objects.filter(ice_surface=self.surface).order_by("weekday"))
         self.assertEqual(len(hours), 3)
         weekdays = [h.weekday for h in hours]
         self.assertEqual(weekdays, [0, 2, 4])
         for h in hours:
             self.assertEqual(h.open_time.strftime("%H:%M"), "06:00")
             self.assertEqual(h.close_time.strftime("%H:%M"), "22:00")
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="manager", password="pass", email="m@example.com"
+        )
+        self.facility = Facility.objects.create(name="Rink", timezone="UTC")
+        self.facility.managers.add(self.user)
+        self.surface_a = IceSurface.objects.create(facility=self.facility, name="A")
+        self.surface_b = IceSurface.objects.create(facility=self.facility, name="B")
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        for surface in (self.surface_a, self.surface_b):
+            Slot.objects.create(
+                ice_surface=surface,
+                start=start,
+                end=start + timedelta(hours=1),
+                rate=Decimal("90"),
+            )
+        slot = Slot.objects.get(ice_surface=self.surface_a)
+        customer = User.objects.create_user(username="cust", password="pass", email="c@x.com")
+        Booking.objects.create(
+            slot=slot, user=customer, organization_name="=Sharks", amount_paid=Decimal("90")
+        )
+        self.client.login(username="manager", password="pass")
+
+    def read_csv(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content).decode()
+        return list(csv.reader(io.StringIO(body)))
+
+    def test_slot_export_filters_by_surface(self):
+        rows = self.read_csv("facilities:export_slots", surface=self.surface_b.pk)
+        self.assertEqual(rows[0][0], "slot_id")
+        self.assertEqual([r[1] for r in rows[1:]], ["B"])
+
+    def test_booking_export_includes_payment_status(self):
+        rows = self.read_csv("facilities:export_bookings")
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][4], "cust")
+        self.assertEqual(rows[1][6], "'=Sharks")
+        self.assertEqual(rows[1][9], "pending")
+
+    def test_export_outside_range_is_empty(self):
+        rows = self.read_csv("facilities:export_slots", start="2020-01-01", end="2020-01-31")
+        self.assertEqual(len(rows), 1)
+
+
+class SlotBulkViewTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="manager", password="pass", email="m@example.com"
+        )
+        self.facility = Facility.objects.create(name="Rink", timezone="UTC")
+        self.facility.managers.add(self.user)
+        self.surface = IceSurface.objects.create(facility=self.facility, name="A")
+        other = Facility.objects.create(name="Other", timezone="UTC")
+        self.other_surface = IceSurface.objects.create(facility=other, name="X")
+        self.day = timezone.now().date() + timedelta(days=2)
+        start = datetime.combine(self.day, time(9), tzinfo=dt_timezone.utc)
+        for surface in (self.surface, self.other_surface):
+            Slot.objects.create(ice_surface=surface, start=start, end=start + timedelta(hours=1))
+        self.client.login(username="manager", password="pass")
+
+    def post(self, **extra):
+        data = {
+            "surfaces": [self.surface.pk],
+            "start_date": self.day.isoformat(),
+            "end_date": self.day.isoformat(),
+            "action": "block",
+        }
+        data.update(extra)
+        return self.client.post(reverse("facilities:slot_bulk"), data)
+
+    def test_bulk_block_redirects_and_blocks(self):
+        response = self.post()
+        self.assertRedirects(
+            response, reverse("facilities:slot_list"), fetch_redirect_response=False
+        )
+        self.assertEqual(Slot.objects.get(ice_surface=self.surface).state, "blocked")
+        self.assertEqual(Slot.objects.get(ice_surface=self.other_surface).state, "available")
+
+    def test_other_facility_surface_rejected(self):
+        response = self.post(surfaces=[self.other_surface.pk])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Slot.objects.get(ice_surface=self.other_surface).state, "available")
+
+    def test_set_rate_requires_rate(self):
+        response = self.post(action="set_rate")
+        self.assertContains(response, "Enter the new rate.")
+
+    @override_settings(LIVE_SLOTS_POLL_SECONDS=0)
+    async def test_bulk_block_updates_the_live_week_view(self):
+        await self.async_client.aforce_login(self.user)
+        year, week, _ = (self.day + timedelta(days=1)).isocalendar()
+        response = await self.async_client.get(
+            reverse("facilities:slot_list_live"), {"week": f"{year}-W{week:02d}"}
+        )
+        stream = response.streaming_content
+        await anext(stream)
+
+        def block():
+            with self.captureOnCommitCallbacks(execute=True):
+                bulk_slot_action(self.facility, [self.surface], self.day, self.day, "block")
+
+        await sync_to_async(block)()
+        event = (await asyncio.wait_for(anext(stream), 5)).decode()
+        await stream.aclose()
+        slot = await Slot.objects.aget(ice_surface=self.surface)
+        self.assertTrue(event.startswith(f"event: slot-{slot.pk}\n"))
+        self.assertIn("Blocked", event)
+        self.assertIn("<td>A</td>", event)
+
+
+class PricingViewTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="manager", password="pass", email="m@example.com"
+        )
+        self.facility = Facility.objects.create(name="Rink", timezone="UTC")
+        self.facility.managers.add(self.user)
+        self.surface = IceSurface.objects.create(
+            facility=self.facility, name="A", default_rate=Decimal("100")
+        )
+        start = datetime.combine(
+            timezone.now().date() + timedelta(days=3), time(19), tzinfo=dt_timezone.utc
+        )
+        self.slot = Slot.objects.create(
+            ice_surface=self.surface, start=start, end=start + timedelta(hours=1), rate=100
+        )
+        self.client.login(username="manager", password="pass")
+
+    def test_create_rule_reprices_slots(self):
+        response = self.client.post(
+            reverse("facilities:pricing_create", kwargs={"surface_pk": self.surface.pk}),
+            {
+                "name": "Prime time",
+                "priority": "1",
+                "start_time": "18:00",
+                "end_time": "22:00",
+                "adjustment": "fixed",
+                "amount": "175",
+            },
+        )
+        self.assertRedirects(
+            response,
+            reverse("facilities:pricing_list", kwargs={"surface_pk": self.surface.pk}),
+        )
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.rate, Decimal("175"))
+
+    def test_rule_rejects_inverted_time_window(self):
+        response = self.client.post(
+            reverse("facilities:pricing_create", kwargs={"surface_pk": self.surface.pk}),
+            {
+                "name": "Bad",
+                "priority": "0",
+                "start_time": "22:00",
+                "end_time": "18:00",
+                "adjustment": "fixed",
+                "amount": "175",
+            },
+        )
+        self.assertContains(response, "End time must be after start time.")
+
+
+class ConsoleTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.manager = User.objects.create_user(username="ops", password="pass")
+        self.client.login(username="ops", password="pass")
+        self.facilities = []
+        now = timezone.now()
+        for i, tz in enumerate(["UTC", "America/Toronto", "America/Vancouver"]):
+            facility = Facility.objects.create(name=f"Rink {i}", timezone=tz)
+            facility.managers.add(self.manager)
+            surface = IceSurface.objects.create(facility=facility, name="A")
+            slot = Slot.objects.create(
+                ice_surface=surface,
+                start=now + timedelta(minutes=5),
+                end=now + timedelta(minutes=65),
+                rate=Decimal("100"),
+                state="booked",
+            )
+            Booking.objects.create(slot=slot, user=self.manager, amount_paid=Decimal("100"))
+            self.facilities.append(facility)
+
+    def test_console_query_count_does_not_grow_with_facilities(self):
+        url = reverse("facilities:console")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as three:
+            response = self.client.get(url)
+        self.assertEqual(response.context["summary"]["totals"]["pending_count"], 3)
+        for i in range(3, 6):
+            facility = Facility.objects.create(name=f"Rink {i}", timezone="UTC")
+            facility.managers.add(self.manager)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as six:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["summary"]["facilities"]), 6)
+        self.assertEqual(len(six), len(three))
+
+    def test_switch_changes_active_facility(self):
+        target = self.facilities[2]
+        response = self.client.post(reverse("facilities:facility_switch", args=[target.pk]))
+        self.assertRedirects(response, reverse("facilities:dashboard"))
+        response = self.client.get(reverse("facilities:dashboard"))
+        self.assertEqual(response.context["facility"], target)
+
+    def test_cannot_switch_to_unmanaged_facility(self):
+        other = Facility.objects.create(name="Elsewhere", timezone="UTC")
+        response = self.client.post(reverse("facilities:facility_switch", args=[other.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class FacilityImportTests(TestCase):
+    CSV = (
+        "facility,city,timezone,amenities,managers,surface,display_order,default_rate,"
+        "weekday,open_time,close_time\n"
+        "Chain North,Barrie,America/Toronto,parking;wifi,boss,,,,,,\n"
+        "Chain North,,,,,Pad 1,1,90,mon,07:00,10:00\n"
+        "Chain North,,,,,Pad 1,,,tuesday,08:00,09:00\n"
+        "Chain South,,,,,Pad 1,,75,5,12:00,14:00\n"
+    )
+
+    def setUp(self):
+        # Staff, so the CSV may name other managers ("boss").
+        self.user = User.objects.create_user(username="mgr", password="pass", is_staff=True)
+        self.boss = User.objects.create_user(username="boss", email="boss@example.com")
+        self.facility = Facility.objects.create(name="Chain North", timezone="UTC")
+        self.facility.managers.add(self.user)
+        self.client.force_login(self.user)
+
+    def upload(self, content, name="rinks.csv", **data):
+        upload = io.BytesIO(content.encode())
+        upload.name = name
+        return self.client.post(reverse("facilities:facility_import"), {"file": upload, **data})
+
+    def test_upload_updates_own_facilities_creates_the_rest_and_generates_slots(self):
+        response = self.upload(self.CSV, slot_days=7)
+        self.assertRedirects(response, reverse("facilities:surface_list"))
+        north = Facility.objects.get(pk=self.facility.pk)
+        self.assertEqual((north.city, north.timezone), ("Barrie", "America/Toronto"))
+        self.assertTrue(north.parking and north.wifi and not north.pro_shop)
+        self.assertEqual(set(north.managers.values_list("username", flat=True)), {"mgr", "boss"})
+        pad = north.ice_surfaces.get(name="Pad 1")
+        self.assertEqual((pad.display_order, pad.default_rate), (1, Decimal("90")))
+        self.assertEqual(
+            list(pad.hours_of_operation.values_list("weekday", "open_time", "close_time")),
+            [(0, time(7), time(10)), (1, time(8), time(9))],
+        )
+        south = Facility.objects.get(name="Chain South")
+        self.assertIn(self.user, south.managers.all())
+        self.assertEqual(south.ice_surfaces.get().hours_of_operation.get().weekday, 5)
+        # Each surface is open on one or two weekdays of the coming week.
+        self.assertEqual(Slot.objects.filter(ice_surface=pad).count(), 3 + 1)
+        self.assertEqual(Slot.objects.filter(ice_surface__facility=south).count(), 2)
+
+        # Importing again updates in place.
+        self.upload(self.CSV.replace("mon,07:00,10:00", "mon,06:00,10:00"))
+        self.assertEqual(Facility.objects.filter(name="Chain North").count(), 1)
+        self.assertEqual(pad.hours_of_operation.get(weekday=0).open_time, time(6))
+
+    def test_managers_other_than_the_uploader_take_staff(self):
+        self.user.is_staff = False
+        self.user.save()
+        response = self.upload(self.CSV)
+        self.assertEqual(response.context["errors"], [(2, "managers: only staff can add 'boss'.")])
+        self.assertNotIn(self.boss, self.facility.managers.all())
+        self.upload(self.CSV.replace(",boss,", ",mgr,"))
+        self.assertTrue(Facility.objects.filter(name="Chain South").exists())
+
+    def test_slots_start_on_each_facility_local_today(self):
+        # 26 hours apart: at any moment at least one of them is not on UTC's date.
+        zones = {"Far East": "Etc/GMT-14", "Far West": "Etc/GMT+12"}
+        rows = "facility,timezone,surface,weekday,open_time,close_time\n" + "".join(
+            f"{name},{zone},Pad,{day},00:00,01:00\n"
+            for name, zone in zones.items()
+            for day in range(7)
+        )
+        self.upload(rows, slot_days=1)
+        for name, zone in zones.items():
+            tz = ZoneInfo(zone)
+            starts = Slot.objects.filter(ice_surface__facility__name=name).values_list("start")
+            self.assertEqual(
+                [timezone.localtime(start, tz).date() for (start,) in starts],
+                [timezone.localdate(timezone=tz)],
+            )
+
+    def test_errors_are_reported_per_row_and_nothing_is_written(self):
+        bad = self.CSV + (
+            "Chain South,,Mars/Olympus,,,,,,,,\n"
+            "Chain South,,,,,Pad 1,,80,5,12:00,11:00\n"
+            "Chain South,,,,,Pad 1,,80,,,\n"
+            "Chain South,,,,nobody,,,,,,\n"
+        )
+        response = self.upload(bad)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [f"Row {n}: {m}" for n, m in response.context["errors"]],
+            [
+                "Row 6: timezone: Unknown timezone 'Mars/Olympus'.",
+                "Row 7: close_time: Close time must be after open time.",
+                "Row 8: default_rate conflicts with row 5.",
+                "Row 9: managers: no user 'nobody'.",
+            ],
+        )
+        self.assertFalse(Facility.objects.filter(name="Chain South").exists())
+        self.assertFalse(IceSurface.objects.exists())
+
+        response = self.upload("name,city\n")
+        self.assertFormError(
+            response.context["form"],
+            "file",
+            ["CSV needs a header row with " + ", ".join(IMPORT_COLUMNS) + "."],
+        )
+
+    def test_command_imports_json(self):
+        rows = [
+            {"facility": "Json Rink", "managers": ["boss@example.com"], "amenities": ["pro_shop"]},
+            {
+                "facility": "Json Rink",
+                "surface": "Main",
+                "default_rate": 85.5,
+                "weekday": 0,
+                "open_time": "09:00",
+                "close_time": "11:00",
+            },
+        ]
+        path = Path(self.enterContext(tempfile.TemporaryDirectory())) / "rinks.json"
+        path.write_text(json.dumps(rows))
+        out = io.StringIO()
+        call_command("import_facilities", str(path), "--slot-days", "7", stdout=out)
+        self.assertIn("facilities created 1", out.getvalue())
+        self.assertIn("slots created 2", out.getvalue())
+        rink = Facility.objects.get(name="Json Rink")
+        self.assertTrue(rink.pro_shop)
+        self.assertEqual(rink.ice_surfaces.get().default_rate, Decimal("85.50"))
+        self.assertEqual(list(rink.managers.all()), [self.boss])
+
+        path.write_text(json.dumps([{"facility": "Json Rink", "weekday": 9}]))
+        with self.assertRaisesMessage(CommandError, "nothing was imported"):
+            call_command("import_facilities", str(path), stdout=out, stderr=io.StringIO())
+
+
+class SlotListQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="m", password="pass")
+        self.customer = User.objects.create_user(username="c", password="pass")
+
+    def seed(self, size):
+        facility = Facility.objects.create(name="Rink", timezone="America/Toronto")
+        facility.managers.add(self.manager)
+        for n in range(size):
+            surface = IceSurface.objects.create(facility=facility, name=f"Pad {n}")
+            for weekday in range(7):
+                HoursOfOperation.objects.create(
+                    ice_surface=surface, weekday=weekday, open_time=time(8), close_time=time(12)
+                )
+        self.client.force_login(self.manager)
+        # First load generates the week's slots; book some of them for the measured load.
+        self.client.get(reverse("facilities:slot_list"))
+        for slot in Slot.objects.filter(ice_surface__facility=facility)[: size * 3]:
+            Booking.objects.create(slot=slot, user=self.customer, amount_paid=Decimal("10"))
+            slot.state = "booked"
+            slot.save()
+
+    # Budgets include the membership query: the default per-process cache never holds it.
+    def test_slot_list(self):
+        def run(_):
+            response = self.client.get(reverse("facilities:slot_list"))
+            self.assertContains(response, "Pad 0")
+
+        self.assertConstantQueries(self.seed, run, budget=7)
+
+    def test_first_load_generates_the_week(self):
+        def seed(size):
+            self.seed(size)
+            Slot.objects.all().delete()
+
+        self.assertConstantQueries(
+            seed, lambda _: self.client.get(reverse("facilities:slot_list")), budget=17
+        )
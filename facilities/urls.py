@@ -8,6 +8,13 @@ urlpatterns = [
     path("register/", views.facility_register, name="register"),
     path("", views.dashboard, name="dashboard"),
     path("edit/", views.facility_edit, name="facility_edit"),
+    path("import/", views.facility_import, name="facility_import"),
+    path("console/", views.console, name="console"),
+    path("activity/", views.activity, name="activity"),
+    path("switch/<int:pk>/", views.facility_switch, name="facility_switch"),
+    path("export/slots.csv", views.export_csv, {"kind": "slots"}, name="export_slots"),
+    path("export/bookings.csv", views.export_csv, {"kind": "bookings"}, name="export_bookings"),
+    path("export/events.csv", views.export_csv, {"kind": "events"}, name="export_events"),
     path("stripe/connect/", views.stripe_connect_start, name="stripe_connect_start"),
     path("surfaces/", views.surface_list, name="surface_list"),
     path("surfaces/new/", views.surface_create, name="surface_create"),
@@ -20,8 +27,21 @@ urlpatterns = [
     path(
         "surfaces/<int:surface_pk>/hours/<int:pk>/delete/", views.hours_delete, name="hours_delete"
     ),
+    path("surfaces/<int:surface_pk>/pricing/", views.pricing_list, name="pricing_list"),
+    path("surfaces/<int:surface_pk>/pricing/new/", views.pricing_form, name="pricing_create"),
+    path(
+        "surfaces/<int:surface_pk>/pricing/<int:pk>/edit/", views.pricing_form, name="pricing_edit"
+    ),
+    path(
+        "surfaces/<int:surface_pk>/pricing/<int:pk>/delete/",
+        views.pricing_delete,
+        name="pricing_delete",
+    ),
     path("slots/", views.slot_list, name="slot_list"),
+    path("slots/live/", views.slot_list_live, name="slot_list_live"),
+    path("slots/bulk/", views.slot_bulk, name="slot_bulk"),
     path("slots/<int:slot_pk>/manual/", views.manual_reserve, name="manual_reserve"),
     path("slots/<int:slot_pk>/release/", views.slot_release, name="slot_release"),
     path("bookings/<int:booking_pk>/edit/", views.booking_edit, name="booking_edit"),
+    path("bookings/<int:booking_pk>/activity/", views.booking_activity, name="booking_activity"),
 ]
@@ -5,35 +5,66 @@ from itertools import groupby
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login
+from django.http import Http404, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.decorators.http import require_http_methods
 
-from bookings.models import Booking, Facility, HoursOfOperation, IceSurface, ManualReservation, Slot
+from bookings.events import booking_events, facility_events, feed_page
+from bookings.facility_calendar import day_finder, day_range, local_date, week_table
+from bookings.live import event_stream, slot_events
+from bookings.models import (
+    Booking,
+    Facility,
+    HoursOfOperation,
+    IceSurface,
+    ManualReservation,
+    PricingRule,
+    Slot,
+)
 from bookings.notifications import notify_booking_modified_by_facility, notify_booking_released
-from bookings.services import ensure_slots_for_date, get_facility_tz, release_slot
+from bookings.rollups import summarize_rollups
+from bookings.services import (
+    bulk_slot_action,
+    ensure_slots_for_range,
+    get_facility_tz,
+    release_slot,
+)
+from core.db_router import replica_reads
 from core.decorators import facility_manager_required
+from facilities.console import ACTIVE_FACILITY_SESSION_KEY, active_facility_id, console_summary
+from facilities.exports import EXPORTS, stream_csv
 from facilities.forms import (
     AddHoursForm,
     BulkHoursForm,
+    BulkSlotActionForm,
     FacilityForm,
+    FacilityImportForm,
     FacilityRegisterForm,
     HoursOfOperationForm,
     IceSurfaceForm,
     ManualReservationForm,
+    PricingRuleForm,
 )
+from facilities.imports import IMPORT_COLUMNS, ImportFileError, import_facilities, read_rows
 from facilities.stripe_connect import create_account_link, get_or_create_connect_account
 
 
 def _user_facility(request):
-    """First facility the user manages."""
-    return Facility.objects.filter(managers=request.user).first()
+    """Facility the user is working on: the one picked in the switcher, else their first."""
+    pk = active_facility_id(request)
+    if pk is None:
+        return None
+    return Facility.objects.filter(pk=pk).first()
 
 
 def facility_register(request):
     """Register as a facility manager: create account + facility. No login required."""
     if request.user.is_authenticated:
-        if Facility.objects.filter(managers=request.user).exists():
+        if request.managed_facilities:
             return redirect("facilities:dashboard")
         return redirect("customers:search")
     if request.method == "POST":
@@ -54,15 +85,155 @@ def facility_register(request):
     )
 
 
+def _parse_date(value, default):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date() if value else default
+    except ValueError:
+        return default
+
+
 @facility_manager_required
 def dashboard(request):
     facility = _user_facility(request)
     if not facility:
         return redirect("core:home")
+    today = local_date(timezone.now(), get_facility_tz(facility))
+    start = _parse_date(request.GET.get("start"), today)
+    end = _parse_date(request.GET.get("end"), today + timedelta(days=27))
+    if end < start:
+        start, end = end, start
     return render(
         request,
         "facilities/dashboard.html",
-        {"facility": facility},
+        {
+            "facility": facility,
+            "stats": summarize_rollups(facility, start, end),
+            "start_str": start.isoformat(),
+            "end_str": end.isoformat(),
+        },
+    )
+
+
+@facility_manager_required
+def console(request):
+    """All managed facilities side by side: utilization, pending payments, today's schedule."""
+    facility = _user_facility(request)
+    if not facility:
+        return redirect("core:home")
+    today = local_date(timezone.now(), get_facility_tz(facility))
+    start = _parse_date(request.GET.get("start"), today)
+    end = _parse_date(request.GET.get("end"), today + timedelta(days=27))
+    if end < start:
+        start, end = end, start
+    return render(
+        request,
+        "facilities/console.html",
+        {
+            "facility": facility,
+            "summary": console_summary(list(request.managed_facilities), start, end),
+            "start_str": start.isoformat(),
+            "end_str": end.isoformat(),
+        },
+    )
+
+
+@replica_reads
+@facility_manager_required
+def activity(request):
+    """Booking events at the facility, newest first, a page at a time (?before=<cursor>)."""
+    facility = _user_facility(request)
+    if not facility:
+        return redirect("core:home")
+    events, next_cursor = feed_page(facility_events(facility), request.GET.get("before"))
+    return render(
+        request,
+        "facilities/activity.html",
+        {"facility": facility, "events": events, "next_cursor": next_cursor},
+    )
+
+
+@replica_reads
+@facility_manager_required
+def booking_activity(request, booking_pk):
+    facility = _user_facility(request)
+    if not facility:
+        return redirect("core:home")
+    booking = get_object_or_404(
+        Booking.objects.select_related("user", "slot__ice_surface"),
+        pk=booking_pk,
+        slot__ice_surface__facility=facility,
+    )
+    events = booking_events(booking).select_related("user")
+    events, next_cursor = feed_page(events, request.GET.get("before"))
+    return render(
+        request,
+        "facilities/activity.html",
+        {"facility": facility, "booking": booking, "events": events, "next_cursor": next_cursor},
+    )
+
+
+@facility_manager_required
+@require_http_methods(["POST"])
+def facility_switch(request, pk):
+    """Make another managed facility the active one, then go back where the user was."""
+    if pk not in request.managed_facilities:
+        raise Http404("Not a facility you manage")
+    request.session[ACTIVE_FACILITY_SESSION_KEY] = pk
+    next_url = request.POST.get("next", "")
+    if not url_has_allowed_host_and_scheme(
+        next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()
+    ):
+        next_url = reverse("facilities:dashboard")
+    return redirect(next_url)
+
+
+@facility_manager_required
+@require_http_methods(["GET"])
+def export_csv(request, kind):
+    """Stream slots, bookings or booking events as CSV, filtered by surface and date range."""
+    facility = _user_facility(request)
+    if not facility:
+        return redirect("core:home")
+    if kind not in EXPORTS:
+        raise Http404("Unknown export")
+    header, rows = EXPORTS[kind]
+    tz = get_facility_tz(facility)
+    today = local_date(timezone.now(), tz)
+    start = _parse_date(request.GET.get("start"), today - timedelta(days=30))
+    end = _parse_date(request.GET.get("end"), today + timedelta(days=30))
+    surface_raw = request.GET.get("surface", "")
+    surface_id = int(surface_raw) if surface_raw.isdigit() else None
+    filename = f"{kind}-{start:%Y%m%d}-{end:%Y%m%d}.csv"
+    return stream_csv(filename, header, rows(facility, tz, start, end, surface_id), tz)
+
+
+@facility_manager_required
+@require_http_methods(["GET", "POST"])
+def facility_import(request):
+    """Create or update facilities, surfaces, rates and hours from an uploaded CSV/JSON file."""
+    errors = []
+    if request.method == "POST":
+        form = FacilityImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data["file"]
+            try:
+                rows = read_rows(upload.read(), upload.name)
+            except ImportFileError as e:
+                form.add_error("file", str(e))
+            else:
+                counts, errors = import_facilities(
+                    rows, manager=request.user, slot_days=form.cleaned_data["slot_days"] or 0
+                )
+                if not errors:
+                    summary = ", ".join(f"{k.replace('_', ' ')} {n}" for k, n in counts.items())
+                    messages.success(request, f"Imported {upload.name}: {summary}.")
+                    return redirect("facilities:surface_list")
+    else:
+        form = FacilityImportForm()
+    return render(
+        request,
+        "facilities/facility_import.html",
+        {"form": form, "errors": errors, "columns": IMPORT_COLUMNS},
     )
 
 
@@ -303,6 +474,58 @@ def hours_delete(request, surface_pk, pk):
     )
 
 
+@facility_manager_required
+def pricing_list(request, surface_pk):
+    facility = _user_facility(request)
+    if not facility:
+        return redirect("core:home")
+    surface = get_object_or_404(IceSurface, pk=surface_pk, facility=facility)
+    return render(
+        request,
+        "facilities/pricing_list.html",
+        {"facility": facility, "surface": surface, "rules": surface.pricing_rules.all()},
+    )
+
+
+@facility_manager_required
+@require_http_methods(["GET", "POST"])
+def pricing_form(request, surface_pk, pk=None):
+    """Create or edit a pricing rule; saving reprices the surface's future open slots."""
+    facility = _user_facility(request)
+    if not facility:
+        return redirect("core:home")
+    surface = get_object_or_404(IceSurface, pk=surface_pk, facility=facility)
+    rule = get_object_or_404(PricingRule, pk=pk, ice_surface=surface) if pk else None
+    if request.method == "POST":
+        form = PricingRuleForm(request.POST, instance=rule)
+        if form.is_valid():
+            rule = form.save(commit=False)
+            rule.ice_surface = surface
+            rule.save()
+            messages.success(request, f"Pricing rule {rule.name} saved; open slots repriced.")
+            return redirect("facilities:pricing_list", surface_pk=surface.pk)
+    else:
+        form = PricingRuleForm(instance=rule)
+    return render(
+        request,
+        "facilities/pricing_form.html",
+        {"form": form, "facility": facility, "surface": surface, "rule": rule},
+    )
+
+
+@facility_manager_required
+@require_http_methods(["POST"])
+def pricing_delete(request, surface_pk, pk):
+    facility = _user_facility(request)
+    if not facility:
+        return redirect("core:home")
+    surface = get_object_or_404(IceSurface, pk=surface_pk, facility=facility)
+    rule = get_object_or_404(PricingRule, pk=pk, ice_surface=surface)
+    rule.delete()
+    messages.success(request, f"Pricing rule {rule.name} removed; open slots repriced.")
+    return redirect("facilities:pricing_list", surface_pk=surface.pk)
+
+
 def _week_to_range(week_str):
     """Parse 'YYYY-Www' to (sunday_date, next_sunday_date) for Sun–Sat week. Returns None if invalid."""
     if not week_str or "-W" not in week_str:
@@ -331,6 +554,7 @@ def _sunday_to_week_str(sunday_date):
     return f"{monday.year}-W{week_num:02d}"
 
 
+@replica_reads
 @facility_manager_required
 def slot_list(request):
     facility = _user_facility(request)
@@ -344,7 +568,7 @@ def slot_list(request):
     surfaces = facility.ice_surfaces.all()
     slots = (
         Slot.objects.filter(ice_surface__facility=facility)
-        .select_related("ice_surface", "booking", "manual_reservation")
+        .select_related("ice_surface", "booking__user", "manual_reservation")
         .order_by("start")
     )
 
@@ -354,7 +578,7 @@ def slot_list(request):
     week_range = _week_to_range(week_str) if week_str else None
     if week_range is None:
         # Default to current week (ISO) so first load or invalid week shows this week
-        today = timezone.localtime(timezone.now(), tz).date()
+        today = local_date(timezone.now(), tz)
         jan4 = date(today.year, 1, 4)
         monday_week1 = jan4 - timedelta(days=jan4.weekday())
         week_num = (today - monday_week1).days // 7 + 1
@@ -365,27 +589,29 @@ def slot_list(request):
         sunday, end_sunday = week_range
         # Ensure slots exist for each day of the week (Sun–Sat)
         if surface_id:
-            surface = get_object_or_404(IceSurface, pk=surface_id, facility=facility)
-            for d in range(7):
-                ensure_slots_for_date(surface, sunday + timedelta(days=d))
+            week_surfaces = [get_object_or_404(IceSurface, pk=surface_id, facility=facility)]
         else:
-            for d in range(7):
-                day = sunday + timedelta(days=d)
-                for surface in facility.ice_surfaces.all():
-                    ensure_slots_for_date(surface, day)
-        start_dt = timezone.make_aware(datetime.combine(sunday, datetime.min.time()), tz)
-        end_dt = timezone.make_aware(datetime.combine(end_sunday, datetime.min.time()), tz)
-        slots = slots.filter(start__gte=start_dt, start__lt=end_dt)
+            week_surfaces = list(surfaces)
+        for surface in week_surfaces:
+            surface.facility = facility
+        if ensure_slots_for_range(week_surfaces, sunday, sunday + timedelta(days=6)):
+            # Just generated on the primary; a replica may not have them yet.
+            slots = slots.using("default")
+        days = week_table(tz, sunday, (end_sunday - sunday).days)
+        slots = slots.filter(start__gte=days[0][1], start__lt=days[-1][2])
+        slot_day = day_finder(days)
+    else:
+
+        def slot_day(start):
+            return local_date(start, tz)
 
     if state_filter:
         slots = slots.filter(state=state_filter)
 
     slot_list_limited = list(slots[:500])
-
-    def slot_day(s):
-        return timezone.localtime(s.start, tz).date()
-
-    slots_by_date = [(d, list(g)) for d, g in groupby(slot_list_limited, key=slot_day)]
+    slots_by_date = [
+        (d, list(g)) for d, g in groupby(slot_list_limited, key=lambda s: slot_day(s.start))
+    ]
 
     week_start = week_end = None
     prev_week_str = next_week_str = None
@@ -425,6 +651,29 @@ def slot_list(request):
     )
 
 
+@facility_manager_required
+def slot_list_live(request):
+    """Server-Sent Events re-rendering each row of the slot_list week that changes."""
+    facility = _user_facility(request)
+    week_range = _week_to_range(request.GET.get("week"))
+    if not facility or week_range is None:
+        return HttpResponseBadRequest("week is required")
+    surface_ids = list(facility.ice_surfaces.values_list("pk", flat=True))
+    surface_raw = request.GET.get("surface", "")
+    if surface_raw.isdigit():
+        surface_ids = [pk for pk in surface_ids if pk == int(surface_raw)]
+    sunday, end_sunday = week_range
+    start, end = day_range(get_facility_tz(facility), sunday, end_sunday - timedelta(days=1))
+    slots = Slot.objects.filter(
+        ice_surface_id__in=surface_ids, start__gte=start, start__lt=end
+    ).select_related("ice_surface", "booking__user", "manual_reservation")
+
+    def render_row(slot):
+        return render_to_string("components/slot_row.html", {"slot": slot}, request)
+
+    return event_stream(request, slot_events(slots, surface_ids, render_row))
+
+
 @facility_manager_required
 @require_http_methods(["GET", "POST"])
 def manual_reserve(request, slot_pk):
@@ -473,6 +722,42 @@ def slot_release(request, slot_pk):
     return redirect("facilities:slot_list")
 
 
+@facility_manager_required
+@require_http_methods(["GET", "POST"])
+def slot_bulk(request):
+    """Block, unblock, reprice or release a range of slots in one go."""
+    facility = _user_facility(request)
+    if not facility:
+        return redirect("core:home")
+    if request.method == "POST":
+        form = BulkSlotActionForm(request.POST, facility=facility)
+        if form.is_valid():
+            data = form.cleaned_data
+            changed = bulk_slot_action(
+                facility,
+                list(data["surfaces"]),
+                data["start_date"],
+                data["end_date"],
+                data["action"],
+                weekdays=data["weekdays"],
+                time_from=data["time_from"],
+                time_to=data["time_to"],
+                rate=data["rate"],
+            )
+            label = dict(form.fields["action"].choices)[data["action"]]
+            messages.success(
+                request, f"{label}: {changed} slot{'s' if changed != 1 else ''} updated."
+            )
+            return redirect("facilities:slot_list")
+    else:
+        today = local_date(timezone.now(), get_facility_tz(facility))
+        form = BulkSlotActionForm(
+            facility=facility,
+            initial={"start_date": today, "end_date": today + timedelta(days=6)},
+        )
+    return render(request, "facilities/slot_bulk.html", {"facility": facility, "form": form})
+
+
 @facility_manager_required
 @require_http_methods(["GET"])
 def stripe_connect_start(request):
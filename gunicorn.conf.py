@@ -0,0 +1,72 @@
+"""
+Gunicorn settings, read automatically when gunicorn starts in this directory, so the
+start command is just `gunicorn`.
+
+The app is served over WSGI by sync workers, the fastest for the mostly-sync views. Set
+GUNICORN_ASGI=True to serve it over ASGI with uvicorn workers instead, for the live slot
+streams (Server-Sent Events; under WSGI they answer 204 and pages stay static) and async
+views, at the cost of sync-view throughput.
+
+The app is preloaded and warmed up (core.warmup) in the master, then workers are forked
+from it: they share the imported code, resolved URLconf and compiled templates instead of
+each loading them while the first requests wait.
+"""
+
+import glob
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    return default if value is None else value.lower() in ("1", "true", "yes", "on")
+
+
+if _env_bool("GUNICORN_ASGI", False):
+    wsgi_app = os.environ.get("GUNICORN_APP", "config.asgi:application")
+    worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "uvicorn_worker.UvicornWorker")
+else:
+    wsgi_app = os.environ.get("GUNICORN_APP", "config.wsgi:application")
+    worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+# WEB_CONCURRENCY is what Render and Heroku set from the instance size.
+workers = _env_int("WEB_CONCURRENCY", 2)
+# Sync workers switch to gthread above 1; ASGI workers run requests on an event loop.
+threads = _env_int("GUNICORN_THREADS", 1)
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+# Recycle workers now and then so slow leaks can't grow without bound.
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+preload_app = _env_bool("GUNICORN_PRELOAD", True)
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+
+
+def on_starting(server):
+    # Metrics files of the previous run would otherwise be summed into this one's.
+    metrics_dir = os.environ.get("METRICS_DIR")
+    if metrics_dir:
+        for pattern in ("*.json", "*.retiring"):
+            for path in glob.glob(os.path.join(metrics_dir, pattern)):
+                os.remove(path)
+
+
+def when_ready(server):
+    if not preload_app or not _env_bool("GUNICORN_WARMUP", True):
+        return
+    from core.warmup import warm_up
+
+    for step in warm_up():
+        server.log.info("warm-up %s: %.1f ms", step["step"], step["ms"])
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from django.db import connections
+
+    # Never reuse a connection opened in the master (warm-up already closed its pools).
+    connections.close_all()